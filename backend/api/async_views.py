@@ -0,0 +1,302 @@
+from typing import Any, NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.authentication import CachedTokenAuthentication
+from api.fast_serializers import RecipeFastSerializer
+from api.filters import RecipeFilter
+from api.pagination import NumberRecordsPerPagePagination
+from api.reference import not_modified, reference_data
+from api.renderers import FastJSONRenderer
+from api.serializers import GetRecipeSerializer
+from api.views import IngredientViewSet, RecipesViewSet, TagViewSet
+from foodgram.db.routers import (ais_pinned_to_primary, read_from_replica,
+                                 replica_configured)
+from recipes.models import Recipe
+
+LIST_ACTIONS = {'get': 'list'}
+
+DETAIL_ACTIONS = {'get': 'retrieve'}
+
+RECIPE_LIST_ACTIONS = {'get': 'list', 'post': 'create'}
+
+RECIPE_DETAIL_ACTIONS = {
+    'get': 'retrieve',
+    'put': 'update',
+    'patch': 'partial_update',
+    'delete': 'destroy',
+}
+
+
+class ETagged(NamedTuple):
+    data: Any
+    etag: str
+
+
+class FallbackToSyncError(Exception):
+    """Запрос не подходит для асинхронной обработки и передаётся
+    синхронному представлению DRF."""
+
+
+async def authenticate(request):
+    """Асинхронная аутентификация по токену для успешных случаев."""
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != 'token':
+        return AnonymousUser()
+    if len(header) != 2:
+        raise FallbackToSyncError
+    try:
+        user, token = await sync_to_async(
+            CachedTokenAuthentication().authenticate_credentials
+        )(header[1])
+    except AuthenticationFailed:
+        raise FallbackToSyncError
+    return user
+
+
+def throttled(request, sync_view):
+    """Проверяет ограничения частоты запросов синхронного представления.
+
+    Если запрос превысил ограничение, он передаётся синхронному
+    представлению, которое вернёт ответ 429 с заголовком Retry-After. Иначе
+    запрос отмечается оплаченным, чтобы синхронное представление не
+    списало токены повторно, если запрос всё же будет передан ему.
+    """
+    view = sync_view.cls(**sync_view.initkwargs)
+    view.action = sync_view.actions.get('get')
+    if any(
+        not throttle.allow_request(request, view)
+        for throttle in view.get_throttles()
+    ):
+        return True
+    request.throttle_charged = True
+    return False
+
+
+def check_negotiation(request):
+    """Браузерное представление API и явный выбор формата отдаются DRF."""
+    if 'format' in request.GET or 'text/html' in request.headers.get(
+            'Accept',
+            ''
+    ):
+        raise FallbackToSyncError
+
+
+async def filter_queryset(filterset_class, request, queryset):
+    filterset = await sync_to_async(filterset_class)(
+        request.GET,
+        queryset=queryset,
+        request=request
+    )
+    if not await sync_to_async(filterset.is_valid)():
+        raise FallbackToSyncError
+    return await sync_to_async(lambda: filterset.qs)()
+
+
+async def paginate(request, queryset):
+    """Повторяет NumberRecordsPerPagePagination без синхронного Paginator и
+    возвращает срез запрошенной страницы."""
+    pagination = NumberRecordsPerPagePagination
+    try:
+        page_size = int(request.GET[pagination.page_size_query_param])
+        if page_size <= 0:
+            raise ValueError
+    except (KeyError, ValueError):
+        page_size = pagination.page_size
+    try:
+        page_number = int(request.GET.get(pagination.page_query_param, 1))
+    except ValueError:
+        raise FallbackToSyncError
+    count = await queryset.acount()
+    num_pages = max(1, -(-count // page_size))
+    if not 1 <= page_number <= num_pages:
+        raise FallbackToSyncError
+    offset = (page_number - 1) * page_size
+    url = request.build_absolute_uri()
+    next_url = previous_url = None
+    if page_number < num_pages:
+        next_url = replace_query_param(
+            url,
+            pagination.page_query_param,
+            page_number + 1
+        )
+    if page_number == 2:
+        previous_url = remove_query_param(url, pagination.page_query_param)
+    elif page_number > 2:
+        previous_url = replace_query_param(
+            url,
+            pagination.page_query_param,
+            page_number - 1
+        )
+    return count, next_url, previous_url, slice(offset, offset + page_size)
+
+
+async def serialize_recipes(request, queryset):
+    """Строит представления рецептов тем же RecipeFastSerializer и кэшем
+    фрагментов, что и синхронное представление."""
+    if not settings.FAST_SERIALIZERS:
+        raise FallbackToSyncError
+    serializer = RecipeFastSerializer(request)
+    rows = [row async for row in serializer.values(queryset)]
+    data = await sync_to_async(serializer.serialize)(rows)
+    if data is None:
+        raise FallbackToSyncError
+    return data
+
+
+def render(request, result, allow):
+    headers = {'Vary': 'Accept', 'Allow': allow}
+    if isinstance(result, ETagged):
+        headers['ETag'] = result.etag
+        if not_modified(request, result.etag):
+            return HttpResponse(status=304, headers=headers)
+        result = result.data
+    return HttpResponse(
+        FastJSONRenderer().render(result),
+        content_type='application/json',
+        headers=headers
+    )
+
+
+def async_read_view(sync_view, allow):
+    """Асинхронно обрабатывает GET и HEAD, остальные методы и нестандартные
+    запросы передаёт синхронному представлению."""
+    def decorator(handler):
+        async def view(request, *args, **kwargs):
+            if request.method in ('GET', 'HEAD'):
+                replica_token = None
+                try:
+                    check_negotiation(request)
+                    user = await authenticate(request)
+                    request.user = user
+                    if await sync_to_async(throttled)(request, sync_view):
+                        raise FallbackToSyncError
+                    if (replica_configured()
+                            and not await ais_pinned_to_primary(user)):
+                        replica_token = read_from_replica.set(True)
+                    return render(
+                        request,
+                        await handler(request, *args, **kwargs),
+                        allow
+                    )
+                except (FallbackToSyncError, ValidationError):
+                    # Ошибку в параметрах запроса вернёт синхронное
+                    # представление.
+                    pass
+                finally:
+                    if replica_token is not None:
+                        read_from_replica.reset(replica_token)
+            return await sync_to_async(sync_view)(request, *args, **kwargs)
+        view.csrf_exempt = True
+        return view
+    return decorator
+
+
+@async_read_view(
+    TagViewSet.as_view(LIST_ACTIONS, basename='tags', detail=False),
+    allow='GET, HEAD, OPTIONS'
+)
+async def tag_list(request):
+    snapshot = await sync_to_async(reference_data.get)()
+    return ETagged(snapshot.tag_data, snapshot.etag('tags'))
+
+
+@async_read_view(
+    TagViewSet.as_view(DETAIL_ACTIONS, basename='tags', detail=True),
+    allow='GET, HEAD, OPTIONS'
+)
+async def tag_detail(request, pk):
+    snapshot = await sync_to_async(reference_data.get)()
+    if pk not in snapshot.tag_data_by_id:
+        raise FallbackToSyncError
+    return ETagged(snapshot.tag_data_by_id[pk], snapshot.etag('tags', pk))
+
+
+@async_read_view(
+    IngredientViewSet.as_view(
+        LIST_ACTIONS,
+        basename='ingredients',
+        detail=False
+    ),
+    allow='GET, HEAD, OPTIONS'
+)
+async def ingredient_list(request):
+    snapshot = await sync_to_async(reference_data.get)()
+    name = request.GET.get('name', '')
+    return ETagged(
+        snapshot.filter_ingredients(name),
+        snapshot.etag('ingredients', name)
+    )
+
+
+@async_read_view(
+    IngredientViewSet.as_view(
+        DETAIL_ACTIONS,
+        basename='ingredients',
+        detail=True
+    ),
+    allow='GET, HEAD, OPTIONS'
+)
+async def ingredient_detail(request, pk):
+    snapshot = await sync_to_async(reference_data.get)()
+    if pk not in snapshot.ingredient_data_by_id:
+        raise FallbackToSyncError
+    return ETagged(
+        snapshot.ingredient_data_by_id[pk],
+        snapshot.etag('ingredients', pk)
+    )
+
+
+@async_read_view(
+    RecipesViewSet.as_view(
+        RECIPE_LIST_ACTIONS,
+        basename='recipes',
+        detail=False
+    ),
+    allow='GET, POST, HEAD, OPTIONS'
+)
+async def recipe_list(request):
+    queryset = await filter_queryset(
+        RecipeFilter,
+        request,
+        Recipe.objects.all()
+    )
+    count, next_url, previous_url, page = await paginate(request, queryset)
+    return {
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': await serialize_recipes(
+            request,
+            queryset.with_user_flags(
+                request.user,
+                GetRecipeSerializer.requested_fields(request)
+            )[page]
+        ),
+    }
+
+
+@async_read_view(
+    RecipesViewSet.as_view(
+        RECIPE_DETAIL_ACTIONS,
+        basename='recipes',
+        detail=True
+    ),
+    allow='GET, PUT, PATCH, DELETE, HEAD, OPTIONS'
+)
+async def recipe_detail(request, pk):
+    data = await serialize_recipes(
+        request,
+        Recipe.objects.with_user_flags(
+            request.user,
+            GetRecipeSerializer.requested_fields(request)
+        ).filter(pk=pk)
+    )
+    if not data:
+        raise FallbackToSyncError
+    return data[0]
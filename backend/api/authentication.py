@@ -0,0 +1,38 @@
+from hashlib import sha256
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.authentication import TokenAuthentication
+
+
+def token_cache_key(key):
+    return f'auth-token:{sha256(key.encode()).hexdigest()}'
+
+
+def forget_tokens(*keys):
+    """Удаляет токены из кэша, после чего они снова проверяются по базе
+    данных."""
+    caches[settings.TOKEN_AUTH_CACHE].delete_many(
+        [token_cache_key(key) for key in keys]
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пары пользователь-токен.
+
+    Кэш очищается сигналами при удалении токена, а также при любом
+    сохранении пользователя, в том числе деактивации и смене пароля.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[settings.TOKEN_AUTH_CACHE]
+        cache_key = token_cache_key(key)
+        credentials = cache.get(cache_key)
+        if credentials is None:
+            credentials = super().authenticate_credentials(key)
+            cache.set(
+                cache_key,
+                credentials,
+                settings.TOKEN_AUTH_CACHE_TIMEOUT
+            )
+        return credentials
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.checks import Tags, Warning, register
+
+PROCESS_LOCAL_BROKER = 'api.events.LocalBroker'
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def shared_cache_check(app_configs, **kwargs):
+    """Кэш токенов, версии справочников, закрепление за основной базой
+    данных и журнал изменений индекса продуктов сбрасываются и читаются
+    разными воркерами, поэтому их кэш должен быть общим."""
+    aliases = {'default', settings.TOKEN_AUTH_CACHE}
+    return [
+        Warning(
+            f'Кэш "{alias}" хранится в памяти процесса: сброс токенов, '
+            'версий справочников и фрагментов не дойдёт до других '
+            'воркеров.',
+            hint='Задайте CACHE_BACKEND с общим хранилищем, например '
+                 'foodgram.cache.SQLiteCache или RedisCache.',
+            id='api.W001',
+        )
+        for alias in sorted(aliases)
+        if settings.CACHES[alias]['BACKEND'] in PROCESS_LOCAL_BACKENDS
+    ]
+
+
+@register()
+def event_broker_check(app_configs, **kwargs):
+    """С PostgreSQL приложение запускается несколькими воркерами, а
+    LocalBroker раздаёт события только подписчикам своего процесса."""
+    if not settings.NEED_POSTGRESQL:
+        return []
+    if settings.EVENT_BROKER != PROCESS_LOCAL_BROKER:
+        return []
+    return [
+        Warning(
+            'Брокер событий работает внутри процесса: подписчики, '
+            'подключённые к другим воркерам, не получат события.',
+            hint='Задайте EVENT_BROKER=api.events.PostgresBroker.',
+            id='api.W002',
+        )
+    ]
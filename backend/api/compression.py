@@ -0,0 +1,116 @@
+import gzip
+import zlib
+
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Типы содержимого, которые имеет смысл сжимать. Поток событий text/
+# event-stream не сжимается, чтобы события не задерживались в буфере.
+COMPRESSIBLE_TYPES = (
+    'application/javascript',
+    'application/json',
+    'application/vnd.oai.openapi',
+    'application/xml',
+    'image/svg+xml',
+    'text/css',
+    'text/csv',
+    'text/html',
+    'text/javascript',
+    'text/plain',
+    'text/xml',
+)
+
+
+def available_encodings():
+    """Поддерживаемые кодировки в порядке предпочтения при равном q."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encodings(header):
+    """Разбирает заголовок Accept-Encoding в словарь кодировка -> q."""
+    accepted = {}
+    for item in header.split(','):
+        coding, *params = item.strip().lower().split(';')
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[coding.strip()] = quality
+    return accepted
+
+
+def negotiate(header):
+    """Лучшая из поддерживаемых кодировок или None, если клиент не принимает
+    ни одну из них."""
+    accepted = accepted_encodings(header)
+    best, best_quality = None, 0.0
+    for coding in available_encodings():
+        quality = accepted.get(coding, accepted.get('*', 0.0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def is_compressible(content_type):
+    media_type = content_type.split(';')[0].strip().lower()
+    return media_type in COMPRESSIBLE_TYPES or media_type.endswith('+json')
+
+
+def compress(content, coding, level=None):
+    if coding == 'br':
+        return brotli.compress(
+            content,
+            quality=level or settings.COMPRESSION_BROTLI_QUALITY
+        )
+    return gzip.compress(
+        content,
+        compresslevel=level or settings.COMPRESSION_GZIP_LEVEL,
+        mtime=0
+    )
+
+
+def compress_chunks(chunks, coding, flush=False):
+    """Сжимает последовательность байтовых строк по частям.
+
+    При flush каждая часть отправляется клиенту сразу, иначе сжатые данные
+    отдаются по мере заполнения буфера компрессора.
+    """
+    if coding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESSION_BROTLI_QUALITY
+        )
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if flush:
+                data += compressor.flush()
+            if data:
+                yield data
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(
+        settings.COMPRESSION_GZIP_LEVEL,
+        zlib.DEFLATED,
+        zlib.MAX_WBITS | 16
+    )
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if flush:
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def split(content, size):
+    for start in range(0, len(content), size):
+        yield content[start:start + size]
@@ -0,0 +1,87 @@
+import os
+from hashlib import sha1
+from tempfile import NamedTemporaryFile
+from time import time
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.http import FileResponse, HttpResponse
+
+protected_storage = FileSystemStorage(
+    location=settings.PROTECTED_MEDIA_ROOT,
+    base_url=settings.PROTECTED_MEDIA_URL,
+)
+
+
+def content_name(directory, key, extension):
+    """Имя файла, однозначно определяемое содержимым key."""
+    digest = sha1(repr(key).encode()).hexdigest()
+    return f'{directory}/{digest}.{extension}'
+
+
+def ensure_file(name, render, keep_others=False):
+    """Создаёт защищённый файл name из байтов render(), если его ещё нет.
+
+    Файл записывается во временный и атомарно переименовывается, поэтому
+    одновременные запросы не видят недописанный файл. Время изменения
+    файла обновляется при каждом запросе. Если не указан keep_others,
+    остальные файлы каталога удаляются, но только те, что не запрашивались
+    дольше PROTECTED_FILES_GRACE_SECONDS: их ещё могут скачивать по уже
+    выданным ответам.
+    """
+    path = protected_storage.path(name)
+    try:
+        os.utime(path)
+        return name
+    except FileNotFoundError:
+        pass
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    with NamedTemporaryFile(dir=directory, delete=False) as file:
+        file.write(render())
+    # Временный файл создаётся с правами 0600, а читать его будет nginx.
+    os.chmod(file.name, protected_storage.file_permissions_mode or 0o644)
+    os.replace(file.name, path)
+    if not keep_others:
+        remove_stale_files(directory, keep=path)
+    return name
+
+
+def remove_stale_files(directory, keep):
+    """Удаляет файлы каталога, кроме keep и временных, которые не
+    запрашивались дольше PROTECTED_FILES_GRACE_SECONDS."""
+    deadline = time() - settings.PROTECTED_FILES_GRACE_SECONDS
+    for entry in os.scandir(directory):
+        if entry.path == keep or entry.name.startswith('tmp'):
+            continue
+        try:
+            if entry.stat().st_mtime < deadline:
+                os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+
+def protected_file_response(name, filename, content_type):
+    """Отдаёт защищённый файл name как вложение с именем filename.
+
+    При FILE_DELIVERY=nginx тело ответа пустое, а файл по заголовку
+    X-Accel-Redirect отдаёт nginx из внутреннего location. Иначе файл
+    читает сам Django.
+    """
+    if settings.FILE_DELIVERY != 'nginx':
+        return FileResponse(
+            protected_storage.open(name),
+            as_attachment=True,
+            filename=filename,
+            content_type=content_type
+        )
+    response = HttpResponse(content_type=content_type)
+    response['X-Accel-Redirect'] = protected_storage.url(name)
+    try:
+        filename.encode('ascii')
+        disposition = f'attachment; filename="{filename}"'
+    except UnicodeEncodeError:
+        disposition = f"attachment; filename*=utf-8''{quote(filename)}"
+    response['Content-Disposition'] = disposition
+    return response
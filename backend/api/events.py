@@ -0,0 +1,308 @@
+import asyncio
+import json
+import select
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+import psycopg2
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import (AuthenticationFailed, MethodNotAllowed,
+                                       NotAuthenticated)
+
+from api.authentication import CachedTokenAuthentication
+from api.renderers import FastJSONRenderer
+from recipes.models import Subscription
+
+# Сообщение, которое получает отставший подписчик: поток событий
+# закрывается, и клиент переподключается.
+OVERFLOW = object()
+
+
+def author_channel(author_id):
+    """Канал новых рецептов автора."""
+    return f'author:{author_id}'
+
+
+def user_channel(user_id):
+    """Канал изменений подписок пользователя."""
+    return f'user:{user_id}'
+
+
+class EventSubscription:
+    """Очередь сообщений одного подключения в его цикле событий asyncio."""
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = set(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.overflowed = False
+
+    def deliver(self, message):
+        """Кладёт сообщение в очередь; вызывается из любого потока."""
+        self.loop.call_soon_threadsafe(self.put, message)
+
+    def put(self, message):
+        if self.overflowed:
+            return
+        if self.queue.qsize() >= settings.EVENTS_QUEUE_SIZE:
+            self.overflowed = True
+            message = OVERFLOW
+        self.queue.put_nowait(message)
+
+    async def get(self):
+        return await self.queue.get()
+
+    def add(self, channel):
+        self.broker.attach(self, (channel,))
+
+    def remove(self, channel):
+        self.broker.detach(self, (channel,))
+
+    def close(self):
+        self.broker.detach(self, tuple(self.channels))
+
+
+class LocalBroker:
+    """Публикация и подписка внутри одного процесса.
+
+    Подходит для одного воркера ASGI и для тестов: сообщения, опубликованные
+    в других процессах, сюда не доходят.
+    """
+
+    def __init__(self):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channels):
+        subscription = EventSubscription(self, ())
+        self.attach(subscription, channels)
+        return subscription
+
+    def attach(self, subscription, channels):
+        with self.lock:
+            for channel in channels:
+                self.subscribers[channel].add(subscription)
+                subscription.channels.add(channel)
+
+    def detach(self, subscription, channels):
+        with self.lock:
+            for channel in channels:
+                subscribers = self.subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.subscribers[channel]
+                subscription.channels.discard(channel)
+
+    def publish(self, channel, message):
+        with self.lock:
+            subscribers = tuple(self.subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+
+class PostgresBroker(LocalBroker):
+    """Публикация через NOTIFY PostgreSQL: сообщение получают подписчики во
+    всех процессах, которые слушают канал EVENTS_PG_CHANNEL.
+
+    Каждый процесс держит одно отдельное соединение LISTEN в фоновом потоке
+    и раздаёт пришедшие сообщения своим подписчикам. Если соединение
+    разорвано, поток переподключается, а сообщения за это время теряются.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.listener = None
+
+    def subscribe(self, channels):
+        with self.lock:
+            if self.listener is None:
+                self.listener = threading.Thread(
+                    target=self.listen,
+                    name='events-listener',
+                    daemon=True
+                )
+                self.listener.start()
+        return super().subscribe(channels)
+
+    def publish(self, channel, message):
+        with connections['default'].cursor() as cursor:
+            cursor.execute(
+                'SELECT pg_notify(%s, %s)',
+                (
+                    settings.EVENTS_PG_CHANNEL,
+                    json.dumps({'channel': channel, 'message': message})
+                )
+            )
+
+    def listen(self):
+        while True:
+            try:
+                self.receive_notifications()
+            except psycopg2.Error:
+                time.sleep(1)
+
+    def receive_notifications(self):
+        connection = psycopg2.connect(
+            **connections['default'].get_connection_params()
+        )
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{settings.EVENTS_PG_CHANNEL}"')
+            while True:
+                select.select([connection], [], [], 60)
+                connection.poll()
+                while connection.notifies:
+                    payload = json.loads(connection.notifies.pop(0).payload)
+                    super().publish(payload['channel'], payload['message'])
+        finally:
+            connection.close()
+
+
+@lru_cache(maxsize=None)
+def broker():
+    return import_string(settings.EVENT_BROKER)()
+
+
+def publish(channel, message):
+    broker().publish(channel, message)
+
+
+def load_subscriber(key):
+    """Пользователь по токену и id авторов, на которых он подписан."""
+    try:
+        user, _ = CachedTokenAuthentication().authenticate_credentials(key)
+        return user, list(Subscription.objects.filter(user=user).values_list(
+            'subscribed_author_id',
+            flat=True
+        ))
+    finally:
+        close_old_connections()
+
+
+async def wait_disconnect(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+class EventStreamApplication:
+    """ASGI-приложение, которое отдаёт по адресу path поток server-sent
+    events о новых рецептах авторов из подписок пользователя, а остальные
+    запросы передаёт приложению Django.
+
+    Каждое подключение - лёгкая задача asyncio в цикле событий воркера,
+    которая ждёт сообщений брокера и не занимает поток.
+    """
+
+    def __init__(self, application, path):
+        self.application = application
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['path'] != self.path:
+            return await self.application(scope, receive, send)
+        if scope['method'] != 'GET':
+            return await self.error(
+                send,
+                405,
+                MethodNotAllowed(scope['method']).detail,
+                [(b'allow', b'GET')]
+            )
+        headers = dict(scope['headers'])
+        header = headers.get(b'authorization', b'').decode('latin-1').split()
+        if len(header) != 2 or header[0].lower() != 'token':
+            return await self.error(
+                send,
+                401,
+                str(NotAuthenticated.default_detail),
+                [(b'www-authenticate', b'Token')]
+            )
+        try:
+            user, author_ids = await sync_to_async(load_subscriber)(header[1])
+        except AuthenticationFailed as error:
+            return await self.error(
+                send,
+                401,
+                error.detail,
+                [(b'www-authenticate', b'Token')]
+            )
+        subscription = broker().subscribe(
+            [user_channel(user.pk)] + [
+                author_channel(author_id) for author_id in author_ids
+            ]
+        )
+        try:
+            await self.stream(subscription, receive, send)
+        finally:
+            subscription.close()
+
+    async def stream(self, subscription, receive, send):
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no'),
+            ],
+        })
+        await self.send_body(send, f'retry: {settings.EVENTS_RETRY}\n\n')
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        try:
+            while True:
+                getter = asyncio.ensure_future(subscription.get())
+                await asyncio.wait(
+                    (getter, disconnect),
+                    timeout=settings.EVENTS_HEARTBEAT,
+                    return_when=asyncio.FIRST_COMPLETED
+                )
+                if disconnect.done():
+                    getter.cancel()
+                    return
+                if not getter.done():
+                    getter.cancel()
+                    await self.send_body(send, ': ping\n\n')
+                    continue
+                message = getter.result()
+                if message is OVERFLOW:
+                    break
+                if message['event'] == 'subscription':
+                    channel = author_channel(message['author'])
+                    if message['active']:
+                        subscription.add(channel)
+                    else:
+                        subscription.remove(channel)
+                await self.send_body(send, (
+                    f'event: {message["event"]}\n'
+                    f'data: {FastJSONRenderer().render(message).decode()}\n\n'
+                ))
+        finally:
+            disconnect.cancel()
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def send_body(send, text):
+        await send({
+            'type': 'http.response.body',
+            'body': text.encode(),
+            'more_body': True,
+        })
+
+    @staticmethod
+    async def error(send, status, detail, headers=()):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'), *headers],
+        })
+        await send({
+            'type': 'http.response.body',
+            'body': FastJSONRenderer().render({'detail': detail}),
+        })
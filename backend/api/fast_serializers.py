@@ -0,0 +1,257 @@
+from collections import defaultdict
+from itertools import chain
+from operator import itemgetter
+
+from django.db.models import Count, Q
+
+from api.fragments import load_fragments
+from api.reference import reference_data
+from api.serializers import GetRecipeSerializer, SubscriptionSerializer
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+AUTHOR_FIELDS = ('email', 'id', 'username', 'first_name', 'last_name')
+
+RECIPE_COLUMNS = ('name', 'image', 'text', 'cooking_time')
+
+USER_FLAGS = ('is_favorited', 'is_in_shopping_cart')
+
+SHORT_RECIPE_FIELDS = ('id', 'name', 'image', 'cooking_time')
+
+
+def image_url(request):
+    """Повторяет ImageField из DRF: абсолютная ссылка на файл рецепта."""
+    storage = Recipe._meta.get_field('image').storage
+
+    def url(name):
+        if not name:
+            return None
+        if request is None:
+            return storage.url(name)
+        return request.build_absolute_uri(storage.url(name))
+    return url
+
+
+def selected_names(serializer_class, request):
+    selected = serializer_class.requested_fields(request)
+    return tuple(
+        name for name in serializer_class.Meta.fields
+        if selected is None or name in selected
+    )
+
+
+class FastSerializer:
+    """Сериализатор только для чтения, который строит представление по
+    заранее собранным функциям доступа к полям вместо полей DRF.
+
+    По умолчанию читает строки values(), с getter=attrgetter - атрибуты
+    объектов.
+    """
+    fields = ()
+
+    def __init__(self, selected=None, getter=itemgetter):
+        self.accessors = tuple(
+            (name, getter(name))
+            for name in self.fields
+            if selected is None or name in selected
+        )
+
+    def to_representation(self, obj):
+        return {name: get(obj) for name, get in self.accessors}
+
+    def many(self, objects):
+        to_representation = self.to_representation
+        return [to_representation(obj) for obj in objects]
+
+
+class TagFastSerializer(FastSerializer):
+    fields = ('id', 'name', 'color', 'slug')
+
+
+class IngredientFastSerializer(FastSerializer):
+    fields = ('id', 'name', 'measurement_unit')
+
+
+class RecipeFastSerializer:
+    """Быстрая замена GetRecipeSerializer для чтения.
+
+    Из базы данных читаются только id рецептов страницы и флаги текущего
+    пользователя, а остальное представление берётся из кэша фрагментов
+    (api.fragments). Недостающие фрагменты строятся по строкам values(),
+    тегам и ингредиентам всех таких рецептов и снимку справочных данных.
+    Если в снимке чего-то нет, serialize возвращает None и ответ строит
+    GetRecipeSerializer.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.names = selected_names(GetRecipeSerializer, request)
+
+    def values(self, queryset):
+        """Строки рецептов для queryset из RecipesViewSet.get_queryset."""
+        columns = ['id']
+        if 'author' in self.names:
+            columns.append('author_is_subscribed')
+        columns += [name for name in USER_FLAGS if name in self.names]
+        return queryset.select_related(None).prefetch_related(None).values(
+            *columns
+        )
+
+    def serialize(self, rows):
+        rows = list(rows)
+        snapshot = reference_data.get()
+        fragments = load_fragments(
+            [row['id'] for row in rows],
+            snapshot.version,
+            lambda recipe_ids: self.build_fragments(snapshot, recipe_ids)
+        )
+        if fragments is None:
+            return None
+        image = image_url(self.request)
+        # Поля, которые зависят от пользователя или адреса запроса.
+        overlay = {
+            'author': lambda row, fragment: {
+                **fragment['author'],
+                'is_subscribed': row['author_is_subscribed'],
+            },
+            'is_favorited': lambda row, fragment: row['is_favorited'],
+            'is_in_shopping_cart': (
+                lambda row, fragment: row['is_in_shopping_cart']
+            ),
+            'image': lambda row, fragment: image(fragment['image']),
+        }
+
+        def represent(row):
+            fragment = fragments[row['id']]
+            return {
+                name: overlay[name](row, fragment) if name in overlay
+                else fragment[name]
+                for name in self.names
+            }
+
+        return [represent(row) for row in rows]
+
+    @staticmethod
+    def build_fragments(snapshot, recipe_ids):
+        """Представления рецептов без полей, зависящих от пользователя.
+
+        Вместо ссылки на изображение хранится имя файла: абсолютная ссылка
+        зависит от адреса, по которому пришёл запрос.
+        """
+        tags = defaultdict(list)
+        for recipe_id, tag_id in RecipeTag.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'tag_id'):
+            tags[recipe_id].append(tag_id)
+        ingredients = defaultdict(list)
+        items = RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('id').values_list(
+            'recipe_id',
+            'ingredient_id',
+            'amount'
+        )
+        for recipe_id, ingredient_id, amount in items:
+            ingredients[recipe_id].append((ingredient_id, amount))
+        if not snapshot.covers(
+            tag_ids=chain.from_iterable(tags.values()),
+            ingredient_ids=(
+                ingredient_id
+                for items in ingredients.values()
+                for ingredient_id, _ in items
+            ),
+        ):
+            return None
+        ingredient_data = snapshot.ingredient_data_by_id
+        return {
+            row['id']: {
+                'id': row['id'],
+                'tags': snapshot.recipe_tags(tags[row['id']]),
+                'author': {
+                    name: row[f'author__{name}'] for name in AUTHOR_FIELDS
+                },
+                'ingredients': [
+                    {**ingredient_data[ingredient_id], 'amount': amount}
+                    for ingredient_id, amount in ingredients[row['id']]
+                ],
+                **{name: row[name] for name in RECIPE_COLUMNS},
+            }
+            for row in Recipe.objects.filter(id__in=recipe_ids).values(
+                'id',
+                *RECIPE_COLUMNS,
+                *(f'author__{name}' for name in AUTHOR_FIELDS)
+            )
+        }
+
+
+class SubscriptionFastSerializer:
+    """Быстрая замена SubscriptionSerializer для списка подписок текущего
+    пользователя: рецепты всех авторов страницы читаются одним запросом."""
+
+    def __init__(self, request):
+        self.request = request
+        self.names = selected_names(SubscriptionSerializer, request)
+
+    def values(self, queryset):
+        queryset = queryset.values(
+            'user_id',
+            'subscribed_author_id',
+            *(
+                f'subscribed_author__{name}' for name in AUTHOR_FIELDS
+                if name in self.names
+            ),
+        )
+        if 'recipes_count' in self.names:
+            queryset = queryset.annotate(
+                recipes_count=Count(
+                    'subscribed_author__recipes',
+                    filter=Q(
+                        subscribed_author__recipes__pending_deletion=False
+                    )
+                )
+            )
+        return queryset.order_by('-id')
+
+    def serialize(self, rows):
+        rows = list(rows)
+        recipes_limit = self.request.query_params.get('recipes_limit')
+        if recipes_limit and not recipes_limit.isdecimal():
+            return None
+        recipes = defaultdict(list)
+        if 'recipes' in self.names:
+            for recipe in Recipe.objects.filter(
+                    author_id__in=[
+                        row['subscribed_author_id'] for row in rows
+                    ]
+            ).order_by('-id').values('author_id', *SHORT_RECIPE_FIELDS):
+                recipes[recipe['author_id']].append(recipe)
+        image = image_url(self.request)
+
+        def recipe_list(row):
+            items = recipes[row['subscribed_author_id']]
+            if recipes_limit:
+                items = items[:int(recipes_limit)]
+            return [
+                {
+                    'id': recipe['id'],
+                    'name': recipe['name'],
+                    'image': image(recipe['image']),
+                    'cooking_time': recipe['cooking_time'],
+                }
+                for recipe in items
+            ]
+
+        accessors = {
+            'is_subscribed': lambda row: True,
+            'recipes': recipe_list,
+            'recipes_count': itemgetter('recipes_count'),
+            'user': itemgetter('user_id'),
+            'subscribed_author': itemgetter('subscribed_author_id'),
+            **{
+                name: itemgetter(f'subscribed_author__{name}')
+                for name in AUTHOR_FIELDS
+            },
+        }
+        accessors = [(name, accessors[name]) for name in self.names]
+        return [
+            {name: get(row) for name, get in accessors} for row in rows
+        ]
@@ -1,5 +1,5 @@
 from django_filters.rest_framework import (BooleanFilter, CharFilter,
-                                           FilterSet,
+                                           ChoiceFilter, FilterSet,
                                            ModelMultipleChoiceFilter)
 
 from recipes.models import Ingredient, Recipe, Tag
@@ -21,6 +21,10 @@ class RecipeFilter(FilterSet):
         to_field_name='slug',
         queryset=Tag.objects.all()
     )
+    ordering = ChoiceFilter(
+        choices=(('popular', 'По популярности'),),
+        method='order_by_popularity'
+    )
 
     class Meta:
         model = Recipe
@@ -29,18 +33,33 @@ class RecipeFilter(FilterSet):
             'is_in_shopping_cart',
             'author',
             'tags',
+            'ordering',
         )
 
     def get_is_favorited(self, queryset, name, value):
         if value:
-            return Recipe.objects.filter(
+            return queryset.filter(
                 recipes_favoritesrecipe_related__user=self.request.user
             )
-        return Recipe.objects.all()
+        return queryset
 
     def get_is_in_shopping_cart(self, queryset, name, value):
         if value:
-            return Recipe.objects.filter(
+            return queryset.filter(
                 recipes_shoppinglist_related__user=self.request.user
             )
-        return Recipe.objects.all()
+        return queryset
+
+    def order_by_popularity(self, queryset, name, value):
+        """Сортирует по рейтингу популярности, а при фильтре по одному тегу
+        - по рейтингу внутри этого тега."""
+        tags = set(self.data.getlist('tags'))
+        if len(tags) == 1:
+            queryset = queryset.filter(popularity__tag__slug=tags.pop())
+        else:
+            # Условие на score не даёт сделать соединение внешним.
+            queryset = queryset.filter(
+                popularity__tag=None,
+                popularity__score__isnull=False
+            )
+        return queryset.order_by('-popularity__score', '-id')
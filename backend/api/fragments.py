@@ -0,0 +1,61 @@
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache, caches
+
+VERSION_KEY = 'recipe-fragment-version:{}'
+
+FRAGMENT_KEY = 'recipe-fragment:{}:{}:{}'
+
+
+def forget_recipes(*recipe_ids):
+    """Сбрасывает версии рецептов, после чего их фрагменты строятся заново."""
+    cache.delete_many([VERSION_KEY.format(pk) for pk in recipe_ids])
+
+
+def recipe_versions(recipe_ids):
+    keys = {pk: VERSION_KEY.format(pk) for pk in recipe_ids}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for pk, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, None)
+            version = cache.get(key)
+        versions[pk] = version
+    return versions
+
+
+def load_fragments(recipe_ids, generation, build):
+    """Не зависящие от пользователя представления рецептов recipe_ids.
+
+    Фрагменты читаются из кэша одним запросом по id рецепта, его версии и
+    поколению generation справочных данных. Ключ фрагмента не меняет
+    значения, поэтому фрагменты хранятся в двухуровневом кэше и чаще всего
+    читаются из памяти процесса, а версии - в общем кэше. Недостающие
+    строит функция build(ids), которая возвращает словарь id -> фрагмент
+    или None, если построить их нельзя; тогда load_fragments тоже
+    возвращает None.
+    """
+    versions = recipe_versions(recipe_ids)
+    keys = {
+        pk: FRAGMENT_KEY.format(generation, pk, versions[pk])
+        for pk in recipe_ids
+    }
+    fragments_cache = caches[settings.TIERED_CACHE]
+    found = fragments_cache.get_many(keys.values())
+    fragments = {
+        pk: found[key] for pk, key in keys.items() if key in found
+    }
+    missing = [pk for pk in recipe_ids if pk not in fragments]
+    if not missing:
+        return fragments
+    built = build(missing)
+    if built is None or len(built) != len(missing):
+        return None
+    fragments_cache.set_many(
+        {keys[pk]: fragment for pk, fragment in built.items()},
+        settings.RECIPE_FRAGMENTS_TIMEOUT
+    )
+    fragments.update(built)
+    return fragments
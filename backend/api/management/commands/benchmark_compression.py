@@ -0,0 +1,90 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.renderers import JSONRenderer
+
+from api.compression import available_encodings, compress
+from api.renderers import FastJSONRenderer
+
+LEVELS = {
+    'gzip': (1, 6, 9),
+    'br': (1, 4, 6, 11),
+}
+
+
+class Command(BaseCommand):
+    help = ("Renders recipe list pages with the standard and the orjson "
+            "renderer, then compresses them with gzip and brotli at several "
+            "levels and reports CPU time against bytes on the wire.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limits',
+            type=int,
+            nargs='+',
+            default=(6, 20, 100),
+            help='Page sizes of the recipe list to measure.'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--bandwidth',
+            type=float,
+            default=10,
+            help='Link speed in Mbit/s used to estimate transfer time.'
+        )
+
+    def handle(self, *args, **options):
+        client = Client(HTTP_ACCEPT_ENCODING='identity')
+        for limit in options['limits']:
+            with override_settings(ALLOWED_HOSTS=['testserver']):
+                response = client.get('/api/recipes/', {'limit': limit})
+            if response.status_code != 200:
+                raise CommandError(
+                    f'Recipe list returned {response.status_code}!'
+                )
+            self.report(limit, response.data, options)
+
+    def report(self, limit, data, options):
+        standard = self.measure(lambda: JSONRenderer().render(data), options)
+        fast = self.measure(lambda: FastJSONRenderer().render(data), options)
+        content = FastJSONRenderer().render(data)
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'limit={limit}: {len(content)} bytes, render json '
+            f'{standard * 1000:.3f} ms, orjson {fast * 1000:.3f} ms'
+        ))
+        self.stdout.write(
+            f'{"encoding":<10} {"bytes":>8} {"ratio":>6} '
+            f'{"cpu ms":>8} {"wire ms":>8} {"total ms":>9}'
+        )
+        byte_time = 8 / (options['bandwidth'] * 1e6) * 1000
+        rows = [('identity', content, 0.0)]
+        for coding in available_encodings():
+            for level in LEVELS[coding]:
+                rows.append((
+                    f'{coding}-{level}',
+                    compress(content, coding, level),
+                    self.measure(
+                        lambda coding=coding, level=level: compress(
+                            content,
+                            coding,
+                            level
+                        ),
+                        options
+                    ) * 1000,
+                ))
+        for name, body, cpu in rows:
+            wire = len(body) * byte_time
+            self.stdout.write(
+                f'{name:<10} {len(body):>8} '
+                f'{len(content) / len(body):>6.1f} {cpu:>8.3f} '
+                f'{wire:>8.3f} {cpu + wire:>9.3f}'
+            )
+
+    @staticmethod
+    def measure(function, options):
+        started = perf_counter()
+        for _ in range(options['repeat']):
+            function()
+        return (perf_counter() - started) / options['repeat']
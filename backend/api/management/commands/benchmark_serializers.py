@@ -0,0 +1,118 @@
+from time import perf_counter
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.fast_serializers import (RecipeFastSerializer,
+                                  SubscriptionFastSerializer)
+from api.reference import reference_data
+from api.serializers import GetRecipeSerializer, SubscriptionSerializer
+from recipes.models import Recipe, Subscription
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = ("Compares the DRF serializers with the fast values()-based ones "
+            "on recipes and subscriptions from the database: time per "
+            "object including queries, number of queries, and whether the "
+            "rendered JSON is byte-identical.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--fields',
+            default='',
+            help='Value of the fields query parameter, e.g. id,name,image.'
+        )
+
+    def handle(self, *args, **options):
+        user = CustomUser.objects.filter(subscriber__isnull=False).first()
+        reference_data.get()
+        failed = False
+        self.stdout.write(
+            f'{"serializer":<14} {"user":<6} {"objects":>7} '
+            f'{"drf us":>8} {"fast us":>8} {"drf q":>6} {"fast q":>6} '
+            f'{"same":>5}'
+        )
+        for anonymous in (True, False):
+            request = self.request(options, None if anonymous else user)
+            fields = GetRecipeSerializer.requested_fields(request)
+            recipes = Recipe.objects.with_related(fields).with_user_flags(
+                request.user,
+                fields
+            )[:options['limit']]
+            failed |= not self.compare(
+                'recipes',
+                request,
+                options,
+                lambda: GetRecipeSerializer(
+                    list(recipes),
+                    many=True,
+                    context={'request': request}
+                ).data,
+                lambda: RecipeFastSerializer(request).serialize(
+                    RecipeFastSerializer(request).values(recipes)
+                ),
+            )
+        if user is not None:
+            request = self.request(options, user)
+            subscriptions = Subscription.objects.filter(user=user)[
+                :options['limit']
+            ]
+            failed |= not self.compare(
+                'subscriptions',
+                request,
+                options,
+                lambda: SubscriptionSerializer(
+                    list(subscriptions),
+                    many=True,
+                    context={'request': request}
+                ).data,
+                lambda: SubscriptionFastSerializer(request).serialize(
+                    SubscriptionFastSerializer(request).values(
+                        Subscription.objects.filter(user=user)
+                    )[:options['limit']]
+                ),
+            )
+        if failed:
+            raise CommandError('Fast serializers changed the response!')
+
+    def request(self, options, user):
+        params = {'fields': options['fields']} if options['fields'] else {}
+        request = Request(APIRequestFactory().get('/', params))
+        request.user = user or AnonymousUser()
+        return request
+
+    def compare(self, name, request, options, slow, fast):
+        renderer = JSONRenderer()
+        results = {}
+        for label, serialize in (('drf', slow), ('fast', fast)):
+            with CaptureQueriesContext(connection) as queries:
+                data = serialize()
+            started = perf_counter()
+            for _ in range(options['repeat']):
+                serialize()
+            elapsed = (perf_counter() - started) / options['repeat']
+            results[label] = (
+                renderer.render(data),
+                elapsed / max(len(data), 1) * 1e6,
+                len(queries),
+                len(data),
+            )
+        same = results['drf'][0] == results['fast'][0]
+        style = self.style.SUCCESS if same else self.style.ERROR
+        self.stdout.write(style(
+            f'{name:<14} '
+            f'{"anon" if request.user.is_anonymous else "auth":<6} '
+            f'{results["drf"][3]:>7} '
+            f'{results["drf"][1]:>8.1f} {results["fast"][1]:>8.1f} '
+            f'{results["drf"][2]:>6} {results["fast"][2]:>6} '
+            f'{"yes" if same else "no":>5}'
+        ))
+        return same
@@ -0,0 +1,40 @@
+import os
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+from django.core.management import BaseCommand
+from drf_spectacular.renderers import OpenApiJsonRenderer, OpenApiYamlRenderer
+from drf_spectacular.settings import spectacular_settings
+
+from foodgram.schema import SCHEMA_FILES
+
+RENDERERS = {
+    'yaml': OpenApiYamlRenderer,
+    'json': OpenApiJsonRenderer,
+}
+
+
+class Command(BaseCommand):
+    help = ("Generates the OpenAPI schema once and writes it as YAML and "
+            "JSON files into SCHEMA_ROOT, from which /api/schema/ is served "
+            "without introspecting the serializers on every request.")
+
+    def handle(self, *args, **options):
+        generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+        schema = generator.get_schema(request=None, public=True)
+        os.makedirs(settings.SCHEMA_ROOT, exist_ok=True)
+        for schema_format, (name, _) in SCHEMA_FILES.items():
+            content = RENDERERS[schema_format]().render(
+                schema,
+                renderer_context={}
+            )
+            path = os.path.join(settings.SCHEMA_ROOT, name)
+            with NamedTemporaryFile(
+                    dir=settings.SCHEMA_ROOT,
+                    delete=False
+            ) as file:
+                file.write(content)
+            os.chmod(file.name, 0o644)
+            os.replace(file.name, path)
+            self.stdout.write(f'{path}: {len(content)} bytes')
+        self.stdout.write(self.style.SUCCESS('The schema is built!'))
@@ -0,0 +1,102 @@
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from statistics import median, quantiles
+from urllib.request import urlopen
+
+from django.conf import settings
+from django.core.management import BaseCommand
+
+PATHS = (
+    '/api/tags/',
+    '/api/ingredients/?name=%D0%B0',
+    '/api/recipes/',
+)
+
+SERVERS = {
+    'WSGI': ['foodgram.wsgi:application'],
+    'ASGI': ['-c', 'gunicorn_asgi.conf.py'],
+}
+
+
+class Command(BaseCommand):
+    help = ("Starts gunicorn with sync WSGI workers and then with uvicorn "
+            "ASGI workers on the same number of processes, loads both with "
+            "the same concurrent read requests and compares throughput.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        results = {}
+        for name, target in SERVERS.items():
+            server = self.start_server(target, options)
+            try:
+                results[name] = self.load(options)
+            finally:
+                server.terminate()
+                server.wait()
+        self.stdout.write(
+            f'{"server":<6} {"req/s":>9} {"p50 ms":>8} {"p95 ms":>8} '
+            f'{"errors":>7}'
+        )
+        for name, (rps, p50, p95, errors) in results.items():
+            self.stdout.write(
+                f'{name:<6} {rps:>9.1f} {p50:>8.1f} {p95:>8.1f} {errors:>7}'
+            )
+
+    def start_server(self, target, options):
+        address = f'127.0.0.1:{options["port"]}'
+        server = subprocess.Popen(
+            [
+                sys.executable, '-m', 'gunicorn', *target,
+                '--bind', address,
+                '--workers', str(options['workers']),
+                '--log-level', 'warning',
+            ],
+            cwd=settings.BASE_DIR,
+            env={
+                **os.environ,
+                'ALLOWED_HOSTS': '127.0.0.1',
+                'THROTTLE_ENABLED': 'False',
+            },
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                urlopen(f'http://{address}/api/tags/', timeout=1).read()
+            except OSError:
+                time.sleep(0.2)
+            else:
+                return server
+        server.terminate()
+        raise RuntimeError(f'The server on {address} did not start!')
+
+    def load(self, options):
+        base_url = f'http://127.0.0.1:{options["port"]}'
+
+        def fetch(number):
+            url = base_url + PATHS[number % len(PATHS)]
+            started = time.perf_counter()
+            try:
+                urlopen(url, timeout=30).read()
+            except OSError:
+                return None
+            return (time.perf_counter() - started) * 1000
+
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            started = time.perf_counter()
+            timings = list(executor.map(fetch, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        successful = [timing for timing in timings if timing is not None]
+        return (
+            len(successful) / elapsed,
+            median(successful),
+            quantiles(successful, n=20)[-1],
+            len(timings) - len(successful),
+        )
@@ -0,0 +1,127 @@
+import subprocess
+import sys
+from statistics import median
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+# Загрузка воркера: настройка Django, приложение WSGI/ASGI и URL-конфигурация,
+# которую Django импортирует при первом запросе.
+STARTUP = (
+    'import importlib, time\n'
+    'started = time.perf_counter()\n'
+    'import django\n'
+    'django.setup()\n'
+    'importlib.import_module({application!r})\n'
+    'importlib.import_module({urlconf!r})\n'
+    'print(time.perf_counter() - started)\n'
+)
+
+
+def parse_importtime(output):
+    """Разбирает вывод python -X importtime в список (модуль, собственное
+    время, глубина вложенности) в порядке вывода."""
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or '[us]' in line:
+            continue
+        own, _, name = line.partition(':')[2].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules.append((name.strip(), int(own), depth))
+    return modules
+
+
+def group_times(modules, groups):
+    """Суммирует собственное время импорта модулей по группам: приложениям
+    проекта и пакетам верхнего уровня.
+
+    Для каждой группы запоминается модуль, который импортировал её первым:
+    ближайший модуль проекта, а если его нет - ближайший модуль другого
+    пакета.
+    """
+    times, importers = {}, {}
+    parents = []
+    # Родитель выводится после вложенных модулей, поэтому вывод читается с
+    # конца, а первым импортом группы оказывается последний прочитанный.
+    for name, own, depth in reversed(modules):
+        del parents[depth:]
+        group = name.split('.')[0]
+        times[group] = times.get(group, 0) + own
+        others = [
+            parent for parent in reversed(parents)
+            if parent.split('.')[0] != group
+        ]
+        importers[group] = next(
+            (parent for parent in others if parent.split('.')[0] in groups),
+            others[0] if others else ''
+        )
+        parents.append(name)
+    return times, importers
+
+
+class Command(BaseCommand):
+    help = ("Starts fresh Python processes that load the project like a "
+            "worker does and reports the import time per project app and "
+            "per third-party package, to track worker cold-start latency.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--asgi',
+            action='store_true',
+            help='Load the ASGI application instead of the WSGI one.'
+        )
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument(
+            '--top',
+            type=int,
+            default=15,
+            help='Number of the slowest packages to show.'
+        )
+
+    def handle(self, *args, **options):
+        application = (
+            settings.ASGI_APPLICATION if options['asgi']
+            else settings.WSGI_APPLICATION
+        ).rpartition('.')[0]
+        code = STARTUP.format(
+            application=application,
+            urlconf=settings.ROOT_URLCONF
+        )
+        groups = {
+            config.name.split('.')[0]
+            for config in apps.get_app_configs()
+            if config.path.startswith(str(settings.BASE_DIR))
+        } | {settings.ROOT_URLCONF.split('.')[0]}
+        totals, runs = [], []
+        for _ in range(options['repeat']):
+            result = subprocess.run(
+                [sys.executable, '-X', 'importtime', '-c', code],
+                cwd=settings.BASE_DIR,
+                capture_output=True,
+                text=True
+            )
+            if result.returncode:
+                raise CommandError(result.stderr.strip().splitlines()[-1])
+            totals.append(float(result.stdout.strip().splitlines()[-1]))
+            runs.append(group_times(parse_importtime(result.stderr), groups))
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f'{application}: startup {median(totals) * 1000:.1f} ms '
+            f'(median of {len(totals)})'
+        ))
+        self.stdout.write(f'{"package":<24} {"import ms":>10}  imported by')
+        times = {
+            group: median(run[0].get(group, 0) for run in runs)
+            for group in runs[0][0]
+        }
+        ranking = sorted(times, key=times.get, reverse=True)
+        shown = [group for group in ranking if group in groups]
+        shown += [
+            group for group in ranking if group not in groups
+        ][:options['top']]
+        for group in shown:
+            name = f'{group} (app)' if group in groups else group
+            self.stdout.write(
+                f'{name:<24} {times[group] / 1000:>10.1f}  '
+                f'{runs[0][1][group]}'
+            )
@@ -0,0 +1,94 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+
+from recipes.models import FavoritesRecipe, Recipe, ShoppingList, Subscription
+from users.models import CustomUser
+
+EXPECTED = {
+    'POST': {201: 1, 400: None},
+    'DELETE': {204: 1, 400: None},
+}
+
+
+class Command(BaseCommand):
+    help = ("Sends the same favorite, shopping cart and subscribe request "
+            "from many threads at once and checks that exactly one of them "
+            "succeeds and none fails with a server error. The created "
+            "favorite, cart entry and subscription are removed at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=5)
+
+    def handle(self, *args, **options):
+        user, recipe, author = self.pick_objects()
+        token, _ = Token.objects.get_or_create(user=user)
+        targets = {
+            f'/api/recipes/{recipe.id}/favorite/': FavoritesRecipe.objects
+            .filter(user=user, recipe=recipe),
+            f'/api/recipes/{recipe.id}/shopping_cart/': ShoppingList.objects
+            .filter(user=user, recipe=recipe),
+            f'/api/users/{author.id}/subscribe/': Subscription.objects
+            .filter(user=user, subscribed_author=author),
+        }
+        failed = False
+        with override_settings(
+            ALLOWED_HOSTS=['testserver'],
+            THROTTLE_ENABLED=False
+        ):
+            for path, existing in targets.items():
+                existing.delete()
+                for _ in range(options['rounds']):
+                    for method in EXPECTED:
+                        statuses = self.hammer(path, method, token, options)
+                        failed |= not self.report(path, method, statuses)
+                existing.delete()
+        if failed:
+            raise CommandError('Concurrent requests were not idempotent!')
+        self.stdout.write(self.style.SUCCESS('All concurrent toggles passed!'))
+
+    def pick_objects(self):
+        recipe = Recipe.objects.select_related('author').first()
+        if recipe is None:
+            raise CommandError('At least one recipe is required!')
+        user = CustomUser.objects.exclude(id=recipe.author_id).first()
+        if user is None:
+            raise CommandError('A user besides the recipe author is required!')
+        return user, recipe, recipe.author
+
+    def hammer(self, path, method, token, options):
+        barrier = Barrier(options['threads'])
+
+        def send(_):
+            client = Client(HTTP_AUTHORIZATION=f'Token {token.key}')
+            barrier.wait()
+            try:
+                return client.generic(method, path).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(options['threads']) as executor:
+            return Counter(executor.map(send, range(options['threads'])))
+
+    def report(self, path, method, statuses):
+        expected = EXPECTED[method]
+        passed = set(statuses) <= set(expected) and all(
+            statuses[status] == count
+            for status, count in expected.items()
+            if count is not None
+        )
+        style = self.style.SUCCESS if passed else self.style.ERROR
+        self.stdout.write(style(
+            f'{method:<6} {path:<32} ' + ', '.join(
+                f'{status}: {count}'
+                for status, count in sorted(statuses.items())
+            )
+        ))
+        return passed
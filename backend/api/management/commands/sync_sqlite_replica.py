@@ -0,0 +1,33 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management import BaseCommand, CommandError
+
+from foodgram.db.routers import PRIMARY, REPLICA
+
+
+class Command(BaseCommand):
+    help = ("Copies the primary SQLite database into the SQLite replica, "
+            "imitating replication for local testing of the read replica "
+            "router.")
+
+    def handle(self, *args, **kwargs):
+        databases = settings.DATABASES
+        if REPLICA not in databases:
+            raise CommandError(
+                'The replica is not configured, set DB_REPLICA_SQLITE_NAME!'
+            )
+        if not all(
+                'sqlite3' in databases[alias]['ENGINE']
+                for alias in (PRIMARY, REPLICA)
+        ):
+            raise CommandError('Both databases must be SQLite files!')
+        source = sqlite3.connect(databases[PRIMARY]['NAME'])
+        target = sqlite3.connect(databases[REPLICA]['NAME'])
+        with source, target:
+            source.backup(target)
+        source.close()
+        target.close()
+        self.stdout.write(
+            self.style.SUCCESS('The replica is synchronized with the primary!')
+        )
@@ -0,0 +1,84 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from api.compression import (compress, compress_chunks, is_compressible,
+                             negotiate, split)
+from api.reference import request_memo
+
+
+class ReferenceDataMiddleware:
+    """Ограничивает проверку версии справочных данных одним обращением к
+    общему кэшу за запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_memo.set({})
+        try:
+            return self.get_response(request)
+        finally:
+            request_memo.reset(token)
+
+
+class CompressionMiddleware:
+    """Сжимает ответы в brotli или gzip в зависимости от Accept-Encoding.
+
+    Ответы меньше COMPRESSION_MIN_SIZE отдаются как есть, а ответы больше
+    COMPRESSION_STREAMING_SIZE и потоковые ответы сжимаются по частям.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.has_header('Content-Encoding')
+                or not is_compressible(response.get('Content-Type', ''))):
+            return response
+        if (not response.streaming
+                and len(response.content) < settings.COMPRESSION_MIN_SIZE):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = negotiate(request.headers.get('Accept-Encoding', ''))
+        if coding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_chunks(
+                response.streaming_content,
+                coding,
+                flush=True
+            )
+            del response.headers['Content-Length']
+        elif len(response.content) >= settings.COMPRESSION_STREAMING_SIZE:
+            response = self.streaming_response(response, coding)
+        else:
+            content = compress(response.content, coding)
+            if len(content) >= len(response.content):
+                return response
+            response.content = content
+            response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = coding
+        # Сжатый ответ побайтно отличается от исходного, поэтому его ETag
+        # становится слабым, как в django.middleware.gzip.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        return response
+
+    @staticmethod
+    def streaming_response(response, coding):
+        streaming = StreamingHttpResponse(
+            compress_chunks(
+                split(response.content, settings.COMPRESSION_CHUNK_SIZE),
+                coding
+            ),
+            status=response.status_code,
+            reason=response.reason_phrase,
+        )
+        for header, value in response.items():
+            if header.lower() != 'content-length':
+                streaming.headers[header] = value
+        streaming.cookies = response.cookies
+        return streaming
@@ -1,4 +1,7 @@
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class NumberRecordsPerPagePagination(PageNumberPagination):
@@ -7,3 +10,42 @@ class NumberRecordsPerPagePagination(PageNumberPagination):
 
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination:
+    """Пагинация по ключу: следующая страница начинается с записей, id
+    которых меньше последнего id текущей страницы."""
+
+    page_size = 6
+    max_page_size = 100
+    page_size_query_param = 'limit'
+    cursor_query_param = 'before'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        if not cursor.isdigit() or int(cursor) <= 0:
+            raise ValidationError(
+                {self.cursor_query_param: 'Укажите положительное целое число!'}
+            )
+        return int(cursor)
+
+    def get_paginated_response(self, request, data, next_cursor):
+        next_link = None
+        if next_cursor is not None:
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                next_cursor
+            )
+        return Response({'next': next_link, 'results': data})
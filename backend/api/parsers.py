@@ -0,0 +1,30 @@
+from io import BytesIO
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+UTF8 = ('utf-8', 'utf8')
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser на orjson.
+
+    Тело запроса, которое orjson не смог разобрать, разбирается стандартным
+    JSONParser, поэтому сообщения об ошибках не меняются.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower() not in UTF8:
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(BytesIO(body), media_type, parser_context)
@@ -0,0 +1,132 @@
+from contextvars import ContextVar
+from hashlib import sha1
+from operator import attrgetter
+from threading import Lock
+from uuid import uuid4
+
+from django.core.cache import cache
+from django.utils.http import parse_etags
+from rest_framework.renderers import JSONRenderer
+
+from recipes.models import Ingredient, Tag
+
+VERSION_KEY = 'reference-data-version'
+
+request_memo = ContextVar('reference_data_request_memo', default=None)
+
+
+def read_version():
+    version = cache.get(VERSION_KEY)
+    if version is not None:
+        return version
+    cache.add(VERSION_KEY, uuid4().hex, None)
+    return cache.get(VERSION_KEY)
+
+
+def bump_version():
+    cache.set(VERSION_KEY, uuid4().hex, None)
+
+
+def not_modified(request, etag):
+    """Слабое сравнение ETag: CompressionMiddleware делает ETag сжатых
+    ответов слабым, и клиент присылает его с префиксом W/."""
+    if_none_match = request.headers.get('If-None-Match')
+    return bool(if_none_match) and (
+        if_none_match.strip() == '*' or etag in (
+            tag[2:] if tag.startswith('W/') else tag
+            for tag in parse_etags(if_none_match)
+        )
+    )
+
+
+class ReferenceSnapshot:
+    """Неизменяемый снимок тегов и ингредиентов одной версии вместе с их
+    готовым представлением для API."""
+
+    def __init__(self, version, tags, ingredients):
+        from api.fast_serializers import (IngredientFastSerializer,
+                                          TagFastSerializer)
+
+        self.version = version
+        self.tags = {tag.pk: tag for tag in tags}
+        self.ingredients = {
+            ingredient.pk: ingredient for ingredient in ingredients
+        }
+        self.tag_data = tuple(
+            TagFastSerializer(getter=attrgetter).many(tags)
+        )
+        self.ingredient_data = tuple(
+            IngredientFastSerializer(getter=attrgetter).many(ingredients)
+        )
+        self.tag_data_by_id = {data['id']: data for data in self.tag_data}
+        self.ingredient_data_by_id = {
+            data['id']: data for data in self.ingredient_data
+        }
+        self.digest = sha1(JSONRenderer().render(
+            [self.tag_data, self.ingredient_data]
+        )).hexdigest()
+
+    @classmethod
+    def load(cls, version):
+        return cls(version, list(Tag.objects.all()),
+                   list(Ingredient.objects.all()))
+
+    def etag(self, *parts):
+        key = ':'.join((self.digest, *map(str, parts)))
+        return f'"{sha1(key.encode()).hexdigest()}"'
+
+    def covers(self, tag_ids=(), ingredient_ids=()):
+        return (all(pk in self.tags for pk in tag_ids)
+                and all(pk in self.ingredients for pk in ingredient_ids))
+
+    def get(self, model, pk):
+        return (self.tags if model is Tag else self.ingredients).get(pk)
+
+    def filter_ingredients(self, name=None):
+        """Аналог фильтра name__istartswith по уже загруженным данным."""
+        if not name:
+            return list(self.ingredient_data)
+        name = name.lower()
+        return [
+            data for data in self.ingredient_data
+            if data['name'].lower().startswith(name)
+        ]
+
+    def recipe_tags(self, tag_ids):
+        """Теги рецепта в порядке сортировки модели Tag."""
+        tag_ids = set(tag_ids)
+        return [data for data in self.tag_data if data['id'] in tag_ids]
+
+
+class ReferenceData:
+    """Хранит в процессе снимок справочных данных и перезагружает его при
+    смене версии в общем кэше.
+
+    Версия меняется сигналами моделей Tag и Ingredient, а проверяется не
+    чаще одного раза за запрос благодаря ReferenceDataMiddleware.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.lock = Lock()
+
+    def version(self):
+        memo = request_memo.get()
+        if memo is None:
+            return read_version()
+        if 'version' not in memo:
+            memo['version'] = read_version()
+        return memo['version']
+
+    def get(self):
+        version = self.version()
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self.lock:
+            if self.snapshot is None or self.snapshot.version != version:
+                self.snapshot = ReferenceSnapshot.load(version)
+            return self.snapshot
+
+
+reference_data = ReferenceData()
@@ -0,0 +1,43 @@
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+ORJSON_OPTIONS = (
+    orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+    if orjson is not None else 0
+)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же форматом ответа.
+
+    Даты, время, Decimal и прочие типы сериализуются кодировщиком DRF. Ответы
+    с отступами, значения, которые orjson не поддерживает, и окружение без
+    orjson обрабатывает стандартный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (orjson is None or data is None or self.get_indent(
+                accepted_media_type,
+                renderer_context or {}
+        ) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=ORJSON_OPTIONS
+            )
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как и JSONRenderer, экранируем разделители строк для JavaScript.
+        return ret.replace(
+            '\u2028'.encode(),
+            b'\\u2028'
+        ).replace(
+            '\u2029'.encode(),
+            b'\\u2029'
+        )
@@ -1,17 +1,102 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
-from rest_framework.fields import ReadOnlyField, SerializerMethodField
+from drf_spectacular.utils import extend_schema_field
+from rest_framework import exceptions
+from rest_framework.fields import (IntegerField, ListField, ReadOnlyField,
+                                   SerializerMethodField)
 from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.serializers import ModelSerializer
-from rest_framework.validators import UniqueTogetherValidator
+from rest_framework.serializers import (ListSerializer, ModelSerializer,
+                                        Serializer)
 
+from api.reference import reference_data
 from recipes.models import (FavoritesRecipe, Ingredient, Recipe,
                             RecipeIngredient, ShoppingList, Subscription, Tag)
 from users.models import CustomUser
 
 
-class CustomUserSerializer(UserSerializer):
+class ReferencePrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """Находит тег или ингредиент по первичному ключу в снимке справочных
+    данных вместо запроса к базе данных."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            instance = reference_data.get().get(
+                self.get_queryset().model,
+                int(data)
+            )
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if instance is None:
+            return super().to_internal_value(data)
+        return instance
+
+
+class SparseFieldsetMixin:
+    """Оставляет в ответе только поля из параметра запроса fields и убирает
+    поля из параметра omit, например ?fields=id,name,image.
+
+    Поля удаляются до сериализации, поэтому методы ненужных полей не
+    вызываются. Параметры относятся только к сериализатору верхнего уровня,
+    вложенные сериализаторы возвращают все поля. Неизвестные имена полей
+    отклоняются с ответом 400 и перечнем доступных полей.
+    """
+
+    @classmethod
+    def readable_fields(cls):
+        extra_kwargs = getattr(cls.Meta, 'extra_kwargs', {})
+        return [
+            name for name in cls.Meta.fields
+            if not extra_kwargs.get(name, {}).get('write_only')
+        ]
+
+    @classmethod
+    def requested_fields(cls, request):
+        """Имена запрошенных полей или None, если параметры не переданы."""
+        readable = cls.readable_fields()
+        params = {
+            name: {value for value in request.GET.get(name, '').split(',')
+                   if value}
+            for name in ('fields', 'omit')
+        }
+        errors = {
+            name: (
+                f'Неизвестные поля: {", ".join(sorted(names - set(readable)))}'
+                f'. Доступные поля: {", ".join(readable)}.'
+            )
+            for name, names in params.items()
+            if names - set(readable)
+        }
+        if errors:
+            raise exceptions.ValidationError(errors)
+        if not params['fields'] and not params['omit']:
+            return None
+        selected = set(readable)
+        if params['fields']:
+            selected &= params['fields']
+        return selected - params['omit']
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        parent = self.parent
+        if isinstance(parent, ListSerializer):
+            parent = parent.parent
+        if request is None or parent is not None:
+            return fields
+        selected = self.requested_fields(request)
+        if selected is None:
+            return fields
+        return {
+            name: field for name, field in fields.items() if name in selected
+        }
+
+
+class CustomUserSerializer(SparseFieldsetMixin, UserSerializer):
     is_subscribed = SerializerMethodField()
 
     class Meta:
@@ -29,6 +114,8 @@ class CustomUserSerializer(UserSerializer):
         read_only_fields = ('is_subscribed',)
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         return (request.user.is_authenticated and Subscription.objects.filter(
             user=request.user,
@@ -65,16 +152,6 @@ class FavoritesRecipeSerializer(ModelSerializer):
             'recipe'
         )
 
-    def validate(self, data):
-        if FavoritesRecipe.objects.filter(
-                user=data['user'],
-                recipe=data['recipe']
-        ).exists():
-            raise ValidationError(
-                'Рецепт уже добавлен в Избранное!'
-            )
-        return data
-
     def to_representation(self, instance):
         return RecipesSubscribedAuthor(
             instance.recipe,
@@ -90,16 +167,6 @@ class ShoppingListSerializer(ModelSerializer):
             'recipe'
         )
 
-    def validate(self, data):
-        if ShoppingList.objects.filter(
-                user=data['user'],
-                recipe=data['recipe']
-        ).exists():
-            raise ValidationError(
-                'Рецепт уже добавлен в Список покупок!'
-            )
-        return data
-
     def to_representation(self, instance):
         return RecipesSubscribedAuthor(
             instance.recipe,
@@ -107,6 +174,19 @@ class ShoppingListSerializer(ModelSerializer):
         ).data
 
 
+class BulkRecipesSerializer(Serializer):
+    """Сериализатор списка id рецептов для добавления в Избранное или Список
+    покупок и удаления из них за один запрос."""
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_MAX_RECIPES,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class RecipesSubscribedAuthor(ModelSerializer):
     """Сериализатор для рецептов авторов на которых подписан пользователь."""
 
@@ -120,7 +200,7 @@ class RecipesSubscribedAuthor(ModelSerializer):
         )
 
 
-class SubscriptionSerializer(ModelSerializer):
+class SubscriptionSerializer(SparseFieldsetMixin, ModelSerializer):
     """Сериализатор для подписки/отписки на автора рецептов."""
     email = ReadOnlyField(source='subscribed_author.email')
     id = ReadOnlyField(source='subscribed_author.id')
@@ -145,20 +225,6 @@ class SubscriptionSerializer(ModelSerializer):
             'user',
             'subscribed_author',
         )
-        validators = [
-            UniqueTogetherValidator(
-                queryset=Subscription.objects.all(),
-                fields=('user', 'subscribed_author'),
-                message='Подписка уже оформлена!'
-            )
-        ]
-
-    def validate(self, data):
-        if data['subscribed_author'] == self.context.get('request').user:
-            raise ValidationError(
-                'Нельзя подписаться на самого себя!'
-            )
-        return data
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
@@ -205,7 +271,7 @@ class GetPatchIngredientInRecipeSerializer(ModelSerializer):
 class PostIngredientInRecipeSerializer(ModelSerializer):
     """Сериализатор для отображения количества ингредиентов при
     создании рецепта."""
-    id = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = ReferencePrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = RecipeIngredient
@@ -222,9 +288,9 @@ class PostIngredientInRecipeSerializer(ModelSerializer):
         return amount
 
 
-class GetRecipeSerializer(ModelSerializer):
+class GetRecipeSerializer(SparseFieldsetMixin, ModelSerializer):
     """Сериализатор для получения рецепта(ов)."""
-    tags = TagSerializer(read_only=True, many=True)
+    tags = SerializerMethodField()
     author = CustomUserSerializer(read_only=True)
     ingredients = SerializerMethodField()
     is_favorited = SerializerMethodField()
@@ -245,13 +311,31 @@ class GetRecipeSerializer(ModelSerializer):
             'cooking_time'
         )
 
+    def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
+        return super().to_representation(instance)
+
+    @extend_schema_field(TagSerializer(many=True))
+    def get_tags(self, obj):
+        snapshot = reference_data.get()
+        tag_ids = [recipe_tag.tag_id for recipe_tag in obj.recipetag_set.all()]
+        if not snapshot.covers(tag_ids=tag_ids):
+            return TagSerializer(obj.tags.all(), many=True).data
+        return snapshot.recipe_tags(tag_ids)
+
     def get_ingredients(self, obj):
-        return GetPatchIngredientInRecipeSerializer(
-            RecipeIngredient.objects.filter(recipe=obj),
-            many=True
-        ).data
+        ingredients = reference_data.get().ingredient_data_by_id
+        return [
+            {**ingredients[item.ingredient_id], 'amount': item.amount}
+            if item.ingredient_id in ingredients
+            else GetPatchIngredientInRecipeSerializer(item).data
+            for item in obj.recipeingredient_set.all()
+        ]
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         return (request.user.is_authenticated
                 and FavoritesRecipe.objects.filter(
@@ -260,6 +344,8 @@ class GetRecipeSerializer(ModelSerializer):
                 ).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         return (request.user.is_authenticated and ShoppingList.objects.filter(
             recipe=obj,
@@ -270,7 +356,7 @@ class GetRecipeSerializer(ModelSerializer):
 class PostPatchDeleteRecipeSerializer(ModelSerializer):
     """Сериализатор для создания, обновления, удаления рецепта."""
 
-    tags = PrimaryKeyRelatedField(
+    tags = ReferencePrimaryKeyRelatedField(
         queryset=Tag.objects.all(),
         many=True,
     )
@@ -321,6 +407,7 @@ class PostPatchDeleteRecipeSerializer(ModelSerializer):
             amount=ingredient['amount']
         ) for ingredient in ingredients)
 
+    @transaction.atomic
     def create(self, validated_data):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
@@ -332,6 +419,7 @@ class PostPatchDeleteRecipeSerializer(ModelSerializer):
         recipe.tags.set(tags)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' in validated_data:
             ingredients_data = validated_data.pop('ingredients')
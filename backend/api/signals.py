@@ -0,0 +1,193 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_tokens
+from api.events import author_channel, publish, user_channel
+from api.fast_serializers import AUTHOR_FIELDS
+from api.fragments import forget_recipes
+from api.reference import bump_version
+from recipes.deletion import recipes_hidden
+from recipes.feeds import (backfill, check_left_popular, fan_out,
+                           remove_from_feed)
+from recipes.models import (FavoritesRecipe, Ingredient, Recipe,
+                            RecipeIngredient, RecipeTag, RecipeTombstone,
+                            ShoppingList, Subscription, Tag)
+from recipes.popularity import register, sync_recipe
+from users.models import CustomUser
+
+
+@receiver((post_save, post_delete), sender=Tag)
+@receiver((post_save, post_delete), sender=Ingredient)
+def reference_data_changed(**kwargs):
+    transaction.on_commit(bump_version)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def reference_item_changed(sender, instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            **{'tags' if sender is Tag else 'ingredients': instance}
+        ).touch()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    transaction.on_commit(lambda: forget_tokens(instance.key))
+
+
+@receiver((post_save, post_delete), sender=CustomUser)
+def user_changed(instance, **kwargs):
+    # Токены сбрасываются после фиксации транзакции: иначе параллельный
+    # запрос успел бы снова закэшировать прежнего пользователя.
+    keys = list(Token.objects.filter(user_id=instance.pk).values_list(
+        'key',
+        flat=True
+    ))
+    transaction.on_commit(lambda: forget_tokens(*keys))
+
+
+@receiver(post_save, sender=CustomUser)
+def author_changed(instance, update_fields, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(
+        AUTHOR_FIELDS
+    ):
+        return
+    recipe_ids = list(Recipe.objects.filter(author=instance).values_list(
+        'id',
+        flat=True
+    ))
+    if recipe_ids:
+        Recipe.objects.filter(pk__in=recipe_ids).touch()
+        transaction.on_commit(lambda: forget_recipes(*recipe_ids))
+
+
+def deleted_with_recipe(origin):
+    """Удаление запущено удалением самого рецепта или его автора, и
+    отмечать рецепт изменённым не нужно."""
+    model = getattr(origin, 'model', type(origin))
+    return model in (Recipe, CustomUser)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+@receiver((post_save, post_delete), sender=RecipeTag)
+def recipe_changed(sender, instance, origin=None, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    if sender is not Recipe and not deleted_with_recipe(origin):
+        Recipe.objects.filter(pk=recipe_id).touch()
+    transaction.on_commit(lambda: forget_recipes(recipe_id))
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    if not instance.pending_deletion:
+        RecipeTombstone.objects.create(recipe_id=instance.pk)
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_relations_set(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else (instance.pk,)
+    Recipe.objects.filter(pk__in=recipe_ids).touch()
+    transaction.on_commit(lambda: forget_recipes(*recipe_ids))
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        sync_recipe(instance.pk)
+        message = {
+            'event': 'recipe',
+            'id': instance.pk,
+            'name': instance.name,
+            'author': instance.author_id,
+        }
+        transaction.on_commit(lambda: publish(
+            author_channel(instance.author_id),
+            message
+        ))
+    if created and settings.FEED_STRATEGY == 'fanout':
+        transaction.on_commit(lambda: fan_out(instance))
+
+
+def pantry_changed(*recipe_ids):
+    """Записывает изменение состава рецептов для индекса продуктов.
+
+    Модуль индекса импортирует numpy, поэтому загружается только при первом
+    изменении, а не при запуске воркера.
+    """
+    from recipes.pantry import record_change
+    record_change(*recipe_ids)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    recipe_id = instance.pk if sender is Recipe else instance.recipe_id
+    transaction.on_commit(lambda: pantry_changed(recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_set(instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else (instance.pk,)
+    transaction.on_commit(lambda: pantry_changed(*recipe_ids))
+
+
+@receiver(recipes_hidden)
+def recipes_hidden_from_api(recipe_ids, **kwargs):
+    def forget():
+        forget_recipes(*recipe_ids)
+        pantry_changed(*recipe_ids)
+
+    transaction.on_commit(forget)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear') and not reverse:
+        sync_recipe(instance.pk)
+
+
+@receiver(post_save, sender=FavoritesRecipe)
+@receiver(post_save, sender=ShoppingList)
+def recipe_added(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: register(sender, instance.recipe_id))
+
+
+def subscription_event(instance, active):
+    """Сообщает открытым потокам событий пользователя, что его подписки
+    изменились."""
+    message = {
+        'event': 'subscription',
+        'author': instance.subscribed_author_id,
+        'active': active,
+    }
+    transaction.on_commit(lambda: publish(
+        user_channel(instance.user_id),
+        message
+    ))
+
+
+@receiver(post_save, sender=Subscription)
+def subscription_created(instance, created, **kwargs):
+    if created:
+        subscription_event(instance, True)
+    if created and settings.FEED_STRATEGY == 'fanout':
+        transaction.on_commit(lambda: backfill(instance))
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    subscription_event(instance, False)
+    if settings.FEED_STRATEGY == 'fanout':
+        remove_from_feed(instance)
+        check_left_popular(instance.subscribed_author_id)
@@ -0,0 +1,343 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from threading import Barrier
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+
+from foodgram.db.routers import (PRIMARY, REPLICA, PrimaryReplicaRouter,
+                                 primary_pin_key, read_from_replica,
+                                 replica_configured)
+from recipes.feeds import feed_recipe_ids, forget_popular_authors
+from recipes.models import (FavoritesRecipe, FeedEntry, Recipe,
+                            RecipePopularity, ShoppingList, Subscription)
+from recipes.popularity import WEIGHTS, weighted_score
+from users.models import CustomUser
+
+THREADS = 16
+
+
+class TogglesFixtureMixin:
+    """Автор с рецептом и пользователи с токенами."""
+    users_count = 1
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password='password'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='Рецепт',
+            image='recipes/test.png',
+            text='Описание',
+            cooking_time=10
+        )
+        self.users = [
+            CustomUser.objects.create_user(
+                username=f'user{number}',
+                email=f'user{number}@example.com',
+                password='password'
+            )
+            for number in range(self.users_count)
+        ]
+        self.tokens = [
+            Token.objects.create(user=user).key for user in self.users
+        ]
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class TogglesTest(TogglesFixtureMixin, TestCase):
+    """Добавление и удаление избранного, списка покупок и подписки: связь
+    создаётся и удаляется одним запросом к её таблице, повтор получает 400,
+    а отсутствующий объект - 404."""
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.tokens[0]}')
+
+    def send(self, method, path, table):
+        """Отправляет запрос и возвращает его статус и запросы к таблице
+        связи table, кроме чтения для ответа после записи."""
+        with CaptureQueriesContext(connection) as queries:
+            status = self.client.generic(method, path).status_code
+        statements = [
+            query['sql'].split()[0] for query in queries.captured_queries
+            if table in query['sql']
+        ]
+        first_write = next(
+            (
+                index for index, statement in enumerate(statements)
+                if statement != 'SELECT'
+            ),
+            len(statements)
+        )
+        return status, [
+            statement for index, statement in enumerate(statements)
+            if statement != 'SELECT' or index < first_write
+        ]
+
+    def assert_toggle(self, path, relations):
+        table = relations.model._meta.db_table
+        self.assertEqual(self.send('POST', path, table), (201, ['INSERT']))
+        self.assertEqual(self.send('POST', path, table), (400, ['INSERT']))
+        self.assertEqual(relations.count(), 1)
+        self.assertEqual(self.send('DELETE', path, table), (204, ['DELETE']))
+        self.assertEqual(self.send('DELETE', path, table), (400, ['DELETE']))
+        self.assertEqual(relations.count(), 0)
+
+    def test_favorite_toggle(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            FavoritesRecipe.objects.filter(user=self.users[0])
+        )
+
+    def test_shopping_cart_toggle(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            ShoppingList.objects.filter(user=self.users[0])
+        )
+
+    def test_subscribe_toggle(self):
+        self.assert_toggle(
+            f'/api/users/{self.author.id}/subscribe/',
+            Subscription.objects.filter(user=self.users[0])
+        )
+
+    def test_missing_objects(self):
+        for method, path in (
+            ('POST', '/api/recipes/0/favorite/'),
+            ('DELETE', '/api/recipes/0/shopping_cart/'),
+            ('DELETE', '/api/recipes/%C2%B2/favorite/'),
+            ('DELETE', '/api/users/0/subscribe/'),
+        ):
+            with self.subTest(method=method, path=path):
+                self.assertEqual(
+                    self.client.generic(method, path).status_code,
+                    404
+                )
+
+    def test_recipe_pending_deletion(self):
+        Recipe.objects.filter(pk=self.recipe.pk).update(
+            pending_deletion=True
+        )
+        self.assertEqual(
+            self.client.post(
+                f'/api/recipes/{self.recipe.id}/favorite/'
+            ).status_code,
+            404
+        )
+        self.assertFalse(FavoritesRecipe.objects.exists())
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'Гонки параллельных запросов проверяются только на PostgreSQL.'
+)
+@override_settings(THROTTLE_ENABLED=False)
+class ConcurrentTogglesTest(TogglesFixtureMixin, TransactionTestCase):
+    """Одновременные одинаковые запросы на добавление и удаление избранного,
+    списка покупок и подписки: ровно один из них успешен, остальные получают
+    400, а рейтинг популярности учитывает каждое добавление один раз."""
+    users_count = THREADS
+
+    def send(self, method, path, tokens):
+        """Отправляет запросы с токенами tokens одновременно из разных
+        потоков и возвращает количество ответов каждого статуса."""
+        barrier = Barrier(len(tokens))
+
+        def request(token):
+            client = Client(HTTP_AUTHORIZATION=f'Token {token}')
+            barrier.wait()
+            try:
+                return client.generic(method, path).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(len(tokens)) as executor:
+            return Counter(executor.map(request, tokens))
+
+    def assert_toggle(self, path, relations):
+        token = [self.tokens[0]] * THREADS
+        self.assertEqual(
+            self.send('POST', path, token),
+            Counter({201: 1, 400: THREADS - 1})
+        )
+        self.assertEqual(relations.count(), 1)
+        self.assertEqual(
+            self.send('DELETE', path, token),
+            Counter({204: 1, 400: THREADS - 1})
+        )
+        self.assertEqual(relations.count(), 0)
+
+    def test_favorite_toggle(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            FavoritesRecipe.objects.filter(user=self.users[0])
+        )
+
+    def test_shopping_cart_toggle(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            ShoppingList.objects.filter(user=self.users[0])
+        )
+
+    def test_subscribe_toggle(self):
+        self.assert_toggle(
+            f'/api/users/{self.author.id}/subscribe/',
+            Subscription.objects.filter(user=self.users[0])
+        )
+
+    def test_popularity_counts_every_add_once(self):
+        path = f'/api/recipes/{self.recipe.id}/favorite/'
+        self.assertEqual(
+            self.send('POST', path, self.tokens * 2),
+            Counter({201: THREADS, 400: THREADS})
+        )
+        self.assertEqual(
+            FavoritesRecipe.objects.filter(recipe=self.recipe).count(),
+            THREADS
+        )
+        score = RecipePopularity.objects.get(
+            recipe=self.recipe,
+            tag=None
+        ).score
+        self.assertAlmostEqual(
+            score,
+            weighted_score(WEIGHTS[FavoritesRecipe] * THREADS),
+            places=3
+        )
+
+
+@skipUnless(
+    replica_configured(),
+    'Реплика проверяется при заданном DB_REPLICA_SQLITE_NAME или '
+    'DB_REPLICA_HOST.'
+)
+@override_settings(THROTTLE_ENABLED=False)
+class PrimaryReplicaRouterTest(TogglesFixtureMixin, TransactionTestCase):
+    """Безопасные запросы читают из реплики, после записи пользователь
+    закрепляется за основной базой данных, а флаг чтения из реплики
+    сбрасывается после каждого ответа.
+
+    В тестах реплика - зеркало основной тестовой базы (TEST['MIRROR']),
+    поэтому важно только, через какое соединение идут запросы.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        super().setUp()
+        cache.delete(primary_pin_key(self.users[0]))
+        self.client = Client(HTTP_AUTHORIZATION=f'Token {self.tokens[0]}')
+
+    def tearDown(self):
+        cache.delete(primary_pin_key(self.users[0]))
+        super().tearDown()
+
+    def read_aliases(self, path):
+        """Возвращает псевдонимы баз данных, из которых читалась таблица
+        рецептов при запросе path."""
+        table = Recipe._meta.db_table
+        with CaptureQueriesContext(connections[PRIMARY]) as primary:
+            with CaptureQueriesContext(connections[REPLICA]) as replica:
+                self.assertEqual(self.client.get(path).status_code, 200)
+        self.assertFalse(read_from_replica.get())
+        return {
+            alias
+            for alias, queries in ((PRIMARY, primary), (REPLICA, replica))
+            if any(
+                query['sql'].startswith('SELECT') and table in query['sql']
+                for query in queries.captured_queries
+            )
+        }
+
+    def test_router(self):
+        router = PrimaryReplicaRouter()
+        self.assertIsNone(router.db_for_read(Recipe))
+        token = read_from_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Recipe), REPLICA)
+            self.assertEqual(router.db_for_write(Recipe), PRIMARY)
+        finally:
+            read_from_replica.reset(token)
+        self.assertTrue(router.allow_migrate(PRIMARY, 'recipes'))
+        self.assertFalse(router.allow_migrate(REPLICA, 'recipes'))
+
+    def test_safe_request_reads_replica(self):
+        self.assertEqual(self.read_aliases('/api/recipes/'), {REPLICA})
+        self.assertEqual(
+            self.read_aliases(f'/api/recipes/{self.recipe.id}/'),
+            {REPLICA}
+        )
+
+    def test_write_pins_to_primary(self):
+        self.assertEqual(
+            self.client.post(
+                f'/api/recipes/{self.recipe.id}/favorite/'
+            ).status_code,
+            201
+        )
+        self.assertFalse(read_from_replica.get())
+        self.assertEqual(self.read_aliases('/api/recipes/'), {PRIMARY})
+        cache.delete(primary_pin_key(self.users[0]))
+        self.assertEqual(self.read_aliases('/api/recipes/'), {REPLICA})
+
+    def test_failed_request_resets_flag(self):
+        self.assertEqual(self.client.get('/api/recipes/0/').status_code, 404)
+        self.assertFalse(read_from_replica.get())
+        self.assertEqual(
+            self.client.post('/api/recipes/0/favorite/').status_code,
+            404
+        )
+        self.assertFalse(read_from_replica.get())
+        self.assertEqual(self.read_aliases('/api/recipes/'), {REPLICA})
+
+
+@override_settings(FEED_STRATEGY='fanout', FEED_FANOUT_THRESHOLD=2)
+class FanoutFeedTest(TogglesFixtureMixin, TestCase):
+    """Рецепты, опубликованные, пока автор был популярным, остаются в
+    лентах подписчиков после того, как он перестаёт быть популярным."""
+    users_count = 3
+
+    def setUp(self):
+        forget_popular_authors()
+        super().setUp()
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in self.users:
+                Subscription.objects.create(
+                    user=user,
+                    subscribed_author=self.author
+                )
+
+    def tearDown(self):
+        forget_popular_authors()
+        super().tearDown()
+
+    def test_recipes_stay_after_author_leaves_popular(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            popular_recipe = Recipe.objects.create(
+                author=self.author,
+                name='Рецепт популярного автора',
+                image='recipes/test.png',
+                text='Описание',
+                cooking_time=10
+            )
+        self.assertFalse(
+            FeedEntry.objects.filter(recipe=popular_recipe).exists()
+        )
+        expected = [popular_recipe.id, self.recipe.id]
+        self.assertEqual(feed_recipe_ids(self.users[1]), expected)
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.filter(user=self.users[0]).delete()
+        # Кэш популярных авторов истёк.
+        forget_popular_authors()
+        for user in self.users[1:]:
+            with self.subTest(user=user.username):
+                self.assertEqual(feed_recipe_ids(user), expected)
+        self.assertEqual(feed_recipe_ids(self.users[0]), [])
@@ -0,0 +1,164 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from random import random
+from time import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_SCOPE = 'default'
+
+
+class LocalBucketStore:
+    """Корзины токенов в памяти процесса: подходит для одного воркера.
+
+    Хранится не больше max_size корзин, давно не использованные
+    вытесняются - вытесненная корзина считается полной.
+    """
+
+    def __init__(self, max_size=100000):
+        self.buckets = OrderedDict()
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+    def take(self, key, cost, capacity, rate, now=None):
+        """Списывает cost токенов из корзины key и возвращает 0 или, если
+        токенов не хватает, число секунд до их накопления."""
+        now = time() if now is None else now
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens, wait = spend(tokens, updated, cost, capacity, rate, now)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBucketStore:
+    """Корзины токенов в файле SQLite, общем для всех воркеров одного
+    сервера.
+
+    Корзина читается и обновляется в транзакции BEGIN IMMEDIATE, поэтому
+    одновременные запросы из разных процессов не теряют списания. Полностью
+    пополнившиеся корзины время от времени удаляются.
+    """
+    cleanup_probability = 0.001
+
+    def __init__(self, path=None, timeout=5):
+        self.path = path or settings.THROTTLE_SQLITE_PATH
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS throttle_bucket ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, '
+                'updated REAL NOT NULL, full_at REAL NOT NULL)'
+            )
+            self.local.connection = connection
+        return connection
+
+    def take(self, key, cost, capacity, rate, now=None):
+        now = time() if now is None else now
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, updated FROM throttle_bucket WHERE key = ?',
+                (key,)
+            ).fetchone()
+            tokens, updated = row or (capacity, now)
+            tokens, wait = spend(tokens, updated, cost, capacity, rate, now)
+            connection.execute(
+                'INSERT INTO throttle_bucket (key, tokens, updated, full_at) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'tokens = excluded.tokens, updated = excluded.updated, '
+                'full_at = excluded.full_at',
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            if random() < self.cleanup_probability:
+                connection.execute(
+                    'DELETE FROM throttle_bucket WHERE full_at < ?',
+                    (now,)
+                )
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return wait
+
+
+def spend(tokens, updated, cost, capacity, rate, now):
+    """Пополняет корзину за прошедшее время и списывает cost токенов.
+
+    Возвращает новое число токенов и время ожидания: при нехватке токенов
+    они не списываются. Запрос дороже всей корзины стоит как вся корзина.
+    """
+    cost = min(cost, capacity)
+    tokens = min(capacity, tokens + max(now - updated, 0) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+@lru_cache(maxsize=None)
+def bucket_store():
+    return import_string(settings.THROTTLE_STORE)()
+
+
+def view_cost(view_class, action):
+    """Стоимость действия action в токенах из атрибута throttle_costs."""
+    return getattr(view_class, 'throttle_costs', {}).get(action, 1)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Ограничивает запросы корзинами токенов: отдельной для каждого
+    пользователя, а для анонимов - для каждого IP-адреса.
+
+    Корзины разделены по throttle_scope представления, а запрос списывает
+    из корзины столько токенов, сколько указано для его действия в
+    throttle_costs (по умолчанию 1). Ёмкость и скорость пополнения корзин
+    задаются в THROTTLE_BUCKETS, а хранилище - в THROTTLE_STORE.
+    THROTTLE_ENABLED=False отключает ограничения, например для нагрузочных
+    тестов. Запрос с атрибутом throttle_charged уже оплачен, например
+    асинхронным представлением, которое передало его синхронному.
+    """
+
+    def allow_request(self, request, view):
+        if (not settings.THROTTLE_ENABLED
+                or getattr(request, 'throttle_charged', False)):
+            return True
+        self.wait_seconds = self.bucket_wait(
+            request,
+            getattr(view, 'throttle_scope', DEFAULT_SCOPE),
+            view_cost(view, getattr(view, 'action', None))
+        )
+        return not self.wait_seconds
+
+    def bucket_wait(self, request, scope, cost):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            kind, ident = 'user', user.pk
+        else:
+            kind, ident = 'anon', self.get_ident(request)
+        bucket = settings.THROTTLE_BUCKETS[kind]
+        return bucket_store().take(
+            f'{scope}:{kind}:{ident}',
+            cost,
+            bucket['capacity'],
+            bucket['rate']
+        )
+
+    def wait(self):
+        return self.wait_seconds
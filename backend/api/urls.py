@@ -1,8 +1,11 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (CustomUserViewSet, IngredientViewSet, RecipesViewSet,
-                       TagViewSet)
+from api import async_views
+from api.views import (CacheStatsView, CustomUserViewSet,
+                       DatabasePoolStatsView, IngredientViewSet,
+                       RecipesViewSet, TagViewSet)
 
 router_v1 = DefaultRouter()
 
@@ -14,4 +17,16 @@ router_v1.register('recipes', RecipesViewSet, basename='recipes')
 urlpatterns = [
     path('', include(router_v1.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('db-pool-stats/', DatabasePoolStatsView.as_view()),
+    path('cache-stats/', CacheStatsView.as_view()),
 ]
+
+if settings.ASYNC_READ_VIEWS:
+    urlpatterns = [
+        path('tags/', async_views.tag_list),
+        path('tags/<int:pk>/', async_views.tag_detail),
+        path('ingredients/', async_views.ingredient_list),
+        path('ingredients/<int:pk>/', async_views.ingredient_detail),
+        path('recipes/', async_views.recipe_list),
+        path('recipes/<int:pk>/', async_views.recipe_detail),
+    ] + urlpatterns
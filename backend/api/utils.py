@@ -1,13 +1,17 @@
 from io import BytesIO
 
-from django.http import FileResponse
-from reportlab.lib.units import inch
-from reportlab.pdfbase.pdfmetrics import registerFont
-from reportlab.pdfbase.ttfonts import TTFont
-from reportlab.pdfgen.canvas import Canvas
-
 
 def pdf_creation(queryset):
+    """Возвращает PDF со списком покупок в виде байтов.
+
+    reportlab импортируется при первом вызове, чтобы не замедлять запуск
+    воркеров.
+    """
+    from reportlab.lib.units import inch
+    from reportlab.pdfbase.pdfmetrics import registerFont
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen.canvas import Canvas
+
     buffer = BytesIO()
     canvas = Canvas(buffer)
     registerFont(TTFont(
@@ -46,9 +50,4 @@ def pdf_creation(queryset):
         )
         height -= 0.5 * inch
     canvas.save()
-    buffer.seek(0)
-    return FileResponse(
-        buffer,
-        as_attachment=True,
-        filename='ShoppingList.pdf'
-    )
+    return buffer.getvalue()
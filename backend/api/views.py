@@ -1,32 +1,170 @@
-from django.db.models import Sum
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Sum
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (SAFE_METHODS, AllowAny, IsAdminUser,
+                                        IsAuthenticated)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 from rest_framework.status import (HTTP_200_OK, HTTP_201_CREATED,
-                                   HTTP_204_NO_CONTENT, HTTP_404_NOT_FOUND)
+                                   HTTP_204_NO_CONTENT, HTTP_304_NOT_MODIFIED,
+                                   HTTP_404_NOT_FOUND, HTTP_410_GONE)
+from rest_framework.utils.urls import replace_query_param
+from rest_framework.views import APIView
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
+from api.delivery import content_name, ensure_file, protected_file_response
+from api.fast_serializers import (RecipeFastSerializer,
+                                  SubscriptionFastSerializer)
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import NumberRecordsPerPagePagination
+from api.pagination import KeysetPagination, NumberRecordsPerPagePagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (FavoritesRecipeSerializer, GetRecipeSerializer,
+from api.reference import not_modified, reference_data
+from api.serializers import (BulkRecipesSerializer, CustomUserSerializer,
+                             FavoritesRecipeSerializer, GetRecipeSerializer,
                              IngredientSerializer,
                              PostPatchDeleteRecipeSerializer,
                              ShoppingListSerializer, SubscriptionSerializer,
                              TagSerializer)
 from api.utils import pdf_creation
+from foodgram.cache import cache_stats
+from foodgram.db.pool import pool_stats
+from foodgram.db.routers import (is_pinned_to_primary, pin_to_primary,
+                                 read_from_replica, replica_configured)
+from recipes.changes import MAX_ID, SyncToken, initial_token, recipe_changes
+from recipes.deletion import schedule_recipe_deletion, schedule_user_deletion
+from recipes.feeds import feed_recipe_ids
 from recipes.models import (FavoritesRecipe, Ingredient, Recipe,
-                            RecipeIngredient, ShoppingList, Subscription, Tag)
+                            RecipeIngredient, ShoppingList, SimilarRecipe,
+                            Subscription, Tag)
+from recipes.popularity import register
 from users.models import CustomUser
 
+NON_FIELD_ERRORS_KEY = api_settings.NON_FIELD_ERRORS_KEY
 
-class CustomUserViewSet(UserViewSet):
+
+def path_id(pk):
+    """Id объекта из адреса запроса. На нечисловой или слишком большой id
+    ответ 404, как у get_object_or_404."""
+    pk = str(pk)
+    if not pk.isdecimal() or int(pk) > MAX_ID:
+        raise Http404
+    return int(pk)
+
+
+def query_ids(request, name, max_count, message):
+    """Список id из параметра запроса вида ?name=1,2&name=3 без повторов."""
+    values = [
+        value
+        for param in request.query_params.getlist(name)
+        for value in param.split(',')
+        if value
+    ]
+    if not values or not all(value.isdecimal() for value in values):
+        raise ValidationError({name: message})
+    values = list(dict.fromkeys(map(int, values)))
+    if max(values) > MAX_ID:
+        raise ValidationError({name: message})
+    if len(values) > max_count:
+        raise ValidationError({name: f'Укажите не больше {max_count} id!'})
+    return values
+
+
+class ReplicaReadMixin:
+    """Направляет чтение безопасных запросов в реплику базы данных.
+
+    После успешной записи пользователь на время закрепляется за основной
+    базой данных, чтобы сразу видеть свои изменения.
+    """
+    replica_actions = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if not replica_configured():
+            return
+        if request.method not in SAFE_METHODS:
+            return
+        if (self.replica_actions is not None
+                and self.action not in self.replica_actions):
+            return
+        if not is_pinned_to_primary(request.user):
+            self.replica_token = read_from_replica.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica_token = getattr(self, 'replica_token', None)
+        if replica_token is not None:
+            read_from_replica.reset(replica_token)
+            self.replica_token = None
+        if (replica_configured()
+                and request.method not in SAFE_METHODS
+                and request.user.is_authenticated
+                and response.status_code < 400):
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class FastSerializationMixin:
+    """Строит ответы на чтение сериализаторами из api.fast_serializers.
+
+    Если такой сериализатор не может построить ответ, fast_response
+    возвращает None и ответ строит обычный сериализатор DRF.
+    """
+
+    def fast_response(self, serializer, queryset):
+        if not settings.FAST_SERIALIZERS:
+            return None
+        rows = serializer.values(queryset)
+        page = self.paginate_queryset(rows)
+        data = serializer.serialize(rows if page is None else page)
+        if data is None:
+            return None
+        if page is None:
+            return Response(data, status=HTTP_200_OK)
+        return self.get_paginated_response(data)
+
+
+class CustomUserViewSet(FastSerializationMixin, ReplicaReadMixin,
+                        UserViewSet):
 
     pagination_class = NumberRecordsPerPagePagination
     http_method_names = ('get', 'post', 'head', 'delete',)
+    replica_actions = ('list',)
+    throttle_scope = 'users'
+    throttle_costs = {'subscriptions': 2}
+
+    def get_queryset(self):
+        """Скрывает неактивных пользователей, в том числе ожидающих
+        удаления, а для списка и профиля пользователя отмечает подписку
+        текущего пользователя одним подзапросом Exists вместо запроса на
+        каждого пользователя.
+
+        Анонимному пользователю и при ответе без поля is_subscribed
+        подзапрос не нужен.
+        """
+        queryset = super().get_queryset().filter(is_active=True)
+        user = self.request.user
+        if (self.action not in ('list', 'retrieve')
+                or not user.is_authenticated):
+            return queryset
+        fields = CustomUserSerializer.requested_fields(self.request)
+        if fields is not None and 'is_subscribed' not in fields:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Subscription.objects.filter(
+                user=user,
+                subscribed_author=OuterRef('pk')
+            )
+        ))
+
+    def perform_destroy(self, instance):
+        schedule_user_deletion(instance)
 
     def serializer(*args, **kwargs):
         return SubscriptionSerializer(
@@ -41,7 +179,16 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def subscriptions(self, request):
-        queryset = Subscription.objects.filter(user=request.user)
+        queryset = Subscription.objects.filter(
+            user=request.user,
+            subscribed_author__is_active=True
+        )
+        response = self.fast_response(
+            SubscriptionFastSerializer(request),
+            queryset
+        )
+        if response is not None:
+            return response
         data = self.paginate_queryset(queryset)
         if data is not None:
             return self.get_paginated_response(
@@ -58,23 +205,42 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def subscribe(self, request, *args, **kwargs):
-        subscribed_author = get_object_or_404(CustomUser, pk=kwargs.get('id'))
-        if request.method == 'POST':
-            serializer = SubscriptionSerializer(
-                data={
-                    'user': request.user.id,
-                    'subscribed_author': subscribed_author.id
-                },
-                context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(data=serializer.data, status=HTTP_201_CREATED)
-        Subscription.objects.get(
-            user=request.user,
+        if request.method == 'DELETE':
+            if Subscription.objects.delete_once(
+                request.user,
+                subscribed_author=path_id(kwargs.get('id'))
+            ) is None:
+                get_object_or_404(
+                    CustomUser,
+                    pk=kwargs.get('id'),
+                    is_active=True
+                )
+                raise ValidationError(
+                    {NON_FIELD_ERRORS_KEY: ['Подписка не оформлена!']}
+                )
+            return Response(status=HTTP_204_NO_CONTENT)
+        subscribed_author = get_object_or_404(
+            CustomUser,
+            pk=kwargs.get('id'),
+            is_active=True
+        )
+        if subscribed_author == request.user:
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [
+                'Нельзя подписаться на самого себя!'
+            ]})
+        subscription = Subscription.objects.create_once(
+            request.user,
             subscribed_author=subscribed_author
-        ).delete()
-        return Response(status=HTTP_204_NO_CONTENT)
+        )
+        if subscription is None:
+            raise ValidationError(
+                {NON_FIELD_ERRORS_KEY: ['Подписка уже оформлена!']}
+            )
+        serializer = SubscriptionSerializer(
+            subscription,
+            context={'request': request}
+        )
+        return Response(data=serializer.data, status=HTTP_201_CREATED)
 
     def reset_password(self, request, *args, **kwargs):
         return Response(status=HTTP_404_NOT_FOUND)
@@ -98,61 +264,231 @@ class CustomUserViewSet(UserViewSet):
         return Response(status=HTTP_404_NOT_FOUND)
 
 
-class IngredientViewSet(ReadOnlyModelViewSet):
+class ReferenceDataMixin:
+    """Отдаёт справочные данные из снимка в памяти процесса со строгим ETag."""
+
+    def reference_response(self, request, data, etag):
+        if not_modified(request, etag):
+            return Response(status=HTTP_304_NOT_MODIFIED, headers={
+                'ETag': etag
+            })
+        return Response(data, status=HTTP_200_OK, headers={'ETag': etag})
+
+    def reference_retrieve(self, request, data_by_id, *args, **kwargs):
+        try:
+            data = data_by_id.get(int(kwargs[self.lookup_field]))
+        except ValueError:
+            data = None
+        if data is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.reference_response(
+            request,
+            data,
+            reference_data.get().etag(self.basename, data['id'])
+        )
+
+
+class IngredientViewSet(ReferenceDataMixin, ReplicaReadMixin,
+                        ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    throttle_scope = 'reference'
+    throttle_costs = {'list': 2}
+
+    def list(self, request, *args, **kwargs):
+        snapshot = reference_data.get()
+        name = request.query_params.get('name', '')
+        return self.reference_response(
+            request,
+            snapshot.filter_ingredients(name),
+            snapshot.etag(self.basename, name)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.reference_retrieve(
+            request,
+            reference_data.get().ingredient_data_by_id,
+            *args,
+            **kwargs
+        )
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataMixin, ReplicaReadMixin, ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
+    throttle_scope = 'reference'
 
+    def list(self, request, *args, **kwargs):
+        snapshot = reference_data.get()
+        return self.reference_response(
+            request,
+            snapshot.tag_data,
+            snapshot.etag(self.basename)
+        )
 
-class RecipesViewSet(ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return self.reference_retrieve(
+            request,
+            reference_data.get().tag_data_by_id,
+            *args,
+            **kwargs
+        )
+
+
+class RecipesViewSet(FastSerializationMixin, ReplicaReadMixin,
+                     ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = GetRecipeSerializer
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = NumberRecordsPerPagePagination
+    throttle_scope = 'recipes'
+    # Стоимость действий в токенах корзины, остальные действия стоят 1.
+    throttle_costs = {
+        'create': 5,
+        'update': 5,
+        'partial_update': 5,
+        'bulk_favorite': 5,
+        'bulk_delete_favorite': 5,
+        'bulk_shopping_cart': 5,
+        'bulk_delete_shopping_cart': 5,
+        'feed': 2,
+        'changes': 2,
+        'pantry': 5,
+        'batch': 3,
+        'similar': 2,
+        'download_shopping_cart': 30,
+    }
+
+    def get_queryset(self):
+        if self.request.method == 'GET':
+            fields = GetRecipeSerializer.requested_fields(self.request)
+            return Recipe.objects.with_related(fields).with_user_flags(
+                self.request.user,
+                fields
+            )
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
             return GetRecipeSerializer
         return PostPatchDeleteRecipeSerializer
 
+    def perform_destroy(self, instance):
+        schedule_recipe_deletion(instance)
+
+    def list(self, request, *args, **kwargs):
+        response = self.fast_response(
+            RecipeFastSerializer(request),
+            self.filter_queryset(self.get_queryset())
+        )
+        if response is not None:
+            return response
+        return super().list(request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if settings.FAST_SERIALIZERS and str(kwargs['pk']).isdecimal():
+            serializer = RecipeFastSerializer(request)
+            rows = serializer.values(
+                self.filter_queryset(self.get_queryset()).filter(
+                    pk=kwargs['pk']
+                )
+            )
+            data = serializer.serialize(rows)
+            if data:
+                return Response(data[0], status=HTTP_200_OK)
+        return super().retrieve(request, *args, **kwargs)
+
     @staticmethod
-    def object_creation(request, pk, obj):
-        data = {'user': request.user.id, 'recipe': pk}
-        serializer = obj(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
+    def object_creation(request, pk, obj, message):
+        instance = obj.Meta.model.objects.create_once(
+            request.user,
+            recipe=path_id(pk)
+        )
+        if instance is None:
+            get_object_or_404(Recipe, id=pk)
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [message]})
+        serializer = obj(instance, context={'request': request})
         return Response(data=serializer.data, status=HTTP_201_CREATED)
 
     @staticmethod
-    def object_delete(request, pk, model):
-        get_object_or_404(
-            model,
-            user=request.user,
-            recipe=get_object_or_404(Recipe, id=pk),
-        ).delete()
+    def object_delete(request, pk, model, message):
+        if model.objects.delete_once(
+            request.user,
+            recipe=path_id(pk)
+        ) is None:
+            get_object_or_404(Recipe, id=pk)
+            raise ValidationError({NON_FIELD_ERRORS_KEY: [message]})
         return Response(status=HTTP_204_NO_CONTENT)
 
+    @staticmethod
+    def bulk_creation(request, model):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        found = set(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id',
+            flat=True
+        ))
+        added = model.objects.create_many(request.user, 'recipe', found)
+        if added:
+            transaction.on_commit(lambda: register(model, *added))
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    'added' if recipe_id in added
+                    else 'exists' if recipe_id in found
+                    else 'not_found'
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+    @staticmethod
+    def bulk_delete(request, model):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data['recipes']
+        removed = model.objects.delete_many(
+            request.user,
+            'recipe',
+            recipe_ids
+        )
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': 'removed' if recipe_id in removed else 'not_found',
+            }
+            for recipe_id in recipe_ids
+        ]})
+
     @action(
         methods=['POST'],
         detail=True,
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk):
-        return self.object_creation(request, pk, FavoritesRecipeSerializer)
+        return self.object_creation(
+            request,
+            pk,
+            FavoritesRecipeSerializer,
+            'Рецепт уже добавлен в Избранное!'
+        )
 
     @favorite.mapping.delete
     def delete_favorite(self, request, pk):
-        return self.object_delete(request, pk, FavoritesRecipe)
+        return self.object_delete(
+            request,
+            pk,
+            FavoritesRecipe,
+            'Рецепта нет в Избранном!'
+        )
 
     @action(
         methods=['POST'],
@@ -160,18 +496,252 @@ class RecipesViewSet(ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def shopping_cart(self, request, pk):
-        return self.object_creation(request, pk, ShoppingListSerializer)
+        return self.object_creation(
+            request,
+            pk,
+            ShoppingListSerializer,
+            'Рецепт уже добавлен в Список покупок!'
+        )
 
     @shopping_cart.mapping.delete
     def delete_shopping_cart(self, request, pk):
-        return self.object_delete(request, pk, ShoppingList)
+        return self.object_delete(
+            request,
+            pk,
+            ShoppingList,
+            'Рецепта нет в Списке покупок!'
+        )
+
+    @extend_schema(
+        operation_id='recipes_favorite_bulk_create',
+        request=BulkRecipesSerializer,
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(
+        methods=('post',),
+        detail=False,
+        url_path='favorite',
+        url_name='bulk-favorite',
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_favorite(self, request):
+        return self.bulk_creation(request, FavoritesRecipe)
+
+    @extend_schema(
+        operation_id='recipes_favorite_bulk_destroy',
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @bulk_favorite.mapping.delete
+    def bulk_delete_favorite(self, request):
+        return self.bulk_delete(request, FavoritesRecipe)
+
+    @extend_schema(
+        operation_id='recipes_shopping_cart_bulk_create',
+        request=BulkRecipesSerializer,
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @action(
+        methods=('post',),
+        detail=False,
+        url_path='shopping_cart',
+        url_name='bulk-shopping-cart',
+        permission_classes=(IsAuthenticated,),
+    )
+    def bulk_shopping_cart(self, request):
+        return self.bulk_creation(request, ShoppingList)
+
+    @extend_schema(
+        operation_id='recipes_shopping_cart_bulk_destroy',
+        responses={200: OpenApiTypes.OBJECT}
+    )
+    @bulk_shopping_cart.mapping.delete
+    def bulk_delete_shopping_cart(self, request):
+        return self.bulk_delete(request, ShoppingList)
+
+    @action(
+        methods=('delete',),
+        detail=False,
+        url_path='shopping_cart/clear',
+        permission_classes=(IsAuthenticated,),
+    )
+    def clear_shopping_cart(self, request):
+        ShoppingList.objects.filter(user=request.user).delete()
+        return Response(status=HTTP_204_NO_CONTENT)
+
+    @action(
+        methods=('get',),
+        detail=False,
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        pagination = KeysetPagination()
+        limit = pagination.get_page_size(request)
+        recipe_ids = feed_recipe_ids(
+            request.user,
+            before=pagination.get_cursor(request),
+            limit=limit + 1
+        )
+        next_cursor = None
+        if len(recipe_ids) > limit:
+            recipe_ids = recipe_ids[:limit]
+            next_cursor = recipe_ids[-1]
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True
+        )
+        return pagination.get_paginated_response(
+            request,
+            serializer.data,
+            next_cursor
+        )
+
+    @action(detail=False)
+    def changes(self, request):
+        """Рецепты, изменённые после позиции токена since, и id удалённых
+        рецептов. Без since отдаются все рецепты; sync_token из ответа
+        передаётся в следующий запрос, а пока next не пуст, изменения
+        читаются дальше по ссылке next."""
+        since = request.query_params.get('since')
+        try:
+            token = (
+                initial_token() if since is None else SyncToken.decode(since)
+            )
+        except ValueError as error:
+            raise ValidationError({'since': [str(error)]})
+        if token.is_expired():
+            return Response(
+                {'detail': 'Токен синхронизации устарел, загрузите рецепты '
+                           'заново без параметра since!'},
+                status=HTTP_410_GONE
+            )
+        recipe_ids, deleted_ids, next_token, has_more = recipe_changes(
+            token,
+            KeysetPagination().get_page_size(request)
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[pk] for pk in recipe_ids if pk in recipes],
+            many=True
+        )
+        sync_token = next_token.encode()
+        next_link = None
+        if has_more:
+            next_link = replace_query_param(
+                request.build_absolute_uri(),
+                'since',
+                sync_token
+            )
+        return Response({
+            'next': next_link,
+            'sync_token': sync_token,
+            'results': serializer.data,
+            'deleted': deleted_ids,
+        })
+
+    @action(detail=False)
+    def pantry(self, request):
+        from recipes.pantry import pantry_index
+
+        ranking = pantry_index.get().search(
+            query_ids(
+                request,
+                'ingredients',
+                settings.PANTRY_MAX_INGREDIENTS,
+                'Укажите id имеющихся ингредиентов!'
+            ),
+            KeysetPagination().get_page_size(request)
+        )
+        recipes = self.get_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in ranking]
+        )
+        ranking = [
+            (recipes[recipe_id], coverage, missing)
+            for recipe_id, coverage, missing in ranking
+            if recipe_id in recipes
+        ]
+        serializer = self.get_serializer(
+            [recipe for recipe, _, _ in ranking],
+            many=True
+        )
+        return Response([
+            {
+                **data,
+                'coverage': round(coverage, 4),
+                'missing_ingredients': missing,
+            }
+            for data, (_, coverage, missing) in zip(serializer.data, ranking)
+        ])
+
+    @action(detail=False)
+    def batch(self, request):
+        recipe_ids = query_ids(
+            request,
+            'ids',
+            settings.BULK_MAX_RECIPES,
+            'Укажите id рецептов через запятую!'
+        )
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True
+        )
+        return Response({
+            'results': serializer.data,
+            'missing': [
+                recipe_id for recipe_id in recipe_ids
+                if recipe_id not in recipes
+            ],
+        })
+
+    @action(detail=True)
+    def similar(self, request, pk):
+        similar = SimilarRecipe.objects.filter(recipe_id=pk).order_by('rank')
+        recipe_ids = list(similar.values_list('similar_id', flat=True))
+        if not recipe_ids:
+            get_object_or_404(Recipe, id=pk)
+        recipes = self.get_queryset().in_bulk(recipe_ids)
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id in recipe_ids
+             if recipe_id in recipes],
+            many=True
+        )
+        return Response(serializer.data)
 
     @action(detail=False)
     def download_shopping_cart(self, request):
         queryset = RecipeIngredient.objects.filter(
-            recipe__recipes_shoppinglist_related__user=request.user
+            recipe__recipes_shoppinglist_related__user=request.user,
+            recipe__pending_deletion=False
         ).values(
             'ingredient__name',
             'ingredient__measurement_unit'
         ).order_by('ingredient__name').annotate(amount=Sum('amount'))
-        return pdf_creation(queryset)
+        rows = list(queryset)
+        name = ensure_file(
+            content_name(f'shopping_lists/{request.user.id}', rows, 'pdf'),
+            lambda: pdf_creation(rows)
+        )
+        return protected_file_response(
+            name,
+            'ShoppingList.pdf',
+            'application/pdf'
+        )
+
+
+class DatabasePoolStatsView(APIView):
+    """Статистика пулов соединений с базой данных текущего процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(pool_stats(), status=HTTP_200_OK)
+
+
+class CacheStatsView(APIView):
+    """Попадания, промахи и вытеснения двухуровневых кэшей текущего
+    процесса."""
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(cache_stats(), status=HTTP_200_OK)
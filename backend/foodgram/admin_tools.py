@@ -0,0 +1,168 @@
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.views.main import PAGE_VAR
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import CASCADE, Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.sql.where import WhereNode
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который для большой таблицы без фильтров берёт число строк
+    из статистики PostgreSQL вместо COUNT(*) по всей таблице.
+
+    Постоянный фильтр менеджера модели по умолчанию, например скрытие
+    рецептов, ожидающих удаления, фильтром не считается: оценка включает и
+    такие строки. Для остальных запросов и других баз данных число строк
+    считается как обычно.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        baseline = queryset.model._default_manager.all().query.where
+        if (connection.vendor == 'postgresql'
+                and queryset.query.where in (baseline, WhereNode())
+                and not queryset.query.distinct):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            estimate = int(row[0]) if row else -1
+            if estimate >= settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class ScalableAdminMixin:
+    """Список объектов админки, который строится за постоянное число
+    запросов: без точного подсчёта всех строк таблицы на каждой странице."""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class BackgroundDeletionAdminMixin:
+    """Удаление объектов из админки фоновой задачей: объект сразу
+    скрывается, а зависимые объекты удаляет команда process_deletions.
+
+    Страница подтверждения не собирает все объекты, которые удалятся
+    каскадно: у популярного рецепта или автора их слишком много. Право на
+    удаление проверяется по моделям: для каждой модели админки без такого
+    права выполняется один запрос EXISTS по каскадным связям.
+    """
+    schedule_deletion = None
+
+    def get_deleted_objects(self, objs, request):
+        perms_needed = set()
+        self.check_cascade_permissions(
+            self.model,
+            self.model._base_manager.filter(pk__in=[obj.pk for obj in objs]),
+            request,
+            perms_needed,
+            (self.model,)
+        )
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            perms_needed,
+            []
+        )
+
+    def check_cascade_permissions(self, model, queryset, request,
+                                  perms_needed, path):
+        """Добавляет в perms_needed названия моделей, строки которых
+        удалятся каскадно вместе с queryset, а права на их удаление у
+        пользователя нет."""
+        for relation in model._meta.get_fields(include_hidden=True):
+            if not (relation.auto_created and not relation.concrete
+                    and (relation.one_to_many or relation.one_to_one)
+                    and relation.on_delete is CASCADE):
+                continue
+            related = relation.related_model
+            rows = related._base_manager.filter(
+                **{f'{relation.field.name}__in': queryset}
+            )
+            model_admin = self.admin_site._registry.get(related)
+            verbose_name = related._meta.verbose_name
+            if (model_admin is not None
+                    and verbose_name not in perms_needed
+                    and not model_admin.has_delete_permission(request)
+                    and rows.exists()):
+                perms_needed.add(verbose_name)
+            if related not in path:
+                self.check_cascade_permissions(
+                    related,
+                    rows,
+                    request,
+                    perms_needed,
+                    (*path, related)
+                )
+
+    def delete_model(self, request, obj):
+        self.schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.schedule_deletion(obj)
+
+
+class InputFilter(admin.SimpleListFilter):
+    """Фильтр с полем ввода вместо перечня всех значений из таблицы."""
+    template = 'admin/input_filter.html'
+    lookup = None
+
+    def lookups(self, request, model_admin):
+        # Непустой перечень нужен, чтобы фильтр отображался.
+        return ((None, None),)
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        return queryset.filter(**{self.lookup: self.value().strip()})
+
+    def choices(self, changelist):
+        choice = next(super().choices(changelist))
+        choice['hidden_params'] = [
+            (name, value) for name, value in changelist.params.items()
+            if name not in (self.parameter_name, PAGE_VAR)
+        ]
+        yield choice
+
+
+def input_filter(lookup, title):
+    """Класс InputFilter для поиска по lookup, например author__username.
+
+    Параметр запроса называется без двойных подчёркиваний, иначе админка
+    проверяет его как поиск по полю связанной модели и отклоняет.
+    """
+    return type(
+        f'{lookup.title().replace("__", "")}InputFilter',
+        (InputFilter,),
+        {
+            'lookup': lookup,
+            'parameter_name': lookup.replace('__', '_'),
+            'title': title,
+        }
+    )
+
+
+def count_subquery(model, field):
+    """Число строк model, у которых field ссылается на текущий объект.
+
+    Подзапрос выполняется только для строк страницы, в отличие от Count по
+    соединению, которое группирует всю таблицу.
+    """
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+                field
+            ).annotate(count=Count('pk')).values('count'),
+            output_field=IntegerField()
+        ),
+        0
+    )
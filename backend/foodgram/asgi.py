@@ -0,0 +1,15 @@
+import os
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True')
+
+django_application = get_asgi_application()
+
+# Модуль событий использует модели, поэтому импортируется после настройки
+# Django.
+from api.events import EventStreamApplication  # noqa: E402
+
+application = EventStreamApplication(django_application, settings.EVENTS_PATH)
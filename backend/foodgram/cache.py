@@ -0,0 +1,528 @@
+import pickle
+import sqlite3
+import threading
+from collections import OrderedDict
+from math import log
+from random import random
+from time import monotonic, sleep, time
+from typing import Any, NamedTuple, Optional
+from uuid import uuid4
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Значение, которого нет в кэше: None тоже можно хранить.
+MISSING = object()
+
+COUNTERS = (
+    'l1_hits',
+    'l2_hits',
+    'misses',
+    'evictions',
+    'computes',
+    'early_recomputes',
+    'lock_waits',
+)
+
+# Ограничение числа параметров запроса в старых версиях SQLite.
+SQLITE_MAX_PARAMS = 500
+
+
+def chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех воркеров одного сервера.
+
+    Значения хранятся сериализованными pickle. Запись, add и incr
+    выполняются в транзакции BEGIN IMMEDIATE, поэтому incr атомарен и между
+    процессами. Время от времени удаляются устаревшие записи, а если их
+    больше MAX_ENTRIES (по умолчанию 100000) - и часть записей, которые
+    устареют раньше других.
+    """
+    cull_probability = 0.01
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._max_entries = int(options.get('MAX_ENTRIES', 100000))
+        self.path = location
+        self.timeout = options.get('TIMEOUT', 5)
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=self.timeout,
+                isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS cache_entry ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)'
+            )
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS cache_entry_expires '
+                'ON cache_entry (expires)'
+            )
+            self.local.connection = connection
+        return connection
+
+    def write(self, operation):
+        """Выполняет operation(connection) в транзакции записи."""
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            result = operation(connection)
+            if random() < self.cull_probability:
+                self.cull(connection)
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        connection.execute('COMMIT')
+        return result
+
+    def cull(self, connection):
+        connection.execute(
+            'DELETE FROM cache_entry WHERE expires <= ?',
+            (time(),)
+        )
+        count = connection.execute(
+            'SELECT COUNT(*) FROM cache_entry'
+        ).fetchone()[0]
+        if count > self._max_entries:
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key IN (SELECT key FROM '
+                'cache_entry ORDER BY expires IS NULL, expires LIMIT ?)',
+                (count // self._cull_frequency,)
+            )
+
+    def get_many(self, keys, version=None):
+        keys = {
+            self.make_and_validate_key(key, version): key for key in keys
+        }
+        found = {}
+        for chunk in chunks(keys, SQLITE_MAX_PARAMS):
+            found.update(
+                (keys[key], pickle.loads(value))
+                for key, value in self.connection().execute(
+                    'SELECT key, value FROM cache_entry WHERE key IN '
+                    f'({", ".join("?" * len(chunk))}) '
+                    'AND (expires IS NULL OR expires > ?)',
+                    (*chunk, time())
+                )
+            )
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many((key,), version).get(key, default)
+
+    def has_key(self, key, version=None):
+        return bool(self.get_many((key,), version))
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expires = self.get_backend_timeout(timeout)
+        rows = [
+            (
+                self.make_and_validate_key(key, version),
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                expires
+            )
+            for key, value in data.items()
+        ]
+        self.write(lambda connection: connection.executemany(
+            'INSERT INTO cache_entry (key, value, expires) VALUES (?, ?, ?) '
+            'ON CONFLICT (key) DO UPDATE SET value = excluded.value, '
+            'expires = excluded.expires',
+            rows
+        ))
+        return []
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        row = (
+            key,
+            pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+            self.get_backend_timeout(timeout)
+        )
+
+        def insert(connection):
+            connection.execute(
+                'DELETE FROM cache_entry WHERE key = ? AND expires <= ?',
+                (key, time())
+            )
+            return connection.execute(
+                'INSERT OR IGNORE INTO cache_entry (key, value, expires) '
+                'VALUES (?, ?, ?)',
+                row
+            ).rowcount == 1
+        return self.write(insert)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        return self.write(lambda connection: connection.execute(
+            'UPDATE cache_entry SET expires = ? WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (self.get_backend_timeout(timeout), key, time())
+        ).rowcount == 1)
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self.make_and_validate_key(key, version)
+
+        def increment(connection):
+            row = connection.execute(
+                'SELECT value FROM cache_entry WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (made_key, time())
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            connection.execute(
+                'UPDATE cache_entry SET value = ? WHERE key = ?',
+                (pickle.dumps(value, pickle.HIGHEST_PROTOCOL), made_key)
+            )
+            return value
+        return self.write(increment)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version) for key in keys]
+
+        def delete(connection):
+            return sum(
+                connection.execute(
+                    'DELETE FROM cache_entry WHERE key IN '
+                    f'({", ".join("?" * len(chunk))})',
+                    chunk
+                ).rowcount
+                for chunk in chunks(keys, SQLITE_MAX_PARAMS)
+            )
+        return self.write(delete)
+
+    def delete(self, key, version=None):
+        return bool(self.delete_many((key,), version))
+
+    def clear(self):
+        self.write(lambda connection: connection.execute(
+            'DELETE FROM cache_entry'
+        ))
+
+
+class LocalStore:
+    """Ограниченный LRU-кэш L1 в памяти процесса и счётчики его
+    использования.
+
+    Значения хранятся сериализованными, как в LocMemCache, чтобы изменение
+    полученного объекта не меняло значение в кэше.
+    """
+
+    def __init__(self, max_entries, compute_locks=64):
+        self.entries = OrderedDict()
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.compute_locks = [
+            threading.Lock() for _ in range(compute_locks)
+        ]
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return MISSING
+            value, expires = item
+            if expires <= monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+        return pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        if timeout <= 0:
+            self.delete(key)
+            return
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.entries[key] = (value, monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.counters['evictions'] += 1
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def count(self, name, number=1):
+        with self.lock:
+            self.counters[name] += number
+
+    def compute_lock(self, key):
+        """Блокировка вычисления ключа потоками этого процесса: одна из
+        compute_locks, чтобы не хранить блокировку на каждый ключ."""
+        return self.compute_locks[hash(key) % len(self.compute_locks)]
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'max_entries': self.max_entries,
+                **self.counters,
+            }
+
+
+# Кэш CACHES создаётся в каждом потоке заново, поэтому хранилища L1 общие
+# для процесса и хранятся по LOCATION, как в LocMemCache.
+LOCAL_STORES = {}
+
+LOCAL_STORES_LOCK = threading.Lock()
+
+
+class CachedValue(NamedTuple):
+    """Значение get_or_compute со временем его вычисления и истечения."""
+    value: Any
+    delta: float
+    expires: Optional[float]
+
+    def is_expiring(self, beta):
+        """Вероятностное досрочное истечение (XFetch): чем ближе срок и чем
+        дольше вычисление, тем вероятнее пересчёт до истечения, поэтому
+        популярный ключ пересчитывает один воркер, пока остальные получают
+        прежнее значение."""
+        if self.expires is None:
+            return False
+        return time() - self.delta * beta * log(1 - random()) >= self.expires
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: LRU-кэш L1 в памяти процесса перед общим кэшем L2
+    (CACHES[OPTIONS['L2']]).
+
+    Запись выполняется в оба уровня, а из L1 значение читается не дольше
+    L1_TIMEOUT секунд: удаление и изменение ключа в другом процессе
+    становятся видны не позже этого срока. Поэтому L1 подходит для значений,
+    которые не меняются под тем же ключом или могут немного устареть.
+
+    get_or_compute вычисляет отсутствующее значение в одном потоке одного
+    процесса, а остальные ждут его или получают прежнее значение.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.l2_alias = options.get('L2', 'default')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.lock_timeout = options.get('LOCK_TIMEOUT', 30)
+        self.poll_interval = options.get('POLL_INTERVAL', 0.05)
+        with LOCAL_STORES_LOCK:
+            if location not in LOCAL_STORES:
+                LOCAL_STORES[location] = LocalStore(
+                    options.get('L1_MAX_ENTRIES', 1000)
+                )
+            self.store = LOCAL_STORES[location]
+
+    @property
+    def l2(self):
+        return caches[self.l2_alias]
+
+    def seconds(self, timeout):
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def l1_seconds(self, timeout):
+        if timeout is None:
+            return self.l1_timeout
+        return min(self.l1_timeout, timeout)
+
+    def read(self, key):
+        value = self.store.get(key)
+        if value is not MISSING:
+            self.store.count('l1_hits')
+            return value
+        value = self.l2.get(key, MISSING)
+        if value is MISSING:
+            self.store.count('misses')
+            return value
+        self.store.count('l2_hits')
+        self.store.set(key, value, self.l1_timeout)
+        return value
+
+    def write(self, key, value, timeout):
+        self.l2.set(key, value, timeout)
+        if timeout is not None and timeout <= 0:
+            self.store.delete(key)
+        else:
+            self.store.set(key, value, self.l1_seconds(timeout))
+
+    def get(self, key, default=None, version=None):
+        value = self.read(self.make_and_validate_key(key, version))
+        return default if value is MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = {
+            self.make_and_validate_key(key, version): key for key in keys
+        }
+        found, missing = {}, []
+        for key in keys:
+            value = self.store.get(key)
+            if value is MISSING:
+                missing.append(key)
+            else:
+                found[keys[key]] = value
+        self.store.count('l1_hits', len(found))
+        from_l2 = self.l2.get_many(missing) if missing else {}
+        self.store.count('l2_hits', len(from_l2))
+        self.store.count('misses', len(missing) - len(from_l2))
+        for key, value in from_l2.items():
+            self.store.set(key, value, self.l1_timeout)
+            found[keys[key]] = value
+        return found
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        return self.store.get(key) is not MISSING or key in self.l2
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.write(
+            self.make_and_validate_key(key, version),
+            value,
+            self.seconds(timeout)
+        )
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.seconds(timeout)
+        keys = {self.make_and_validate_key(key, version): key for key in data}
+        data = {key: data[original] for key, original in keys.items()}
+        failed = set(self.l2.set_many(data, timeout))
+        for key, value in data.items():
+            if key not in failed:
+                self.store.set(key, value, self.l1_seconds(timeout))
+        return [keys[key] for key in failed]
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version)
+        timeout = self.seconds(timeout)
+        added = self.l2.add(key, value, timeout)
+        if added:
+            self.store.set(key, value, self.l1_seconds(timeout))
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(
+            self.make_and_validate_key(key, version),
+            self.seconds(timeout)
+        )
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version)
+        self.store.delete(key)
+        return self.l2.incr(key, delta)
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version)
+        self.store.delete(key)
+        return self.l2.delete(key)
+
+    def delete_many(self, keys, version=None):
+        keys = [self.make_and_validate_key(key, version) for key in keys]
+        for key in keys:
+            self.store.delete(key)
+        self.l2.delete_many(keys)
+
+    def clear(self):
+        self.store.clear()
+        self.l2.clear()
+
+    def get_or_compute(self, key, compute, timeout=DEFAULT_TIMEOUT,
+                       version=None, beta=1.0):
+        """Значение key, а если его нет - результат compute(), который
+        сохраняется на timeout секунд.
+
+        Отсутствующее значение вычисляет один поток процесса, который
+        первым занял блокировку в L2, а остальные ждут его до LOCK_TIMEOUT
+        секунд. Незадолго до истечения значение с вероятностью, которая
+        растёт с beta, пересчитывается заранее, и пока пересчёт не закончен,
+        остальные получают прежнее значение. Ключ хранит CachedValue, поэтому
+        читать его нужно только через get_or_compute.
+        """
+        key = self.make_and_validate_key(key, version)
+        timeout = self.seconds(timeout)
+        entry = self.read(key)
+        entry = None if entry is MISSING else entry
+        if entry is not None and not entry.is_expiring(beta):
+            return entry.value
+        lock = self.store.compute_lock(key)
+        if not lock.acquire(blocking=entry is None):
+            return entry.value
+        try:
+            if entry is None:
+                # Пока поток ждал блокировку, значение мог вычислить другой.
+                computed = self.read(key)
+                if computed is not MISSING:
+                    return computed.value
+            return self.compute_once(key, compute, timeout, entry)
+        finally:
+            lock.release()
+
+    def compute_once(self, key, compute, timeout, entry):
+        """Значение вычисляет процесс, который первым добавил в L2 ключ
+        блокировки, а остальные отдают прежнее значение или ждут нового."""
+        lock_key = f'{key}:lock'
+        token = uuid4().hex
+        if self.l2.add(lock_key, token, self.lock_timeout):
+            try:
+                return self.compute(key, compute, timeout, entry).value
+            finally:
+                if self.l2.get(lock_key) == token:
+                    self.l2.delete(lock_key)
+        if entry is not None:
+            return entry.value
+        self.store.count('lock_waits')
+        deadline = monotonic() + self.lock_timeout
+        while monotonic() < deadline:
+            sleep(self.poll_interval)
+            computed = self.l2.get(key)
+            if computed is not None:
+                self.store.set(key, computed, self.l1_timeout)
+                return computed.value
+            if lock_key not in self.l2:
+                break
+        return self.compute(key, compute, timeout, entry).value
+
+    def compute(self, key, compute, timeout, entry):
+        self.store.count(
+            'computes' if entry is None else 'early_recomputes'
+        )
+        started = monotonic()
+        value = compute()
+        computed = CachedValue(
+            value,
+            monotonic() - started,
+            None if timeout is None else time() + timeout
+        )
+        self.write(key, computed, timeout)
+        return computed
+
+    def stats(self):
+        return self.store.stats()
+
+
+def cache_stats():
+    """Статистика кэшей L1 всех двухуровневых кэшей текущего процесса."""
+    with LOCAL_STORES_LOCK:
+        return {
+            location: store.stats()
+            for location, store in LOCAL_STORES.items()
+        }
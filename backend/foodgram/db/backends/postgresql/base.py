@@ -0,0 +1,72 @@
+from django.db.backends.postgresql import base
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from foodgram.db.pool import PoolTimeoutError, get_pool
+
+
+def is_usable(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except base.Database.Error:
+        return False
+    return True
+
+
+def close(connection):
+    if not connection.closed:
+        connection.close()
+
+
+def reset(connection):
+    """Откатывает незавершённую транзакцию перед возвратом в пул."""
+    if connection.closed:
+        return False
+    if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+        connection.rollback()
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL с пулом соединений внутри процесса.
+
+    Параметры пула задаются ключом POOL в настройках базы данных, без него
+    бэкенд ведёт себя как стандартный.
+    """
+
+    @property
+    def pool(self):
+        return get_pool(
+            self.alias,
+            self.settings_dict.get('POOL'),
+            is_usable=is_usable,
+            close=close,
+            reset=reset,
+        )
+
+    def get_new_connection(self, conn_params):
+        pool = self.pool
+        if pool is None:
+            return super().get_new_connection(conn_params)
+        try:
+            connection = pool.acquire(
+                lambda: super(DatabaseWrapper, self).get_new_connection(
+                    conn_params
+                )
+            )
+        except PoolTimeoutError as error:
+            raise base.Database.OperationalError(str(error)) from error
+        self.isolation_level = self.settings_dict['OPTIONS'].get(
+            'isolation_level',
+            connection.isolation_level
+        )
+        return connection
+
+    def _close(self):
+        pool = self.pool
+        if pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            return pool.release(self.connection)
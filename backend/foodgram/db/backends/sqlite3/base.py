@@ -0,0 +1,15 @@
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """SQLite с настраиваемыми PRAGMA для каждого нового соединения.
+
+    Журнал WAL позволяет читать параллельно с записью, поэтому одновременные
+    запросы в режиме разработки не выстраиваются в очередь за блокировкой.
+    """
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for pragma, value in self.settings_dict.get('PRAGMAS', {}).items():
+            connection.execute(f'PRAGMA {pragma} = {value}')
+        return connection
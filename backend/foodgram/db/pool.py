@@ -0,0 +1,150 @@
+from threading import Condition, Lock
+from time import monotonic
+
+POOLS = {}
+
+POOLS_LOCK = Lock()
+
+
+class PoolTimeoutError(Exception):
+    """Свободное соединение не появилось за отведённое время."""
+
+
+class ConnectionPool:
+    """Потокобезопасный пул соединений с базой данных внутри процесса.
+
+    Соединения создаются лениво через переданную фабрику, возвращаются в пул
+    после завершения запроса и пересоздаются по истечении времени жизни.
+    """
+
+    def __init__(self, max_size, timeout, max_lifetime, health_checks,
+                 is_usable, close, reset):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.health_checks = health_checks
+        self._is_usable = is_usable
+        self._close = close
+        self._reset = reset
+        self._condition = Condition()
+        self._idle = []
+        self._created_at = {}
+        self._size = 0
+        self._stats = {
+            'created': 0,
+            'reused': 0,
+            'discarded': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def acquire(self, factory):
+        deadline = monotonic() + self.timeout
+        while True:
+            with self._condition:
+                connection = self._take_idle_or_reserve(deadline)
+            if connection is None:
+                break
+            # Проверка и закрытие соединения могут ждать сети, поэтому
+            # выполняются без блокировки пула.
+            if self._is_alive(connection):
+                with self._condition:
+                    self._stats['reused'] += 1
+                return connection
+            self._discard(connection)
+        try:
+            connection = factory()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._created_at[id(connection)] = monotonic()
+            self._stats['created'] += 1
+        return connection
+
+    def release(self, connection):
+        try:
+            usable = self._reset(connection)
+        except Exception:
+            usable = False
+        if not usable or self._is_expired(connection):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append(connection)
+            self._condition.notify()
+
+    def stats(self):
+        with self._condition:
+            return {
+                'max_size': self.max_size,
+                'size': self._size,
+                'in_use': self._size - len(self._idle),
+                'idle': len(self._idle),
+                **self._stats,
+            }
+
+    def _take_idle_or_reserve(self, deadline):
+        """Забирает свободное соединение из пула или, если их нет, занимает
+        место под новое и возвращает None. Вызывается под блокировкой."""
+        while True:
+            if self._idle:
+                return self._idle.pop()
+            if self._size < self.max_size:
+                self._size += 1
+                return None
+            remaining = deadline - monotonic()
+            if remaining <= 0:
+                self._stats['timeouts'] += 1
+                raise PoolTimeoutError(
+                    f'Все {self.max_size} соединений пула заняты '
+                    f'дольше {self.timeout} с.'
+                )
+            self._stats['waits'] += 1
+            self._condition.wait(remaining)
+
+    def _is_expired(self, connection):
+        created_at = self._created_at.get(id(connection), 0)
+        return (self.max_lifetime is not None
+                and monotonic() - created_at > self.max_lifetime)
+
+    def _is_alive(self, connection):
+        if self._is_expired(connection):
+            return False
+        return not self.health_checks or self._is_usable(connection)
+
+    def _discard(self, connection):
+        with self._condition:
+            self._created_at.pop(id(connection), None)
+            self._size -= 1
+            self._stats['discarded'] += 1
+            self._condition.notify()
+        try:
+            self._close(connection)
+        except Exception:
+            pass
+
+
+def get_pool(alias, options, **callbacks):
+    """Возвращает пул соединений для базы данных alias, создавая его при
+    первом обращении."""
+    if not options:
+        return None
+    with POOLS_LOCK:
+        if alias not in POOLS:
+            POOLS[alias] = ConnectionPool(
+                max_size=options.get('MAX_SIZE', 10),
+                timeout=options.get('TIMEOUT', 30),
+                max_lifetime=options.get('MAX_LIFETIME'),
+                health_checks=options.get('HEALTH_CHECKS', True),
+                **callbacks
+            )
+        return POOLS[alias]
+
+
+def pool_stats():
+    """Статистика использования всех пулов соединений текущего процесса."""
+    with POOLS_LOCK:
+        return {alias: pool.stats() for alias, pool in POOLS.items()}
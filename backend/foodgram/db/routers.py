@@ -0,0 +1,53 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+PRIMARY = 'default'
+
+REPLICA = 'replica'
+
+read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def primary_pin_key(user):
+    return f'db-primary-pin:{user.pk}'
+
+
+def pin_to_primary(user):
+    """Направляет чтение пользователя в основную базу данных на время,
+    достаточное для того, чтобы его запись дошла до реплики."""
+    cache.set(primary_pin_key(user), True, settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_pinned_to_primary(user):
+    return (user.is_authenticated
+            and cache.get(primary_pin_key(user)) is not None)
+
+
+async def ais_pinned_to_primary(user):
+    return (user.is_authenticated
+            and await cache.aget(primary_pin_key(user)) is not None)
+
+
+class PrimaryReplicaRouter:
+    """Запись всегда идёт в основную базу данных, чтение - в реплику, если
+    она настроена и представление разрешило читать из неё."""
+
+    def db_for_read(self, model, **hints):
+        if read_from_replica.get() and replica_configured():
+            return REPLICA
+        return None
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
@@ -0,0 +1,60 @@
+import os
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.module_loading import import_string
+from django.views.decorators.csrf import csrf_exempt
+
+SCHEMA_FILES = {
+    'yaml': ('schema.yaml', 'application/vnd.oai.openapi; charset=utf-8'),
+    'json': (
+        'schema.json',
+        'application/vnd.oai.openapi+json; charset=utf-8'
+    ),
+}
+
+
+def lazy_view(path, **initkwargs):
+    """Представление-класс path, которое импортируется при первом запросе,
+    а не при загрузке URL-конфигурации."""
+    view = None
+
+    @csrf_exempt
+    def wrapper(request, *args, **kwargs):
+        nonlocal view
+        if view is None:
+            view = import_string(path).as_view(**initkwargs)
+        return view(request, *args, **kwargs)
+    return wrapper
+
+
+live_schema_view = lazy_view('drf_spectacular.views.SpectacularAPIView')
+
+
+def schema_format(request):
+    requested = request.GET.get('format')
+    if requested:
+        return requested
+    accept = request.headers.get('Accept', '')
+    return 'json' if 'json' in accept and 'yaml' not in accept else 'yaml'
+
+
+def schema_view(request):
+    """Отдаёт схему OpenAPI, собранную командой build_schema.
+
+    Если PREBUILT_SCHEMA выключен, файла нет или запрошен нестандартный
+    вариант схемы (например, на другом языке), схема строится заново
+    drf-spectacular.
+    """
+    schema_file = SCHEMA_FILES.get(schema_format(request))
+    if (not settings.PREBUILT_SCHEMA or schema_file is None
+            or request.method not in ('GET', 'HEAD')
+            or set(request.GET) - {'format'}):
+        return live_schema_view(request)
+    name, content_type = schema_file
+    try:
+        with open(os.path.join(settings.SCHEMA_ROOT, name), 'rb') as file:
+            content = file.read()
+    except FileNotFoundError:
+        return live_schema_view(request)
+    return HttpResponse(content, content_type=content_type)
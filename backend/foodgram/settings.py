@@ -16,7 +16,7 @@ NEED_POSTGRESQL = os.environ.get('NEED_POSTGRESQL', False)
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', default='127.0.0.1').split()
 # ALLOWED_HOSTS = ['*']
 
-CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS').split()
+CSRF_TRUSTED_ORIGINS = os.getenv('CSRF_TRUSTED_ORIGINS', default='').split()
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -38,12 +38,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.ReferenceDataMiddleware',
 ]
 
 ROOT_URLCONF = 'foodgram.urls'
@@ -68,11 +70,39 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'foodgram.wsgi.application'
 
+ASGI_APPLICATION = 'foodgram.asgi.application'
+
+# Асинхронные представления чтения включаются при запуске через ASGI.
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', default='False') == 'True'
+
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', default=60))
+
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+
+DB_POOL = os.getenv('DB_POOL', default='False') == 'True'
+
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', default=10))
+
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', default=30))
+
+DB_POOL_MAX_LIFETIME = float(os.getenv('DB_POOL_MAX_LIFETIME', default=1800))
+
+DB_SQLITE_TIMEOUT = float(os.getenv('DB_SQLITE_TIMEOUT', default=20))
+
 if not NEED_POSTGRESQL:
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.sqlite3',
+            'ENGINE': 'foodgram.db.backends.sqlite3',
             'NAME': os.path.join(BASE_DIR, 'debug.sqlite3'),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'OPTIONS': {
+                'timeout': DB_SQLITE_TIMEOUT,
+            },
+            'PRAGMAS': {
+                'journal_mode': 'WAL',
+                'synchronous': 'NORMAL',
+            },
         }
     }
 
@@ -88,9 +118,52 @@ else:
             'PASSWORD': os.getenv('POSTGRES_PASSWORD',
                                   default='xxxxyyyyzzzzffff'),
             'HOST': os.getenv('DB_HOST', default='db'),
-            'PORT': os.getenv('DB_PORT', default=5432)
+            'PORT': os.getenv('DB_PORT', default=5432),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
         }
     }
+    if DB_POOL:
+        # Соединения возвращаются в пул в конце каждого запроса, а пул сам
+        # следит за их временем жизни и работоспособностью.
+        DATABASES['default'].update({
+            'ENGINE': 'foodgram.db.backends.postgresql',
+            'CONN_MAX_AGE': 0,
+            'POOL': {
+                'MAX_SIZE': DB_POOL_MAX_SIZE,
+                'TIMEOUT': DB_POOL_TIMEOUT,
+                'MAX_LIFETIME': DB_POOL_MAX_LIFETIME,
+                'HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            },
+        })
+
+DB_REPLICA_HOST = os.getenv('DB_REPLICA_HOST')
+
+DB_REPLICA_SQLITE_NAME = os.getenv('DB_REPLICA_SQLITE_NAME')
+
+DB_REPLICA_STICKY_SECONDS = int(
+    os.getenv('DB_REPLICA_STICKY_SECONDS', default=15)
+)
+
+if NEED_POSTGRESQL and DB_REPLICA_HOST:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': DB_REPLICA_HOST,
+        'PORT': os.getenv(
+            'DB_REPLICA_PORT',
+            default=DATABASES['default']['PORT']
+        ),
+    }
+elif not NEED_POSTGRESQL and DB_REPLICA_SQLITE_NAME:
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.path.join(BASE_DIR, DB_REPLICA_SQLITE_NAME),
+    }
+
+if 'replica' in DATABASES:
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['foodgram.db.routers.PrimaryReplicaRouter']
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -112,11 +185,201 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Число прокси (nginx) перед приложением для определения IP клиента.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', default=1)),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
 
+# Схема OpenAPI собирается командой build_schema в SCHEMA_ROOT и отдаётся
+# из файла, при PREBUILT_SCHEMA=False она строится на каждый запрос.
+PREBUILT_SCHEMA = os.getenv('PREBUILT_SCHEMA', default='True') == 'True'
+
+SCHEMA_ROOT = os.getenv(
+    'SCHEMA_ROOT',
+    default=os.path.join(BASE_DIR, 'openapi')
+)
+
+# Поток server-sent events о новых рецептах отдаётся только при запуске
+# через ASGI. EVENT_BROKER - брокер сообщений: api.events.LocalBroker внутри
+# процесса или api.events.PostgresBroker для нескольких воркеров. С
+# PostgreSQL по умолчанию используется PostgresBroker (проверка api.W002).
+EVENTS_PATH = '/api/events/'
+
+EVENT_BROKER = os.getenv(
+    'EVENT_BROKER',
+    default=(
+        'api.events.PostgresBroker' if NEED_POSTGRESQL
+        else 'api.events.LocalBroker'
+    )
+)
+
+EVENTS_PG_CHANNEL = 'foodgram_events'
+
+EVENTS_HEARTBEAT = int(os.getenv('EVENTS_HEARTBEAT', default=15))
+
+# Задержка переподключения клиента в миллисекундах.
+EVENTS_RETRY = int(os.getenv('EVENTS_RETRY', default=5000))
+
+EVENTS_QUEUE_SIZE = int(os.getenv('EVENTS_QUEUE_SIZE', default=100))
+
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', default='True') == 'True'
+
+# Корзины токенов: capacity - ёмкость, rate - пополнение в токенах в секунду.
+THROTTLE_BUCKETS = {
+    'user': {
+        'capacity': int(os.getenv('THROTTLE_USER_CAPACITY', default=120)),
+        'rate': float(os.getenv('THROTTLE_USER_RATE', default=2)),
+    },
+    'anon': {
+        'capacity': int(os.getenv('THROTTLE_ANON_CAPACITY', default=60)),
+        'rate': float(os.getenv('THROTTLE_ANON_RATE', default=1)),
+    },
+}
+
+# api.throttling.LocalBucketStore - корзины в памяти процесса,
+# api.throttling.SQLiteBucketStore - в файле SQLite, общем для воркеров.
+THROTTLE_STORE = os.getenv(
+    'THROTTLE_STORE',
+    default='api.throttling.LocalBucketStore'
+)
+
+THROTTLE_SQLITE_PATH = os.getenv(
+    'THROTTLE_SQLITE_PATH',
+    default=os.path.join(BASE_DIR, 'throttle.sqlite3')
+)
+
+# Общий для воркеров кэш L2: по умолчанию файл SQLite на одном сервере,
+# django.core.cache.backends.redis.RedisCache с CACHE_LOCATION=redis://...
+# - Redis, django.core.cache.backends.filebased.FileBasedCache - каталог.
+# Кэш TIERED_CACHE добавляет перед ним ограниченный LRU-кэш L1 в памяти
+# процесса и get_or_compute с защитой от одновременного пересчёта.
+CACHE_BACKEND = os.getenv(
+    'CACHE_BACKEND',
+    default='foodgram.cache.SQLiteCache'
+)
+
+CACHE_LOCATION = os.getenv(
+    'CACHE_LOCATION',
+    default=os.path.join(BASE_DIR, 'cache.sqlite3')
+)
+
+TIERED_CACHE = 'tiered'
+
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': CACHE_LOCATION,
+    },
+    TIERED_CACHE: {
+        'BACKEND': 'foodgram.cache.TieredCache',
+        'LOCATION': TIERED_CACHE,
+        'OPTIONS': {
+            'L2': 'default',
+            'L1_MAX_ENTRIES': int(
+                os.getenv('CACHE_L1_MAX_ENTRIES', default=1000)
+            ),
+            'L1_TIMEOUT': int(os.getenv('CACHE_L1_TIMEOUT', default=5)),
+        },
+    },
+}
+
+# Кэш токенов должен быть общим для воркеров, иначе отозванный токен
+# остаётся действительным в других процессах (проверка api.W001).
+TOKEN_AUTH_CACHE = 'default'
+
+TOKEN_AUTH_CACHE_TIMEOUT = int(
+    os.getenv('TOKEN_AUTH_CACHE_TIMEOUT', default=300)
+)
+
+# Лента подписок: merge - слияние рецептов авторов при чтении, fanout -
+# раскладка рецептов по лентам подписчиков при публикации.
+FEED_STRATEGY = os.getenv('FEED_STRATEGY', default='merge')
+
+FEED_FANOUT_THRESHOLD = int(os.getenv('FEED_FANOUT_THRESHOLD', default=1000))
+
+FEED_FANOUT_BATCH_SIZE = 1000
+
+FEED_BACKFILL_SIZE = 50
+
+FEED_POPULAR_AUTHORS_TIMEOUT = 300
+
+RECOMMENDATIONS_TOP_K = int(os.getenv('RECOMMENDATIONS_TOP_K', default=10))
+
+# Инкрементальный расчёт похожих рецептов повторно учитывает добавления за
+# последние RECOMMENDATIONS_LAG_SECONDS, чтобы не пропустить долгие
+# транзакции.
+RECOMMENDATIONS_LAG_SECONDS = int(
+    os.getenv('RECOMMENDATIONS_LAG_SECONDS', default=60)
+)
+
+POPULARITY_HALF_LIFE_DAYS = float(
+    os.getenv('POPULARITY_HALF_LIFE_DAYS', default=7)
+)
+
+PANTRY_CHANGES_TIMEOUT = 24 * 60 * 60
+
+PANTRY_MAX_REPLAYED_CHANGES = 1000
+
+PANTRY_MAX_INGREDIENTS = 50
+
+BULK_MAX_RECIPES = 100
+
+# Сериализация рецептов и подписок для чтения по строкам values() вместо
+# полей DRF.
+FAST_SERIALIZERS = os.getenv('FAST_SERIALIZERS', default='True') == 'True'
+
+RECIPE_FRAGMENTS_TIMEOUT = 24 * 60 * 60
+
+# Инкрементальная синхронизация рецептов: изменения отдаются с задержкой
+# RECIPE_CHANGES_LAG_SECONDS, чтобы не пропустить долгие транзакции, а
+# записи об удалённых рецептах хранятся RECIPE_TOMBSTONES_DAYS дней.
+RECIPE_CHANGES_LAG_SECONDS = int(
+    os.getenv('RECIPE_CHANGES_LAG_SECONDS', default=5)
+)
+
+RECIPE_TOMBSTONES_DAYS = int(os.getenv('RECIPE_TOMBSTONES_DAYS', default=30))
+
+# Фоновое удаление пользователей и рецептов командой process_deletions:
+# зависимые строки удаляются пачками по DELETION_BATCH_SIZE, а рецепты с их
+# ингредиентами и тегами - по DELETION_RECIPES_BATCH_SIZE.
+DELETION_BATCH_SIZE = int(os.getenv('DELETION_BATCH_SIZE', default=1000))
+
+DELETION_RECIPES_BATCH_SIZE = int(
+    os.getenv('DELETION_RECIPES_BATCH_SIZE', default=50)
+)
+
+# Списки админки по таблицам больше этого числа строк показывают их
+# примерное количество из статистики PostgreSQL.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 10000
+
+# Ответы меньше COMPRESSION_MIN_SIZE байт не сжимаются, а больше
+# COMPRESSION_STREAMING_SIZE - сжимаются и отдаются частями.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', default=1024))
+
+COMPRESSION_STREAMING_SIZE = 256 * 1024
+
+COMPRESSION_CHUNK_SIZE = 64 * 1024
+
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', default=6))
+
+COMPRESSION_BROTLI_QUALITY = int(
+    os.getenv('COMPRESSION_BROTLI_QUALITY', default=4)
+)
+
 LANGUAGE_CODE = 'ru'
 
 TIME_ZONE = 'Europe/Moscow'
@@ -129,6 +392,20 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Файлы с ограниченным доступом, например списки покупок, отдаются только
+# через представления. При FILE_DELIVERY=nginx представление проверяет доступ,
+# а сам файл по заголовку X-Accel-Redirect отдаёт nginx.
+PROTECTED_MEDIA_URL = '/protected/'
+PROTECTED_MEDIA_ROOT = os.path.join(BASE_DIR, 'protected')
+
+FILE_DELIVERY = os.getenv('FILE_DELIVERY', default='django')
+
+# Прежние версии защищённого файла удаляются, только если их не запрашивали
+# столько секунд: их ещё могут скачивать по уже выданным ответам.
+PROTECTED_FILES_GRACE_SECONDS = int(
+    os.getenv('PROTECTED_FILES_GRACE_SECONDS', default=600)
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.CustomUser'
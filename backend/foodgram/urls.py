@@ -3,8 +3,8 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 from django.views.generic import TemplateView
-from drf_spectacular.views import (SpectacularAPIView, SpectacularRedocView,
-                                   SpectacularSwaggerView)
+
+from foodgram.schema import lazy_view, schema_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,15 +14,21 @@ urlpatterns = [
         name='redoc'
     ),
     path('api/', include('api.urls')),
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    path('api/schema/', schema_view, name='schema'),
     path(
         'api/schema/swagger-ui/',
-        SpectacularSwaggerView.as_view(url_name='schema'),
+        lazy_view(
+            'drf_spectacular.views.SpectacularSwaggerView',
+            url_name='schema'
+        ),
         name='swagger-ui'
     ),
     path(
         'api/schema/redoc/',
-        SpectacularRedocView.as_view(url_name='schema'),
+        lazy_view(
+            'drf_spectacular.views.SpectacularRedocView',
+            url_name='schema'
+        ),
         name='redoc'
     ),
 ]
@@ -0,0 +1,13 @@
+import os
+
+wsgi_app = 'foodgram.asgi:application'
+
+worker_class = 'uvicorn.workers.UvicornWorker'
+
+bind = os.getenv('GUNICORN_BIND', default='0:8000')
+
+workers = int(os.getenv('GUNICORN_WORKERS', default=2 * os.cpu_count() + 1))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', default=30))
+
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', default=5))
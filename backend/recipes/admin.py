@@ -1,39 +1,110 @@
 from django.contrib import admin
 from django.contrib.auth.models import Group
-from django.utils.html import format_html
-
-from recipes.models import (FavoritesRecipe, Ingredient, Recipe,
+from django.db.models import Prefetch
+from django.utils.html import format_html, format_html_join
+
+from foodgram.admin_tools import (BackgroundDeletionAdminMixin,
+                                  ScalableAdminMixin, count_subquery,
+                                  input_filter)
+from recipes.deletion import schedule_recipe_deletion
+from recipes.models import (DeletionTask, FavoritesRecipe, Ingredient, Recipe,
                             RecipeIngredient, RecipeTag, ShoppingList,
                             Subscription, Tag)
 
+UserFilter = input_filter('user__username', 'логину пользователя')
+
+RecipeNameFilter = input_filter(
+    'recipe__name__istartswith',
+    'началу названия рецепта'
+)
+
+
+class CookingTimeFilter(admin.SimpleListFilter):
+    title = 'времени приготовления'
+    parameter_name = 'cooking_time'
+    ranges = {
+        'fast': ('До 15 минут', (None, 15)),
+        'medium': ('От 15 до 60 минут', (15, 60)),
+        'long': ('Больше часа', (60, None)),
+    }
+
+    def lookups(self, request, model_admin):
+        return [(key, title) for key, (title, _) in self.ranges.items()]
+
+    def queryset(self, request, queryset):
+        if self.value() not in self.ranges:
+            return queryset
+        low, high = self.ranges[self.value()][1]
+        if low is not None:
+            queryset = queryset.filter(cooking_time__gt=low)
+        if high is None:
+            return queryset
+        return queryset.filter(cooking_time__lte=high)
+
 
 class RecipeIngredientInLine(admin.TabularInline):
     model = RecipeIngredient
     min_num = 1
     extra = 0
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'recipe',
+            'ingredient'
+        )
 
 
 class RecipeTagInLine(admin.TabularInline):
     model = RecipeTag
     min_num = 1
     extra = 0
+    autocomplete_fields = ('tag',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('recipe', 'tag')
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'measurement_unit',)
-    list_filter = ('name',)
+    list_filter = (
+        input_filter('name__istartswith', 'началу наименования'),
+        input_filter('measurement_unit', 'единице измерения'),
+    )
     search_fields = ('name',)
     save_on_top = True
 
 
+@admin.register(DeletionTask)
+class DeletionTaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'kind',
+        'object_id',
+        'stage',
+        'deleted_objects',
+        'created',
+        'updated',
+        'finished',
+    )
+    list_filter = ('kind',)
+    readonly_fields = ('images',)
+
+    def has_add_permission(self, request):
+        return False
+
+
 @admin.register(FavoritesRecipe)
-class FavoritesRecipeAdmin(admin.ModelAdmin):
+class FavoritesRecipeAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('get_username', 'get_recipe_name',)
     search_fields = ('user__username', 'recipe__name',)
-    list_filter = ('user__username', 'recipe__name',)
+    list_filter = (UserFilter, RecipeNameFilter,)
+    autocomplete_fields = ('user', 'recipe',)
     save_on_top = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'recipe')
+
     @admin.display(ordering='user__username', description='Логин пользователя')
     def get_username(self, obj):
         return obj.user.username
@@ -44,7 +115,8 @@ class FavoritesRecipeAdmin(admin.ModelAdmin):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BackgroundDeletionAdminMixin, ScalableAdminMixin,
+                  admin.ModelAdmin):
     list_display = (
         'get_username_author',
         'name',
@@ -53,13 +125,34 @@ class RecipeAdmin(admin.ModelAdmin):
         'get_favorites_recipe_count'
     )
     search_fields = ('author__username', 'name', 'cooking_time',)
-    list_filter = ('author__username', 'name', 'tags__name', 'cooking_time',)
+    list_filter = (
+        input_filter('author__username', 'логину автора'),
+        'tags',
+        CookingTimeFilter,
+    )
+    autocomplete_fields = ('author',)
     inlines = (RecipeIngredientInLine, RecipeTagInLine,)
     save_on_top = True
+    schedule_deletion = staticmethod(schedule_recipe_deletion)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(Prefetch(
+            'recipeingredient_set',
+            queryset=RecipeIngredient.objects.select_related(
+                'ingredient'
+            ).order_by('id')
+        )).annotate(
+            favorites_count=count_subquery(FavoritesRecipe, 'recipe')
+        )
 
-    @admin.display(description='Добавили в Избранное раз')
+    @admin.display(
+        ordering='favorites_count',
+        description='Добавили в Избранное раз'
+    )
     def get_favorites_recipe_count(self, obj):
-        return obj.recipes_favoritesrecipe_related.count()
+        return obj.favorites_count
 
     @admin.display(
         ordering='author__username',
@@ -70,24 +163,28 @@ class RecipeAdmin(admin.ModelAdmin):
 
     @admin.display(description='Список ингредиентов')
     def get_ingredients(self, obj):
-        values = RecipeIngredient.objects.filter(recipe=obj).values_list(
-            'ingredient__name',
-            flat=True
+        return format_html(
+            '<ul>{}</ul>',
+            format_html_join(
+                '',
+                '<li>{}</li>',
+                ((item.ingredient.name,)
+                 for item in obj.recipeingredient_set.all())
+            )
         )
-        html = '<ul>'
-        for ingredient in values:
-            html += f'<li>{ingredient}</li>'
-        html += '</ul>'
-        return format_html(html)
 
 
 @admin.register(ShoppingList)
-class ShoppingListAdmin(admin.ModelAdmin):
+class ShoppingListAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('get_username', 'get_recipe_name',)
     search_fields = ('user__username', 'recipe__name',)
-    list_filter = ('user__username', 'recipe__name',)
+    list_filter = (UserFilter, RecipeNameFilter,)
+    autocomplete_fields = ('user', 'recipe',)
     save_on_top = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('user', 'recipe')
+
     @admin.display(ordering='user__username', description='Логин пользователя')
     def get_username(self, obj):
         return obj.user.username
@@ -98,12 +195,22 @@ class ShoppingListAdmin(admin.ModelAdmin):
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(ScalableAdminMixin, admin.ModelAdmin):
     list_display = ('get_username_user', 'get_username_subscribed_author',)
     search_fields = ('user__username', 'subscribed_author__username',)
-    list_filter = ('user__username',)
+    list_filter = (
+        UserFilter,
+        input_filter('subscribed_author__username', 'логину автора'),
+    )
+    autocomplete_fields = ('user', 'subscribed_author',)
     save_on_top = True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'user',
+            'subscribed_author'
+        )
+
     @admin.display(
         ordering='user__username',
         description='Пользователь, подписавшийся на автора'
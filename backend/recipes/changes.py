@@ -0,0 +1,142 @@
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime, timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from recipes.models import Recipe, RecipeTombstone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+TOKEN_VERSION = '1'
+
+# Наибольший id записи BigAutoField.
+MAX_ID = 2 ** 63 - 1
+
+
+class SyncToken(NamedTuple):
+    """Позиция клиента в журналах изменённых и удалённых рецептов: время и
+    id последней полученной записи каждого журнала."""
+    updated: datetime
+    recipe_id: int
+    deleted: datetime
+    tombstone_id: int
+
+    def encode(self):
+        """Непрозрачная для клиента строка токена."""
+        return urlsafe_b64encode('.'.join((
+            TOKEN_VERSION,
+            str(microseconds(self.updated)),
+            str(self.recipe_id),
+            str(microseconds(self.deleted)),
+            str(self.tombstone_id),
+        )).encode()).decode().rstrip('=')
+
+    @classmethod
+    def decode(cls, token):
+        """Разбирает токен, при ошибке вызывает ValueError."""
+        try:
+            version, *parts = urlsafe_b64decode(
+                token + '=' * (-len(token) % 4)
+            ).decode().split('.')
+        except (ValueError, UnicodeDecodeError):
+            raise ValueError('Недействительный токен синхронизации!')
+        if version != TOKEN_VERSION or len(parts) != 4 or not all(
+                part.isdigit() for part in parts
+        ):
+            raise ValueError('Недействительный токен синхронизации!')
+        updated, recipe_id, deleted, tombstone_id = map(int, parts)
+        if recipe_id > MAX_ID or tombstone_id > MAX_ID:
+            raise ValueError('Недействительный токен синхронизации!')
+        try:
+            return cls(
+                EPOCH + timedelta(microseconds=updated),
+                recipe_id,
+                EPOCH + timedelta(microseconds=deleted),
+                tombstone_id
+            )
+        except (OverflowError, ValueError):
+            raise ValueError('Недействительный токен синхронизации!')
+
+    def is_expired(self):
+        """Удаления старше срока хранения журнала уже могли быть стёрты, и
+        клиенту нужна полная синхронизация."""
+        return self.deleted < timezone.now() - timedelta(
+            days=settings.RECIPE_TOMBSTONES_DAYS
+        )
+
+
+def microseconds(moment):
+    delta = moment - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+
+
+def initial_token():
+    """Токен первой синхронизации: все существующие рецепты и удаления
+    начиная с текущего момента."""
+    return SyncToken(EPOCH, 0, changes_horizon(), 0)
+
+
+def changes_horizon():
+    """Изменения новее этого момента ещё не отдаются: транзакции, начатые
+    раньше, могут зафиксироваться позже, и их изменения были бы пропущены.
+    """
+    return timezone.now() - timedelta(
+        seconds=settings.RECIPE_CHANGES_LAG_SECONDS
+    )
+
+
+def after(time_field, time, id_field, pk):
+    return Q(**{f'{time_field}__gt': time}) | Q(
+        **{time_field: time, f'{id_field}__gt': pk}
+    )
+
+
+def recipe_changes(token, limit):
+    """Изменения после позиции token: id изменённых и удалённых рецептов,
+    по limit из каждого журнала, новый токен и признак того, что в журналах
+    остались записи."""
+    horizon = changes_horizon()
+    changed = list(Recipe.objects.filter(
+        after('updated', token.updated, 'id', token.recipe_id),
+        updated__lte=horizon
+    ).order_by('updated', 'id').values_list('updated', 'id')[:limit + 1])
+    deleted = list(RecipeTombstone.objects.filter(
+        after('deleted', token.deleted, 'id', token.tombstone_id),
+        deleted__lte=horizon
+    ).order_by('deleted', 'id').values_list(
+        'deleted',
+        'id',
+        'recipe_id'
+    )[:limit + 1])
+    return (
+        [pk for _, pk in changed[:limit]],
+        [pk for _, _, pk in deleted[:limit]],
+        SyncToken(
+            *position(changed, limit, token[:2], horizon),
+            *position(deleted, limit, token[2:], horizon)
+        ),
+        len(changed) > limit or len(deleted) > limit
+    )
+
+
+def position(rows, limit, current, horizon):
+    """Новая позиция в журнале: последняя отданная запись, а если журнал
+    прочитан до конца - момент horizon, чтобы токен не устаревал, пока
+    изменений нет."""
+    if len(rows) > limit:
+        return tuple(rows[limit - 1][:2])
+    last = tuple(rows[-1][:2]) if rows else tuple(current)
+    return max(last, (horizon, 0))
+
+
+def prune_tombstones():
+    """Удаляет записи об удалённых рецептах старше срока хранения."""
+    deleted, _ = RecipeTombstone.objects.filter(
+        deleted__lt=timezone.now() - timedelta(
+            days=settings.RECIPE_TOMBSTONES_DAYS
+        )
+    ).delete()
+    return deleted
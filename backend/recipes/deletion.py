@@ -0,0 +1,162 @@
+import time
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import CASCADE
+from django.dispatch import Signal
+from django.utils import timezone
+
+from recipes.models import (DeletionTask, Recipe, RecipeIngredient, RecipeTag,
+                            RecipeTombstone)
+from users.models import CustomUser
+
+# Ингредиенты и теги рецепта удаляются вместе с ним: на каждый рецепт их
+# немного, а сигналы их удаления не отмечают удаляемый рецепт изменённым.
+RECIPE_PARTS = (RecipeIngredient, RecipeTag)
+
+# Отправляется с аргументом recipe_ids, когда рецепты скрыты обновлением
+# queryset, которое не вызывает сигналы post_save.
+recipes_hidden = Signal()
+
+
+def cascade_relations(model, exclude=()):
+    """Модели и поля внешних ключей, строки которых удаляются каскадно вместе
+    с объектом model, включая связи без обратного имени."""
+    return [
+        (relation.related_model, relation.field.name)
+        for relation in model._meta.get_fields(include_hidden=True)
+        if relation.auto_created and not relation.concrete
+        and (relation.one_to_many or relation.one_to_one)
+        and relation.on_delete is CASCADE
+        and relation.related_model not in exclude
+    ]
+
+
+def hide_recipes(queryset):
+    """Скрывает рецепты из API и сразу записывает их удаление для
+    инкрементальной синхронизации клиентов."""
+    queryset = queryset.filter(pending_deletion=False)
+    recipe_ids = list(queryset.values_list('id', flat=True))
+    if not recipe_ids:
+        return
+    queryset.update(pending_deletion=True)
+    RecipeTombstone.objects.bulk_create(
+        (RecipeTombstone(recipe_id=recipe_id) for recipe_id in recipe_ids),
+        batch_size=settings.DELETION_BATCH_SIZE
+    )
+    recipes_hidden.send(sender=Recipe, recipe_ids=recipe_ids)
+
+
+def create_task(kind, object_id):
+    task, _ = DeletionTask.objects.get_or_create(
+        kind=kind,
+        object_id=object_id,
+        finished__isnull=True
+    )
+    return task
+
+
+@transaction.atomic
+def schedule_recipe_deletion(recipe):
+    """Скрывает рецепт и ставит его удаление в очередь команды
+    process_deletions."""
+    hide_recipes(Recipe.all_objects.filter(pk=recipe.pk))
+    return create_task(DeletionTask.RECIPE, recipe.pk)
+
+
+@transaction.atomic
+def schedule_user_deletion(user):
+    """Деактивирует пользователя, скрывает его рецепты и ставит удаление в
+    очередь команды process_deletions."""
+    user.is_active = False
+    user.save(update_fields=['is_active'])
+    hide_recipes(Recipe.all_objects.filter(author=user))
+    return create_task(DeletionTask.USER, user.pk)
+
+
+def delete_in_batches(task, queryset, batch_size, pause, file_field=None):
+    """Удаляет строки queryset пачками по batch_size, каждую в отдельной
+    короткой транзакции вместе с сохранением прогресса задачи.
+
+    Имена файлов из поля file_field запоминаются в задаче в той же
+    транзакции, что и удаление строк, чтобы удалить файлы в конце.
+    """
+    task.stage = queryset.model._meta.label
+    fields = ('pk',) if file_field is None else ('pk', file_field)
+    while True:
+        with transaction.atomic():
+            rows = list(
+                queryset.order_by().values_list(*fields)[:batch_size]
+            )
+            if not rows:
+                return
+            if file_field is not None:
+                task.images += [name for _, name in rows if name]
+            deleted, _ = queryset.model._base_manager.filter(
+                pk__in=[row[0] for row in rows]
+            ).delete()
+            task.deleted_objects += deleted
+            task.save(update_fields=[
+                'stage',
+                'deleted_objects',
+                'images',
+                'updated'
+            ])
+        if pause:
+            time.sleep(pause)
+
+
+def delete_files(names):
+    """Удаляет файлы, на которые больше не ссылается ни один рецепт."""
+    used = set(Recipe._base_manager.filter(image__in=names).values_list(
+        'image',
+        flat=True
+    ))
+    for name in set(names) - used:
+        default_storage.delete(name)
+
+
+def process(task, batch_size, recipes_batch_size, pause=0):
+    """Удаляет объект задачи и зависимые от него объекты.
+
+    Сначала пачками удаляются строки, ссылающиеся на рецепты (избранное,
+    списки покупок, ленты, похожие рецепты), затем сами рецепты с
+    ингредиентами и тегами, а при удалении пользователя - его подписки,
+    подписчики, токен и остальные связанные строки и в конце сам
+    пользователь. Файлы изображений удаляются последними. Прогресс хранится в
+    базе данных, поэтому прерванная задача при следующем запуске
+    продолжается с того же места.
+    """
+    if task.kind == DeletionTask.USER:
+        recipes = Recipe.all_objects.filter(author_id=task.object_id)
+    else:
+        recipes = Recipe.all_objects.filter(pk=task.object_id)
+    for model, field in cascade_relations(Recipe, exclude=RECIPE_PARTS):
+        delete_in_batches(
+            task,
+            model._base_manager.filter(**{f'{field}__in': recipes}),
+            batch_size,
+            pause
+        )
+    delete_in_batches(task, recipes, recipes_batch_size, pause, 'image')
+    if task.kind == DeletionTask.USER:
+        for model, field in cascade_relations(CustomUser, exclude=(Recipe,)):
+            delete_in_batches(
+                task,
+                model._base_manager.filter(**{field: task.object_id}),
+                batch_size,
+                pause
+            )
+        delete_in_batches(
+            task,
+            CustomUser._base_manager.filter(pk=task.object_id),
+            batch_size,
+            pause
+        )
+    delete_files(task.images)
+    task.stage = ''
+    task.images = []
+    task.finished = timezone.now()
+    task.save()
+    return task
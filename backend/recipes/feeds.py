@@ -0,0 +1,193 @@
+from heapq import merge
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count
+
+from recipes.models import FeedEntry, Recipe, Subscription
+
+POPULAR_AUTHORS_KEY = 'feed-popular-authors'
+
+
+def popular_author_ids():
+    """Авторы, у которых подписчиков больше порога рассылки по лентам.
+
+    Их рецепты не раскладываются по лентам при публикации, а подмешиваются
+    в ленту при чтении. Подсчёт подписчиков по всей таблице выполняет один
+    воркер, остальные получают готовый результат из кэша.
+    """
+    return caches[settings.TIERED_CACHE].get_or_compute(
+        POPULAR_AUTHORS_KEY,
+        lambda: frozenset(
+            Subscription.objects.values('subscribed_author').annotate(
+                subscribers=Count('id')
+            ).filter(
+                subscribers__gt=settings.FEED_FANOUT_THRESHOLD
+            ).values_list('subscribed_author', flat=True)
+        ),
+        settings.FEED_POPULAR_AUTHORS_TIMEOUT
+    )
+
+
+def forget_popular_authors():
+    caches[settings.TIERED_CACHE].delete(POPULAR_AUTHORS_KEY)
+
+
+def is_popular(author_id):
+    if author_id in popular_author_ids():
+        return True
+    if Subscription.objects.filter(
+            subscribed_author_id=author_id
+    ).count() <= settings.FEED_FANOUT_THRESHOLD:
+        return False
+    forget_popular_authors()
+    return True
+
+
+def add_to_feeds(user_ids, recipe_ids, author_id):
+    FeedEntry.objects.bulk_create(
+        (
+            FeedEntry(
+                user_id=user_id,
+                recipe_id=recipe_id,
+                author_id=author_id
+            )
+            for user_id in user_ids
+            for recipe_id in recipe_ids
+        ),
+        batch_size=settings.FEED_FANOUT_BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(recipe):
+    """Раскладывает новый рецепт по лентам подписчиков автора."""
+    if is_popular(recipe.author_id):
+        return
+    add_to_feeds(
+        Subscription.objects.filter(
+            subscribed_author_id=recipe.author_id
+        ).values_list('user_id', flat=True).iterator(),
+        (recipe.id,),
+        recipe.author_id
+    )
+
+
+def backfill(subscription):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    if is_popular(subscription.subscribed_author_id):
+        return
+    add_to_feeds(
+        (subscription.user_id,),
+        Recipe.objects.filter(
+            author_id=subscription.subscribed_author_id
+        ).order_by('-id').values_list(
+            'id',
+            flat=True
+        )[:settings.FEED_BACKFILL_SIZE],
+        subscription.subscribed_author_id
+    )
+
+
+def remove_from_feed(subscription):
+    FeedEntry.objects.filter(
+        user_id=subscription.user_id,
+        author_id=subscription.subscribed_author_id
+    ).delete()
+
+
+def check_left_popular(author_id):
+    """Вызывается после отписки от автора внутри удаляющей транзакции.
+
+    Рецепты, опубликованные, пока автор был популярным, не разложены по
+    лентам. Когда подписчиков становится не больше порога, они перестают
+    подмешиваться при чтении, поэтому после фиксации транзакции последние
+    рецепты автора раскладываются по лентам оставшихся подписчиков.
+    Подписчики считаются до фиксации: из одновременных отписок переход
+    через порог видит хотя бы одна.
+    """
+    subscribers = Subscription.objects.filter(
+        subscribed_author_id=author_id
+    ).count()
+    if subscribers > settings.FEED_FANOUT_THRESHOLD:
+        return
+    if (subscribers < settings.FEED_FANOUT_THRESHOLD
+            and author_id not in popular_author_ids()):
+        return
+    transaction.on_commit(lambda: refill_feeds(author_id))
+
+
+def refill_feeds(author_id):
+    """Раскладывает последние рецепты автора, переставшего быть
+    популярным, по лентам его подписчиков."""
+    forget_popular_authors()
+    add_to_feeds(
+        Subscription.objects.filter(
+            subscribed_author_id=author_id
+        ).values_list('user_id', flat=True).iterator(),
+        list(Recipe.objects.filter(
+            author_id=author_id
+        ).order_by('-id').values_list(
+            'id',
+            flat=True
+        )[:settings.FEED_BACKFILL_SIZE]),
+        author_id
+    )
+
+
+def followed_recipe_ids(user, before, limit, authors=None):
+    queryset = Recipe.objects.filter(author__subscribed_author__user=user)
+    if authors is not None:
+        queryset = queryset.filter(author__in=authors)
+    if before is not None:
+        queryset = queryset.filter(id__lt=before)
+    return queryset.order_by('-id').values_list('id', flat=True)[:limit]
+
+
+def merge_feed(user, before, limit):
+    """Лента при чтении: последние рецепты всех авторов, на которых подписан
+    пользователь, сливаются базой данных по убыванию id с использованием
+    индекса (author, -id)."""
+    return list(followed_recipe_ids(user, before, limit))
+
+
+def fanout_feed(user, before, limit):
+    """Лента, заполненная при записи, слитая с рецептами популярных
+    авторов, которые в неё не раскладываются."""
+    timeline = FeedEntry.objects.filter(user=user)
+    if before is not None:
+        timeline = timeline.filter(recipe_id__lt=before)
+    streams = [
+        timeline.order_by('-recipe_id').values_list(
+            'recipe_id',
+            flat=True
+        )[:limit]
+    ]
+    popular = popular_author_ids()
+    if popular:
+        streams.append(followed_recipe_ids(user, before, limit, popular))
+    recipe_ids = []
+    for recipe_id in merge(*streams, reverse=True):
+        if recipe_ids and recipe_ids[-1] == recipe_id:
+            continue
+        recipe_ids.append(recipe_id)
+        if len(recipe_ids) == limit:
+            break
+    return recipe_ids
+
+
+FEED_STRATEGIES = {
+    'merge': merge_feed,
+    'fanout': fanout_feed,
+}
+
+
+def feed_recipe_ids(user, before=None, limit=10, strategy=None):
+    """Идентификаторы рецептов ленты подписок по убыванию, строго меньше
+    before."""
+    return FEED_STRATEGIES[strategy or settings.FEED_STRATEGY](
+        user,
+        before,
+        limit
+    )
@@ -0,0 +1,121 @@
+from time import perf_counter
+
+from django.core.management import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from recipes.feeds import (FEED_STRATEGIES, add_to_feeds, feed_recipe_ids,
+                           forget_popular_authors)
+from recipes.models import Recipe, Subscription
+from users.models import CustomUser
+
+FOLLOWED_AUTHORS = (10, 1000, 10000)
+
+RECIPES_PER_AUTHOR = 2
+
+POPULAR_AUTHORS = 10
+
+
+class Command(BaseCommand):
+    help = ("Measures the subscription feed for users following 10, 1,000 "
+            "and 10,000 authors with the read-time merge and the fan-out "
+            "strategies. All synthetic data is rolled back at the end.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            readers = self.create_data()
+            # Первые авторы подписаны всеми читателями и считаются
+            # популярными, их рецепты подмешиваются при чтении.
+            with override_settings(FEED_FANOUT_THRESHOLD=len(readers) - 1):
+                forget_popular_authors()
+                self.report(readers, options)
+            forget_popular_authors()
+            transaction.set_rollback(True)
+
+    def create_data(self):
+        self.stdout.write(self.style.WARNING('Creating synthetic data...'))
+        authors = CustomUser.objects.bulk_create(
+            CustomUser(
+                username=f'feed_author_{number}',
+                email=f'feed_author_{number}@example.com',
+                first_name='Автор',
+                last_name='Ленты',
+            )
+            for number in range(max(FOLLOWED_AUTHORS))
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author,
+                name=f'Рецепт {number}',
+                image='recipes/benchmark.png',
+                text='Описание',
+                cooking_time=10,
+            )
+            for number in range(RECIPES_PER_AUTHOR)
+            for author in authors
+        )
+        readers = {}
+        for followed in FOLLOWED_AUTHORS:
+            reader = CustomUser.objects.create(
+                username=f'feed_reader_{followed}',
+                email=f'feed_reader_{followed}@example.com',
+            )
+            Subscription.objects.bulk_create(
+                Subscription(user=reader, subscribed_author=author)
+                for author in authors[:followed]
+            )
+            for author in authors[POPULAR_AUTHORS:followed]:
+                add_to_feeds(
+                    (reader.id,),
+                    Recipe.objects.filter(author=author).values_list(
+                        'id',
+                        flat=True
+                    ),
+                    author.id
+                )
+            readers[followed] = reader
+        return readers
+
+    def measure(self, reader, strategy, before, options):
+        with CaptureQueriesContext(connection) as queries:
+            started = perf_counter()
+            for _ in range(options['repeat']):
+                recipe_ids = feed_recipe_ids(
+                    reader,
+                    before=before,
+                    limit=options['limit'],
+                    strategy=strategy
+                )
+            elapsed = (perf_counter() - started) / options['repeat']
+        return elapsed * 1000, len(queries) // options['repeat'], recipe_ids
+
+    def report(self, readers, options):
+        self.stdout.write(
+            f'{"followed":>8} {"strategy":>8} {"page":>6} {"ms":>8} '
+            f'{"queries":>7}'
+        )
+        for followed, reader in readers.items():
+            for strategy in FEED_STRATEGIES:
+                feed_recipe_ids(reader, limit=1, strategy=strategy)
+                before = None
+                for page in ('first', 'tenth'):
+                    if page == 'tenth':
+                        before = feed_recipe_ids(
+                            reader,
+                            limit=9 * options['limit'],
+                            strategy=strategy
+                        )[-1]
+                    ms, queries, _ = self.measure(
+                        reader,
+                        strategy,
+                        before,
+                        options
+                    )
+                    self.stdout.write(
+                        f'{followed:>8} {strategy:>8} {page:>6} {ms:>8.2f} '
+                        f'{queries:>7}'
+                    )
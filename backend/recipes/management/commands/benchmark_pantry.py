@@ -0,0 +1,61 @@
+from time import perf_counter
+
+import numpy as np
+from django.core.management import BaseCommand
+
+from recipes.pantry import PantrySnapshot
+
+
+class Command(BaseCommand):
+    help = ("Measures the pantry search on a synthetic in-memory index: "
+            "recipes with 5-15 ingredients each drawn from a skewed "
+            "distribution, so common ingredients match most recipes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--limit', type=int, default=10)
+
+    def handle(self, *args, **options):
+        generator = np.random.default_rng(0)
+        weights = 1 / np.arange(1, options['ingredients'] + 1)
+        weights /= weights.sum()
+        sizes = generator.integers(5, 16, options['recipes'])
+        pairs = np.unique(np.column_stack((
+            generator.choice(
+                options['ingredients'],
+                sizes.sum(),
+                p=weights
+            ) + 1,
+            np.repeat(np.arange(1, options['recipes'] + 1), sizes),
+        )), axis=0)
+        started = perf_counter()
+        snapshot = PantrySnapshot.from_pairs(0, pairs)
+        self.stdout.write(
+            f'{options["recipes"]} recipes, {len(pairs)} pairs, index built '
+            f'in {(perf_counter() - started) * 1000:.0f} ms'
+        )
+        self.stdout.write(f'{"on hand":>7} {"ms":>8} {"matched":>8}')
+        for on_hand in (1, 5, 10, 20):
+            queries = [
+                generator.choice(
+                    options['ingredients'],
+                    on_hand,
+                    replace=False,
+                    p=weights
+                ) + 1
+                for _ in range(options['repeat'])
+            ]
+            started = perf_counter()
+            for ingredient_ids in queries:
+                snapshot.search(ingredient_ids.tolist(), options['limit'])
+            elapsed = (perf_counter() - started) / options['repeat']
+            matched = len(np.unique(np.concatenate([
+                snapshot.index[ingredient_id]
+                for ingredient_id in queries[-1].tolist()
+                if ingredient_id in snapshot.index
+            ])))
+            self.stdout.write(
+                f'{on_hand:>7} {elapsed * 1000:>8.2f} {matched:>8}'
+            )
@@ -0,0 +1,29 @@
+from django.core.management import BaseCommand
+
+from recipes.feeds import backfill, forget_popular_authors
+from recipes.models import FeedEntry, Subscription
+
+
+class Command(BaseCommand):
+    help = ("Rebuilds the fan-out subscription feeds from scratch: every "
+            "subscriber gets the latest recipes of the followed authors, "
+            "except popular authors, which are merged at read time.")
+
+    def handle(self, *args, **kwargs):
+        forget_popular_authors()
+        deleted, _ = FeedEntry.objects.all().delete()
+        self.stdout.write(
+            self.style.WARNING(f'Removed {deleted} feed entries!')
+        )
+        for number, subscription in enumerate(
+                Subscription.objects.order_by('id').iterator(),
+                start=1
+        ):
+            backfill(subscription)
+            if number % 1000 == 0:
+                self.stdout.write(f'Processed {number} subscriptions...')
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Feeds rebuilt, {FeedEntry.objects.count()} entries!'
+            )
+        )
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand
+
+from recipes.recommendations import build_recommendations
+
+
+class Command(BaseCommand):
+    help = ("Computes the top-K similar recipes by the cosine similarity of "
+            "favorites and shopping lists and stores them for the "
+            "/api/recipes/{id}/similar/ endpoint.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            help='Number of similar recipes stored for each recipe.'
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help=('Recompute only recipes added to favorites or shopping '
+                  'lists since the previous run.')
+        )
+
+    def handle(self, *args, **options):
+        processed = build_recommendations(
+            top_k=options['top_k'],
+            incremental=options['incremental']
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Similar recipes computed for {processed} recipes!'
+            )
+        )
@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management import BaseCommand
+
+from recipes.deletion import process
+from recipes.models import DeletionTask
+
+
+class Command(BaseCommand):
+    help = ("Deletes users and recipes scheduled for deletion together with "
+            "their dependent objects in short batched transactions, then "
+            "removes the recipe images. An interrupted run resumes where it "
+            "stopped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.DELETION_BATCH_SIZE,
+            help='Number of dependent rows deleted per transaction.'
+        )
+        parser.add_argument(
+            '--recipes-batch-size',
+            type=int,
+            default=settings.DELETION_RECIPES_BATCH_SIZE,
+            help=('Number of recipes deleted per transaction together with '
+                  'their ingredients and tags.')
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0,
+            help='Seconds to sleep between batches to spare the database.'
+        )
+
+    def handle(self, *args, **options):
+        tasks = DeletionTask.objects.filter(finished__isnull=True)
+        for task in tasks:
+            process(
+                task,
+                options['batch_size'],
+                options['recipes_batch_size'],
+                options['pause']
+            )
+            self.stdout.write(
+                f'{task.kind} {task.object_id}: '
+                f'{task.deleted_objects} objects deleted'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(tasks)} deletion tasks processed!'
+        ))
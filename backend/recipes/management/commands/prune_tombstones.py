@@ -0,0 +1,15 @@
+from django.core.management import BaseCommand
+
+from recipes.changes import prune_tombstones
+
+
+class Command(BaseCommand):
+    help = ("Deletes records of deleted recipes older than "
+            "RECIPE_TOMBSTONES_DAYS; clients with older sync tokens get 410 "
+            "from /api/recipes/changes/ and resync from scratch.")
+
+    def handle(self, *args, **options):
+        deleted = prune_tombstones()
+        self.stdout.write(
+            self.style.SUCCESS(f'{deleted} recipe tombstones deleted!')
+        )
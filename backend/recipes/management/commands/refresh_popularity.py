@@ -0,0 +1,18 @@
+from django.core.management import BaseCommand
+
+from recipes.popularity import refresh_popularity
+
+
+class Command(BaseCommand):
+    help = ("Creates missing popularity rows for recipes and their tags, "
+            "removes rows of tags taken off recipes and recomputes the "
+            "scores from the current favorites and shopping lists.")
+
+    def handle(self, *args, **kwargs):
+        created, deleted, refreshed = refresh_popularity()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Popularity refreshed: {created} rows created, '
+                f'{deleted} rows removed, {refreshed} recipes recomputed!'
+            )
+        )
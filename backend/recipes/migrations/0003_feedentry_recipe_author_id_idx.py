@@ -0,0 +1,58 @@
+# Generated by Django 4.1.5 on 2026-10-19 12:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Записи ленты',
+                'ordering': ('-recipe_id',),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='author',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор рецепта'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='recipe',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AddField(
+            model_name='feedentry',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Подписчик'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-recipe'], name='feed_user_recipe_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_user_recipe_in_feed'),
+        ),
+    ]
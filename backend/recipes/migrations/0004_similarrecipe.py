@@ -0,0 +1,33 @@
+# Generated by Django 4.1.5 on 2026-10-19 12:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_feedentry_recipe_author_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(verbose_name='Косинусная близость')),
+                ('rank', models.PositiveSmallIntegerField(verbose_name='Место в списке похожих')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_recipes', to='recipes.recipe', verbose_name='Рецепт')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Похожий рецепт')),
+            ],
+            options={
+                'verbose_name': 'Похожий рецепт',
+                'verbose_name_plural': 'Похожие рецепты',
+                'ordering': ('recipe_id', 'rank'),
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='similarrecipe',
+            constraint=models.UniqueConstraint(fields=('recipe', 'rank'), name='unique_recipe_similar_rank'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.1.5 on 2026-10-19 12:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_similarrecipe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipePopularity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField(default=0, verbose_name='Рейтинг популярности')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popularity', to='recipes.recipe', verbose_name='Рецепт')),
+                ('tag', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.tag', verbose_name='Тег рецепта')),
+            ],
+            options={
+                'verbose_name': 'Популярность рецепта',
+                'verbose_name_plural': 'Популярность рецептов',
+                'ordering': ('-score', '-recipe_id'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipepopularity',
+            index=models.Index(fields=['tag', '-score', '-recipe'], name='popularity_tag_score_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipepopularity',
+            constraint=models.UniqueConstraint(fields=('recipe', 'tag'), name='unique_recipe_tag_popularity'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipepopularity',
+            constraint=models.UniqueConstraint(condition=models.Q(('tag__isnull', True)), fields=('recipe',), name='unique_recipe_popularity'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.1.5 on 2026-10-19 12:57
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipepopularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipe_id', models.PositiveIntegerField(verbose_name='id удалённого рецепта')),
+                ('deleted', models.DateTimeField(auto_now_add=True, verbose_name='Дата удаления')),
+            ],
+            options={
+                'verbose_name': 'Удалённый рецепт',
+                'verbose_name_plural': 'Удалённые рецепты',
+                'ordering': ('deleted', 'id'),
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='created',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата создания'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Дата изменения'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['updated', 'id'], name='recipe_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipetombstone',
+            index=models.Index(fields=['deleted', 'id'], name='tombstone_deleted_id_idx'),
+        ),
+    ]
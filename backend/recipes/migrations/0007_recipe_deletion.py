@@ -0,0 +1,41 @@
+# Generated by Django 4.1.5 on 2026-10-19 13:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_timestamps_tombstones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionTask',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('user', 'Пользователь'), ('recipe', 'Рецепт')], max_length=6, verbose_name='Удаляемый объект')),
+                ('object_id', models.PositiveIntegerField(verbose_name='id удаляемого объекта')),
+                ('stage', models.CharField(blank=True, max_length=100, verbose_name='Удаляемая модель')),
+                ('deleted_objects', models.PositiveIntegerField(default=0, verbose_name='Удалено объектов')),
+                ('images', models.JSONField(default=list, verbose_name='Файлы изображений удалённых рецептов')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('updated', models.DateTimeField(auto_now=True, verbose_name='Дата изменения')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='Дата завершения')),
+            ],
+            options={
+                'verbose_name': 'Задача удаления',
+                'verbose_name_plural': 'Задачи удаления',
+                'ordering': ('created', 'id'),
+            },
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='pending_deletion',
+            field=models.BooleanField(default=False, verbose_name='Ожидает удаления'),
+        ),
+        migrations.AddConstraint(
+            model_name='deletiontask',
+            constraint=models.UniqueConstraint(condition=models.Q(('finished__isnull', True)), fields=('kind', 'object_id'), name='unique_unfinished_deletion_task'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1.5 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_recipe_deletion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='deletiontask',
+            name='object_id',
+            field=models.PositiveBigIntegerField(
+                verbose_name='id удаляемого объекта'
+            ),
+        ),
+        migrations.AlterField(
+            model_name='recipetombstone',
+            name='recipe_id',
+            field=models.PositiveBigIntegerField(
+                verbose_name='id удалённого рецепта'
+            ),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.1.5 on 2026-10-19 13:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_tombstone_bigint_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecommendationWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('interaction', models.CharField(max_length=64, unique=True, verbose_name='Модель взаимодействий')),
+                ('last_id', models.PositiveBigIntegerField(null=True, verbose_name='Последний учтённый id')),
+            ],
+            options={
+                'verbose_name': 'Отметка расчёта похожих рецептов',
+                'verbose_name_plural': 'Отметки расчёта похожих рецептов',
+            },
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.1.5 on 2026-10-19 13:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_recommendationwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favoritesrecipe',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='shoppinglist',
+            name='added',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now, verbose_name='Дата добавления'),
+            preserve_default=False,
+        ),
+    ]
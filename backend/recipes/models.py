@@ -1,10 +1,16 @@
 from colorfield.fields import ColorField
 from django.conf import settings
 from django.core.validators import MinValueValidator
-from django.db.models import (CASCADE, CharField, ForeignKey, ImageField,
-                              ManyToManyField, Model,
-                              PositiveSmallIntegerField, SlugField, TextField,
-                              UniqueConstraint)
+from django.db import connections, router
+from django.db.models import (CASCADE, BooleanField, CharField, DateTimeField,
+                              Exists, FloatField, ForeignKey, ImageField,
+                              Index, JSONField, Manager, ManyToManyField,
+                              Model, OuterRef, PositiveBigIntegerField,
+                              PositiveIntegerField, PositiveSmallIntegerField,
+                              Prefetch, Q, QuerySet, SlugField, TextField,
+                              UniqueConstraint, Value)
+from django.db.models.signals import post_delete, post_save
+from django.utils import timezone
 
 from recipes.validators import validate_slug
 from users.models import CustomUser
@@ -71,6 +77,78 @@ class Tag(Model):
         return f'"{self.color}" - цвет в формате hex для тега: "{self.name}"'
 
 
+DEFERRABLE_FIELDS = ('name', 'image', 'text', 'cooking_time')
+
+# Аннотации флагов пользователя и поля ответа, для которых они нужны.
+USER_FLAGS = {
+    'is_favorited': 'is_favorited',
+    'is_in_shopping_cart': 'is_in_shopping_cart',
+    'author_is_subscribed': 'author',
+}
+
+
+class RecipeQuerySet(QuerySet):
+    """Набор запросов рецептов, подготовленных к сериализации без
+    дополнительных запросов на каждый рецепт."""
+
+    def with_related(self, fields=None):
+        """Загружает связанные данные и столбцы, нужные для полей ответа
+        fields, а при fields=None - для всех полей."""
+        queryset = self
+        if fields is None or 'author' in fields:
+            queryset = queryset.select_related('author')
+        if fields is None or 'tags' in fields:
+            queryset = queryset.prefetch_related('recipetag_set')
+        if fields is None or 'ingredients' in fields:
+            queryset = queryset.prefetch_related(Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.order_by('id')
+            ))
+        if fields is None:
+            return queryset
+        return queryset.defer(*(
+            name for name in DEFERRABLE_FIELDS if name not in fields
+        ))
+
+    def with_user_flags(self, user, fields=None):
+        if not user.is_authenticated:
+            flags = {
+                name: Value(False, output_field=BooleanField())
+                for name in USER_FLAGS
+            }
+        else:
+            flags = {
+                'is_favorited': Exists(FavoritesRecipe.objects.filter(
+                    recipe=OuterRef('pk'),
+                    user=user
+                )),
+                'is_in_shopping_cart': Exists(ShoppingList.objects.filter(
+                    recipe=OuterRef('pk'),
+                    user=user
+                )),
+                'author_is_subscribed': Exists(Subscription.objects.filter(
+                    subscribed_author=OuterRef('author'),
+                    user=user
+                )),
+            }
+        return self.annotate(**{
+            name: expression for name, expression in flags.items()
+            if fields is None or USER_FLAGS[name] in fields
+        })
+
+    def touch(self):
+        """Отмечает рецепты изменёнными без вызова сигналов сохранения."""
+        return self.update(updated=timezone.now())
+
+
+class RecipeManager(Manager.from_queryset(RecipeQuerySet)):
+    """Менеджер рецептов без рецептов, ожидающих фонового удаления: они
+    скрыты из API и админки сразу после запроса на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(pending_deletion=False)
+
+
 class Recipe(Model):
     tags = ManyToManyField(
         Tag,
@@ -107,11 +185,30 @@ class Recipe(Model):
     cooking_time = PositiveSmallIntegerField(
         verbose_name='Время приготовления в минутах',
     )
+    created = DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+    updated = DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    pending_deletion = BooleanField(
+        default=False,
+        verbose_name='Ожидает удаления',
+    )
+
+    objects = RecipeManager()
+    all_objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-id',)
+        indexes = [
+            Index(fields=['author', '-id'], name='recipe_author_id_idx'),
+            Index(fields=['updated', 'id'], name='recipe_updated_id_idx'),
+        ]
 
     def __str__(self):
         return (
@@ -177,6 +274,170 @@ class RecipeTag(Model):
         return f'У рецепта блюда "{self.recipe.name}" тег - "{self.tag}"'
 
 
+class UserRelationQuerySet(QuerySet):
+    """Набор запросов для связей пользователя с рецептом или автором, которые
+    создаются и удаляются без предварительной проверки и гонок между
+    запросами.
+
+    Объект связи target передаётся экземпляром или id.
+    """
+
+    def create_once(self, user, **target):
+        """Создаёт связь одним запросом INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает созданную запись или None, если такая связь уже есть или
+        объекта target нет среди объектов его менеджера по умолчанию.
+        Сигнал post_save отправляется так же, как при обычном сохранении.
+        """
+        (name, value), = target.items()
+        target_id = getattr(value, 'pk', value)
+        using = router.db_for_write(self.model)
+        rows = self.insert_missing(user, name, (target_id,), using)
+        if not rows:
+            return None
+        if value is target_id:
+            target = {self.model._meta.get_field(name).attname: target_id}
+        instance = self.model(pk=rows[0][0], user=user, **target)
+        instance._state.adding = False
+        instance._state.db = using
+        post_save.send(
+            sender=self.model,
+            instance=instance,
+            created=True,
+            update_fields=None,
+            raw=False,
+            using=using
+        )
+        return instance
+
+    def delete_once(self, user, **target):
+        """Удаляет связь одним запросом DELETE ... RETURNING.
+
+        Возвращает удалённую запись или None, если связи не было. Сигнал
+        post_delete отправляется так же, как при обычном удалении.
+        """
+        (name, target_id), = target.items()
+        target_id = getattr(target_id, 'pk', target_id)
+        opts = self.model._meta
+        field = opts.get_field(name)
+        using = router.db_for_write(self.model)
+        quote = connections[using].ops.quote_name
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(opts.db_table)} '
+                f'WHERE {quote(opts.get_field("user").column)} = %s '
+                f'AND {quote(field.column)} = %s '
+                f'RETURNING {quote(opts.pk.column)}',
+                (user.pk, target_id)
+            )
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        instance = self.model(
+            pk=row[0],
+            user=user,
+            **{field.attname: target_id}
+        )
+        instance._state.adding = False
+        instance._state.db = using
+        post_delete.send(
+            sender=self.model,
+            instance=instance,
+            using=using,
+            origin=instance
+        )
+        return instance
+
+    def create_many(self, user, name, target_ids):
+        """Создаёт связи user с объектами target_ids поля name одним
+        запросом INSERT ... ON CONFLICT DO NOTHING.
+
+        Возвращает множество id объектов, связи с которыми созданы именно
+        этим запросом, а не уже существовали или были созданы параллельным
+        запросом. Сигналы post_save не отправляются.
+        """
+        if not target_ids:
+            return set()
+        rows = self.insert_missing(
+            user,
+            name,
+            tuple(target_ids),
+            router.db_for_write(self.model)
+        )
+        return {target_id for _, target_id in rows}
+
+    def delete_many(self, user, name, target_ids):
+        """Удаляет связи user с объектами target_ids поля name одним
+        запросом DELETE ... RETURNING.
+
+        Возвращает множество id объектов, связи с которыми удалены именно
+        этим запросом. Сигналы post_delete не отправляются.
+        """
+        if not target_ids:
+            return set()
+        opts = self.model._meta
+        field = opts.get_field(name)
+        using = router.db_for_write(self.model)
+        quote = connections[using].ops.quote_name
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {quote(opts.db_table)} '
+                f'WHERE {quote(opts.get_field("user").column)} = %s '
+                f'AND {quote(field.column)} IN '
+                f'({", ".join(["%s"] * len(target_ids))}) '
+                f'RETURNING {quote(field.column)}',
+                (user.pk, *target_ids)
+            )
+            return {target_id for target_id, in cursor.fetchall()}
+
+    def insert_missing(self, user, name, target_ids, using):
+        """Вставляет недостающие связи и возвращает пары (id связи, id
+        объекта) вставленных строк.
+
+        Поля с auto_now_add заполняются текущим временем, как при save().
+        Объекты выбираются менеджером по умолчанию, поэтому, например,
+        рецепты, ожидающие удаления, пропускаются.
+        """
+        opts = self.model._meta
+        field = opts.get_field(name)
+        targets = field.related_model._default_manager.filter(
+            pk__in=target_ids
+        ).order_by().values('pk')
+        connection = connections[using]
+        targets_sql, targets_params = targets.query.get_compiler(
+            connection=connection
+        ).as_sql()
+        quote = connection.ops.quote_name
+        timestamps = [
+            timestamp for timestamp in opts.concrete_fields
+            if getattr(timestamp, 'auto_now_add', False)
+        ]
+        now = timezone.now()
+        columns = ', '.join(
+            quote(column.column)
+            for column in (opts.get_field('user'), field, *timestamps)
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {quote(opts.db_table)} ({columns}) '
+                f'SELECT %s, targets.{quote(field.target_field.column)}'
+                f'{", %s" * len(timestamps)} '
+                f'FROM ({targets_sql}) AS targets '
+                # WHERE отделяет ON CONFLICT от SELECT для парсера SQLite.
+                f'WHERE true ON CONFLICT DO NOTHING '
+                f'RETURNING {quote(opts.pk.column)}, {quote(field.column)}',
+                (
+                    user.pk,
+                    *(
+                        timestamp.get_db_prep_save(now, connection)
+                        for timestamp in timestamps
+                    ),
+                    *targets_params
+                )
+            )
+            return cursor.fetchall()
+
+
 class UserRecipeModel(Model):
     """Абстрактная модель для модели Списка покупок и Избранное."""
     user = ForeignKey(
@@ -189,6 +450,12 @@ class UserRecipeModel(Model):
         on_delete=CASCADE,
         verbose_name='Рецепт'
     )
+    added = DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата добавления',
+    )
+
+    objects = UserRelationQuerySet.as_manager()
 
     class Meta:
         abstract = True
@@ -251,6 +518,8 @@ class Subscription(Model):
         verbose_name='Автор на которого подписались',
     )
 
+    objects = UserRelationQuerySet.as_manager()
+
     class Meta:
         constraints = [
             UniqueConstraint(
@@ -267,3 +536,244 @@ class Subscription(Model):
             f'Пользователь с логином "{self.user.username}" подписан на '
             f'автора рецептов с логином "{self.subscribed_author.username}"'
         )
+
+
+class RecipeTombstone(Model):
+    """Модель записи об удалённом рецепте для инкрементальной
+    синхронизации клиентов."""
+    recipe_id = PositiveBigIntegerField(
+        verbose_name='id удалённого рецепта'
+    )
+    deleted = DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата удаления',
+    )
+
+    class Meta:
+        indexes = [
+            Index(fields=['deleted', 'id'], name='tombstone_deleted_id_idx'),
+        ]
+        ordering = ('deleted', 'id')
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+
+    def __str__(self):
+        return f'Рецепт с id "{self.recipe_id}" удалён {self.deleted}'
+
+
+class DeletionTask(Model):
+    """Модель задачи фонового удаления пользователя или рецепта вместе с
+    зависимыми объектами, которая хранит прогресс удаления."""
+    USER = 'user'
+    RECIPE = 'recipe'
+    KINDS = (
+        (USER, 'Пользователь'),
+        (RECIPE, 'Рецепт'),
+    )
+    kind = CharField(
+        max_length=6,
+        choices=KINDS,
+        verbose_name='Удаляемый объект',
+    )
+    object_id = PositiveBigIntegerField(
+        verbose_name='id удаляемого объекта'
+    )
+    stage = CharField(
+        max_length=100,
+        blank=True,
+        verbose_name='Удаляемая модель',
+    )
+    deleted_objects = PositiveIntegerField(
+        default=0,
+        verbose_name='Удалено объектов',
+    )
+    images = JSONField(
+        default=list,
+        verbose_name='Файлы изображений удалённых рецептов',
+    )
+    created = DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата создания',
+    )
+    updated = DateTimeField(
+        auto_now=True,
+        verbose_name='Дата изменения',
+    )
+    finished = DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Дата завершения',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['kind', 'object_id'],
+                condition=Q(finished__isnull=True),
+                name='unique_unfinished_deletion_task'
+            )
+        ]
+        ordering = ('created', 'id')
+        verbose_name = 'Задача удаления'
+        verbose_name_plural = 'Задачи удаления'
+
+    def __str__(self):
+        return (
+            f'Удаление объекта "{self.get_kind_display()}" с id '
+            f'"{self.object_id}"'
+        )
+
+
+class FeedEntry(Model):
+    """Модель ленты рецептов подписчика, заполняемой при публикации рецепта
+    автором, на которого он подписан."""
+    user = ForeignKey(
+        CustomUser,
+        on_delete=CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = ForeignKey(
+        CustomUser,
+        on_delete=CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_user_recipe_in_feed'
+            )
+        ]
+        indexes = [
+            Index(fields=['user', '-recipe'], name='feed_user_recipe_idx'),
+            Index(fields=['user', 'author'], name='feed_user_author_idx'),
+        ]
+        ordering = ('-recipe_id',)
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return (
+            f'Рецепт с id "{self.recipe_id}" в ленте пользователя с id '
+            f'"{self.user_id}"'
+        )
+
+
+class SimilarRecipe(Model):
+    """Модель заранее рассчитанных похожих рецептов: их чаще всего добавляют
+    в Избранное и Список покупок те же пользователи."""
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт',
+    )
+    similar = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт',
+    )
+    score = FloatField(verbose_name='Косинусная близость')
+    rank = PositiveSmallIntegerField(verbose_name='Место в списке похожих')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'rank'],
+                name='unique_recipe_similar_rank'
+            )
+        ]
+        ordering = ('recipe_id', 'rank')
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return (
+            f'Рецепт с id "{self.similar_id}" похож на рецепт с id '
+            f'"{self.recipe_id}" с близостью {self.score:.3f}'
+        )
+
+
+class RecommendationWatermark(Model):
+    """Модель отметки о прошлом расчёте похожих рецептов: наибольший id
+    строк каждой модели взаимодействий, учтённых в расчёте."""
+    interaction = CharField(
+        max_length=64,
+        unique=True,
+        verbose_name='Модель взаимодействий',
+    )
+    last_id = PositiveBigIntegerField(
+        null=True,
+        verbose_name='Последний учтённый id',
+    )
+
+    class Meta:
+        verbose_name = 'Отметка расчёта похожих рецептов'
+        verbose_name_plural = 'Отметки расчёта похожих рецептов'
+
+    def __str__(self):
+        return f'{self.interaction}: {self.last_id}'
+
+
+class RecipePopularity(Model):
+    """Модель рейтинга популярности рецепта в целом и по каждому его тегу.
+
+    Рейтинг хранится в логарифмической шкале: это log2 суммы весов
+    добавлений в Избранное и Список покупок, каждый из которых убывает
+    вдвое за период полураспада. Веса отсчитываются от начала эпохи Unix,
+    поэтому рейтинги разных рецептов сравнимы без пересчёта всей таблицы,
+    а 0 соответствует рецепту без добавлений.
+    """
+    recipe = ForeignKey(
+        Recipe,
+        on_delete=CASCADE,
+        related_name='popularity',
+        verbose_name='Рецепт',
+    )
+    tag = ForeignKey(
+        Tag,
+        on_delete=CASCADE,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Тег рецепта',
+    )
+    score = FloatField(default=0, verbose_name='Рейтинг популярности')
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['recipe', 'tag'],
+                name='unique_recipe_tag_popularity'
+            ),
+            UniqueConstraint(
+                fields=['recipe'],
+                condition=Q(tag__isnull=True),
+                name='unique_recipe_popularity'
+            ),
+        ]
+        indexes = [
+            Index(
+                fields=['tag', '-score', '-recipe'],
+                name='popularity_tag_score_idx'
+            ),
+        ]
+        ordering = ('-score', '-recipe_id')
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return (
+            f'Рейтинг рецепта с id "{self.recipe_id}" по тегу с id '
+            f'"{self.tag_id}" равен {self.score:.3f}'
+        )
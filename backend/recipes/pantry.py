@@ -0,0 +1,178 @@
+from threading import Lock
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import RecipeIngredient
+
+SEQUENCE_KEY = 'pantry-index-sequence'
+
+CHANGE_KEY = 'pantry-index-change:{}'
+
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def record_change(*recipe_ids):
+    """Сообщает индексам всех процессов, что состав рецептов изменился."""
+    cache.add(SEQUENCE_KEY, 0, None)
+    for recipe_id in recipe_ids:
+        cache.set(
+            CHANGE_KEY.format(cache.incr(SEQUENCE_KEY)),
+            recipe_id,
+            settings.PANTRY_CHANGES_TIMEOUT
+        )
+
+
+def postings(pairs):
+    """Раскладывает отсортированные пары (ингредиент, рецепт) по
+    ингредиентам."""
+    ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+    return dict(zip(
+        ingredient_ids.tolist(),
+        np.split(pairs[:, 1], starts[1:])
+    ))
+
+
+def contains_any(recipes, recipe_ids):
+    positions = recipes.searchsorted(recipe_ids).clip(max=len(recipes) - 1)
+    return bool((recipes[positions] == recipe_ids).any())
+
+
+class PantrySnapshot:
+    """Неизменяемый инвертированный индекс: для каждого ингредиента -
+    отсортированный массив id рецептов, в которые он входит, и число
+    ингредиентов каждого рецепта."""
+
+    def __init__(self, sequence, index, recipe_ids, sizes):
+        self.sequence = sequence
+        self.index = index
+        self.recipe_ids = recipe_ids
+        self.sizes = sizes
+
+    @classmethod
+    def from_pairs(cls, sequence, pairs):
+        pairs = pairs[np.lexsort((pairs[:, 1], pairs[:, 0]))]
+        recipe_ids, sizes = np.unique(pairs[:, 1], return_counts=True)
+        return cls(sequence, postings(pairs), recipe_ids, sizes)
+
+    @classmethod
+    def load(cls, sequence):
+        return cls.from_pairs(sequence, np.array(
+            RecipeIngredient.objects.filter(
+                recipe__pending_deletion=False
+            ).values_list('ingredient_id', 'recipe_id'),
+            dtype=np.int64
+        ).reshape(-1, 2))
+
+    def updated(self, sequence, recipe_ids):
+        """Новый снимок, в котором рецепты recipe_ids заново прочитаны из
+        базы данных, а остальные массивы переиспользуются."""
+        changed = np.array(sorted(recipe_ids), dtype=np.int64)
+        pairs = np.array(
+            RecipeIngredient.objects.filter(
+                recipe_id__in=recipe_ids,
+                recipe__pending_deletion=False
+            ).order_by('ingredient_id', 'recipe_id').values_list(
+                'ingredient_id',
+                'recipe_id'
+            ),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        added = postings(pairs)
+        index = dict(self.index)
+        for ingredient_id, recipes in self.index.items():
+            if ingredient_id not in added and contains_any(recipes, changed):
+                added[ingredient_id] = EMPTY
+        for ingredient_id, new_recipes in added.items():
+            recipes = index.get(ingredient_id, EMPTY)
+            recipes = np.union1d(
+                recipes[np.isin(recipes, changed, invert=True)],
+                new_recipes
+            )
+            if len(recipes):
+                index[ingredient_id] = recipes
+            else:
+                index.pop(ingredient_id, None)
+        kept = np.isin(self.recipe_ids, changed, invert=True)
+        new_ids, new_sizes = np.unique(pairs[:, 1], return_counts=True)
+        recipe_ids = np.concatenate((self.recipe_ids[kept], new_ids))
+        sizes = np.concatenate((self.sizes[kept], new_sizes))
+        order = np.argsort(recipe_ids, kind='stable')
+        return PantrySnapshot(sequence, index, recipe_ids[order], sizes[order])
+
+    def search(self, ingredient_ids, limit):
+        """Рецепты, в которые входит хотя бы один из ингредиентов, по
+        убыванию доли имеющихся ингредиентов, затем по возрастанию числа
+        недостающих.
+
+        Возвращает список троек (id рецепта, доля, число недостающих).
+        """
+        arrays = [
+            self.index[ingredient_id]
+            for ingredient_id in set(ingredient_ids)
+            if ingredient_id in self.index
+        ]
+        if not arrays:
+            return []
+        candidates, found = np.unique(
+            np.concatenate(arrays),
+            return_counts=True
+        )
+        sizes = self.sizes[np.searchsorted(self.recipe_ids, candidates)]
+        coverage = found / sizes
+        missing = sizes - found
+        if len(candidates) > limit:
+            # Сначала отбираются лучшие по доле, с запасом на равные доли.
+            threshold = -np.partition(-coverage, limit - 1)[limit - 1]
+            best = coverage >= threshold
+            candidates = candidates[best]
+            coverage, missing = coverage[best], missing[best]
+        order = np.lexsort((-candidates, missing, -coverage))[:limit]
+        return list(zip(
+            candidates[order].tolist(),
+            coverage[order].tolist(),
+            missing[order].tolist()
+        ))
+
+
+class PantryIndex:
+    """Хранит в процессе снимок индекса и дополняет его изменениями,
+    записанными в общий кэш другими процессами.
+
+    Если изменений слишком много или часть из них уже вытеснена из кэша,
+    индекс строится заново.
+    """
+
+    def __init__(self):
+        self.snapshot = None
+        self.lock = Lock()
+
+    def get(self):
+        sequence = cache.get(SEQUENCE_KEY, 0)
+        snapshot = self.snapshot
+        if snapshot is not None and snapshot.sequence == sequence:
+            return snapshot
+        with self.lock:
+            snapshot = self.snapshot
+            if snapshot is not None and snapshot.sequence == sequence:
+                return snapshot
+            recipe_ids = None
+            if (snapshot is not None
+                    and 0 < sequence - snapshot.sequence
+                    <= settings.PANTRY_MAX_REPLAYED_CHANGES):
+                keys = [
+                    CHANGE_KEY.format(number)
+                    for number in range(snapshot.sequence + 1, sequence + 1)
+                ]
+                changes = cache.get_many(keys)
+                if len(changes) == len(keys):
+                    recipe_ids = set(changes.values())
+            if recipe_ids is None:
+                self.snapshot = PantrySnapshot.load(sequence)
+            else:
+                self.snapshot = snapshot.updated(sequence, recipe_ids)
+            return self.snapshot
+
+
+pantry_index = PantryIndex()
@@ -0,0 +1,179 @@
+from math import log2
+
+from django.conf import settings
+from django.db.models import Case, Exists, F, FloatField, OuterRef, Value, When
+from django.db.models.functions import Greatest, Least, Log, Power
+from django.utils import timezone
+
+from recipes.models import (FavoritesRecipe, Recipe, RecipePopularity,
+                            RecipeTag, ShoppingList)
+
+WEIGHTS = {
+    FavoritesRecipe: 1.0,
+    ShoppingList: 0.5,
+}
+
+# Меньший рейтинг отстаёт от большего не больше чем на столько единиц: 2 в
+# такой степени уже меньше точности float, а вычисление 2 в степени, близкой
+# к -1075, PostgreSQL прерывает ошибкой underflow.
+MIN_SCORE_DIFFERENCE = -60.0
+
+
+def weighted_score(weight, moment=None):
+    """Рейтинг одного добавления с весом weight в момент moment."""
+    moment = moment or timezone.now()
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    return moment.timestamp() / half_life + log2(weight)
+
+
+def sync_recipe(recipe_id):
+    """Приводит строки рейтинга рецепта в соответствие с его тегами."""
+    rows = {
+        row.tag_id: row
+        for row in RecipePopularity.objects.filter(recipe_id=recipe_id)
+    }
+    score = rows[None].score if None in rows else 0
+    tag_ids = set(RecipeTag.objects.filter(recipe_id=recipe_id).values_list(
+        'tag_id',
+        flat=True
+    ))
+    RecipePopularity.objects.filter(
+        recipe_id=recipe_id,
+        tag_id__in=set(rows) - tag_ids - {None}
+    ).delete()
+    RecipePopularity.objects.bulk_create(
+        (
+            RecipePopularity(recipe_id=recipe_id, tag_id=tag_id, score=score)
+            for tag_id in ({None} | tag_ids) - set(rows)
+        ),
+        ignore_conflicts=True
+    )
+
+
+def increment(score):
+    """Выражение, прибавляющее рейтинг score к полю score в логарифмической
+    шкале, чтобы обновление выполнялось одним запросом без блокировок.
+
+    Строка без добавлений (рейтинг 0) получает рейтинг score целиком.
+    """
+    high = Greatest(F('score'), Value(score))
+    low = Least(F('score'), Value(score))
+    return Case(
+        When(score=0, then=Value(score)),
+        default=high + Log(2, 1 + Power(
+            2,
+            Greatest(low - high, Value(MIN_SCORE_DIFFERENCE))
+        )),
+        output_field=FloatField()
+    )
+
+
+def register(model, *recipe_ids):
+    """Учитывает добавление рецептов в Избранное или Список покупок во всех
+    строках их рейтинга."""
+    missing = set(recipe_ids) - set(RecipePopularity.objects.filter(
+        recipe_id__in=recipe_ids,
+        tag=None
+    ).values_list('recipe_id', flat=True))
+    for recipe_id in missing:
+        sync_recipe(recipe_id)
+    RecipePopularity.objects.filter(recipe_id__in=recipe_ids).update(
+        score=increment(weighted_score(WEIGHTS[model]))
+    )
+
+
+def live_scores(recipe_ids, now):
+    """Рейтинги рецептов recipe_ids по их текущим строкам Избранного и
+    Списка покупок с учётом времени добавления.
+
+    Рецепт без добавлений получает рейтинг 0, как новая строка.
+    """
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    totals = dict.fromkeys(recipe_ids, 0.0)
+    for model, weight in WEIGHTS.items():
+        for recipe_id, added in model.objects.filter(
+                recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'added'):
+            totals[recipe_id] += weight * 2 ** (
+                (added - now).total_seconds() / half_life
+            )
+    return {
+        recipe_id: weighted_score(total, now) if total else 0
+        for recipe_id, total in totals.items()
+    }
+
+
+def refresh_popularity(batch_size=1000):
+    """Создаёт недостающие строки рейтинга, удаляет строки снятых тегов и
+    пересчитывает рейтинги по текущим добавлениям.
+
+    register() только прибавляет к рейтингу, поэтому удаления из Избранного
+    и Списка покупок и повторные добавления того же рецепта учитываются
+    только здесь. Добавление, учтённое register() во время пересчёта,
+    может пропасть из рейтинга до следующего запуска. Возвращает число
+    созданных и удалённых строк и число пересчитанных рецептов.
+    """
+    deleted, _ = RecipePopularity.objects.filter(tag__isnull=False).exclude(
+        Exists(RecipeTag.objects.filter(
+            recipe=OuterRef('recipe'),
+            tag=OuterRef('tag')
+        ))
+    ).delete()
+    missing = Recipe.objects.exclude(
+        Exists(RecipePopularity.objects.filter(
+            recipe=OuterRef('pk'),
+            tag=None
+        ))
+    ).values_list('id', flat=True)
+    created = 0
+    for recipe_ids in batched(missing.iterator(), batch_size):
+        created += len(RecipePopularity.objects.bulk_create(
+            (
+                RecipePopularity(recipe_id=recipe_id)
+                for recipe_id in recipe_ids
+            ),
+            ignore_conflicts=True
+        ))
+    missing = RecipeTag.objects.exclude(
+        Exists(RecipePopularity.objects.filter(
+            recipe=OuterRef('recipe'),
+            tag=OuterRef('tag')
+        ))
+    ).values_list('recipe_id', 'tag_id')
+    for pairs in batched(missing.iterator(), batch_size):
+        created += len(RecipePopularity.objects.bulk_create(
+            (
+                RecipePopularity(recipe_id=recipe_id, tag_id=tag_id)
+                for recipe_id, tag_id in pairs
+            ),
+            ignore_conflicts=True
+        ))
+    now = timezone.now()
+    refreshed = 0
+    recipe_ids = RecipePopularity.objects.filter(tag=None).order_by(
+        'recipe_id'
+    ).values_list('recipe_id', flat=True)
+    for batch in batched(recipe_ids.iterator(), batch_size):
+        scores = live_scores(batch, now)
+        RecipePopularity.objects.filter(recipe_id__in=batch).update(
+            score=Case(
+                *(
+                    When(recipe_id=recipe_id, then=Value(score))
+                    for recipe_id, score in scores.items()
+                ),
+                output_field=FloatField()
+            )
+        )
+        refreshed += len(batch)
+    return created, deleted, refreshed
+
+
+def batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from scipy.sparse import csr_matrix, diags
+
+from recipes.models import (FavoritesRecipe, RecommendationWatermark,
+                            ShoppingList, SimilarRecipe)
+
+INTERACTIONS = {
+    FavoritesRecipe: 1.0,
+    ShoppingList: 0.5,
+}
+
+
+def load_matrix():
+    """Строит разреженную матрицу пользователь x рецепт, в которой рецепт в
+    Избранном весит больше, чем рецепт в Списке покупок.
+
+    Столбцы нормированы, поэтому произведение столбцов сразу даёт их
+    косинусную близость.
+    """
+    users, recipes, weights = [], [], []
+    for model, weight in INTERACTIONS.items():
+        pairs = np.array(
+            model.objects.values_list('user_id', 'recipe_id'),
+            dtype=np.int64
+        ).reshape(-1, 2)
+        users.append(pairs[:, 0])
+        recipes.append(pairs[:, 1])
+        weights.append(np.full(len(pairs), weight))
+    users, recipes = np.concatenate(users), np.concatenate(recipes)
+    user_ids, user_index = np.unique(users, return_inverse=True)
+    recipe_ids, recipe_index = np.unique(recipes, return_inverse=True)
+    matrix = csr_matrix(
+        (np.concatenate(weights), (user_index, recipe_index)),
+        shape=(len(user_ids), len(recipe_ids))
+    )
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return recipe_ids, (matrix @ diags(1 / norms)).tocsc()
+
+
+def top_neighbours(matrix, recipe_ids, columns, top_k):
+    """Для каждого столбца из columns возвращает top_k самых близких рецептов
+    в виде пар (id похожего рецепта, близость)."""
+    similarities = (matrix[:, columns].T @ matrix).tocsr()
+    neighbours = {}
+    for row, column in enumerate(columns):
+        start, end = similarities.indptr[row], similarities.indptr[row + 1]
+        indices = similarities.indices[start:end]
+        scores = similarities.data[start:end]
+        mask = indices != column
+        indices, scores = indices[mask], scores[mask]
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k)[:top_k]
+            indices, scores = indices[best], scores[best]
+        order = np.lexsort((recipe_ids[indices], -scores))
+        neighbours[int(recipe_ids[column])] = [
+            (int(recipe_ids[indices[i]]), float(scores[i])) for i in order
+        ]
+    return neighbours
+
+
+def saved_watermark():
+    """Отметка прошлого расчёта или None, если расчёта ещё не было."""
+    return dict(RecommendationWatermark.objects.values_list(
+        'interaction',
+        'last_id'
+    )) or None
+
+
+def current_watermark():
+    """Наибольший id строк каждой модели взаимодействий, добавленных раньше
+    RECOMMENDATIONS_LAG_SECONDS назад.
+
+    Id выдаётся при вставке, а строка видна после фиксации транзакции,
+    поэтому строка с меньшим id может появиться позже строки с большим.
+    Более новые строки учитываются в следующем расчёте ещё раз.
+    """
+    horizon = timezone.now() - timedelta(
+        seconds=settings.RECOMMENDATIONS_LAG_SECONDS
+    )
+    return {
+        model.__name__: model.objects.filter(
+            added__lte=horizon
+        ).aggregate(last_id=Max('id'))['last_id']
+        for model in INTERACTIONS
+    }
+
+
+def changed_recipe_ids(watermark):
+    """Рецепты, которые добавили в Избранное или Список покупок после
+    предыдущего расчёта."""
+    recipe_ids = set()
+    for model in INTERACTIONS:
+        last_id = watermark.get(model.__name__)
+        queryset = model.objects.all()
+        if last_id is not None:
+            queryset = queryset.filter(id__gt=last_id)
+        recipe_ids.update(queryset.values_list('recipe_id', flat=True))
+    return recipe_ids
+
+
+def build_recommendations(top_k=None, incremental=False,
+                          chunk_size=1000):
+    """Пересчитывает похожие рецепты и возвращает число обработанных рецептов.
+
+    При incremental пересчитываются только списки рецептов с новыми
+    добавлениями с момента прошлого расчёта. Списки их соседей и удаления
+    обновляются при следующем полном пересчёте. Отметка о прошлом расчёте
+    хранится в базе данных и сохраняется в одной транзакции с похожими
+    рецептами.
+    """
+    top_k = top_k or settings.RECOMMENDATIONS_TOP_K
+    watermark = saved_watermark()
+    new_watermark = current_watermark()
+    recipe_ids, matrix = load_matrix()
+    if incremental and watermark is not None:
+        columns = np.flatnonzero(
+            np.isin(recipe_ids, list(changed_recipe_ids(watermark)))
+        )
+    else:
+        incremental = False
+        columns = np.arange(len(recipe_ids))
+    with transaction.atomic():
+        if not incremental:
+            SimilarRecipe.objects.all().delete()
+        for start in range(0, len(columns), chunk_size):
+            neighbours = top_neighbours(
+                matrix,
+                recipe_ids,
+                columns[start:start + chunk_size],
+                top_k
+            )
+            if incremental:
+                SimilarRecipe.objects.filter(
+                    recipe_id__in=neighbours
+                ).delete()
+            SimilarRecipe.objects.bulk_create(
+                SimilarRecipe(
+                    recipe_id=recipe_id,
+                    similar_id=similar_id,
+                    score=score,
+                    rank=rank
+                )
+                for recipe_id, similar in neighbours.items()
+                for rank, (similar_id, score) in enumerate(similar, start=1)
+            )
+        for interaction, last_id in new_watermark.items():
+            RecommendationWatermark.objects.update_or_create(
+                interaction=interaction,
+                defaults={'last_id': last_id}
+            )
+    return len(columns)
@@ -1,11 +1,17 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
+from foodgram.admin_tools import (BackgroundDeletionAdminMixin,
+                                  ScalableAdminMixin, count_subquery,
+                                  input_filter)
+from recipes.deletion import schedule_user_deletion
+from recipes.models import Recipe, Subscription
 from users.models import CustomUser
 
 
 @admin.register(CustomUser)
-class CustomUserAdmin(UserAdmin):
+class CustomUserAdmin(BackgroundDeletionAdminMixin, ScalableAdminMixin,
+                      UserAdmin):
     list_display = (
         'username',
         'first_name',
@@ -14,14 +20,30 @@ class CustomUserAdmin(UserAdmin):
         'get_recipe_count',
         'get_subscribers_count',
     )
-    list_filter = ('first_name', 'email',)
+    list_filter = (
+        input_filter('first_name__istartswith', 'началу имени'),
+        input_filter('email__iexact', 'электронной почте'),
+    )
     search_fields = ('username', 'email',)
     save_on_top = True
+    schedule_deletion = staticmethod(schedule_user_deletion)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipe_count=count_subquery(Recipe, 'author'),
+            subscribers_count=count_subquery(
+                Subscription,
+                'subscribed_author'
+            ),
+        )
 
-    @admin.display(description='Количество рецептов')
+    @admin.display(ordering='recipe_count', description='Количество рецептов')
     def get_recipe_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipe_count
 
-    @admin.display(description='Количество подписчиков')
+    @admin.display(
+        ordering='subscribers_count',
+        description='Количество подписчиков'
+    )
     def get_subscribers_count(self, obj):
-        return obj.subscriber.count()
+        return obj.subscribers_count